@@ -0,0 +1,82 @@
+"""
+Lecture des corps JSON volumineux (formulaires DatRequest).
+
+Avec un paramètre `data: DatRequest`, FastAPI décode d'abord le JSON en
+dicts / listes Python, puis valide cet arbre contre le modèle : pour un
+formulaire de plusieurs Mo (milliers de VMs, grosses sections HTML), l'arbre
+intermédiaire coûte autant que le modèle lui-même. Ici, les octets bruts du
+corps sont validés directement par pydantic-core (model_validate_json), en un
+seul passage. Rien, dans le modèle, ne doit forcer la conversion de l'entrée
+en objets Python (validateur `mode="wrap"` ou `"before"` sur DatRequest) :
+pydantic-core matérialiserait alors quand même l'arbre de dicts.
+
+Les erreurs gardent le format de FastAPI (422, `loc` préfixé par "body") et le
+schéma OpenAPI du corps est déclaré à la main (openapi_body), puisque la route
+ne reçoit plus le modèle en paramètre.
+"""
+from typing import Any, Dict, List, Type, TypeVar
+
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+from app.core.metrics import timed
+from app.schemas.dat import DatRequest
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+REF_TEMPLATE = "#/components/schemas/{model}"
+
+
+def _body_errors(error: ValidationError) -> List[Dict[str, Any]]:
+    errors = []
+    for detail in error.errors(include_url=False):
+        detail["loc"] = ("body", *detail["loc"])
+        if detail["type"] == "json_invalid":
+            # L'entrée serait le corps entier, renvoyé tel quel au client
+            detail.pop("input", None)
+        errors.append(detail)
+    return errors
+
+
+def parse_body(model_cls: Type[ModelT], body: bytes) -> ModelT:
+    """Valide le corps brut contre `model_cls` ; RequestValidationError (422) sinon."""
+    if not body:
+        raise RequestValidationError([{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}])
+    try:
+        with timed("validation"):
+            return model_cls.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(_body_errors(e))
+
+
+async def dat_request_body(request: Request) -> DatRequest:
+    """Dépendance FastAPI : le formulaire DatRequest validé depuis les octets du corps."""
+    return parse_body(DatRequest, await request.body())
+
+
+def openapi_body(model_cls: Type[BaseModel]) -> Dict[str, Any]:
+    """`openapi_extra` d'une route dont le corps JSON est un `model_cls` lu par parse_body."""
+    return {"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": REF_TEMPLATE.format(model=model_cls.__name__)}}},
+    }}
+
+
+def install_openapi_schemas(app: FastAPI, *models: Type[BaseModel]) -> None:
+    """Ajoute aux composants OpenAPI les modèles référencés par openapi_body."""
+    default_openapi = app.openapi
+
+    def openapi() -> Dict[str, Any]:
+        if app.openapi_schema is not None:
+            return app.openapi_schema
+        schema = default_openapi()
+        components = schema.setdefault("components", {}).setdefault("schemas", {})
+        for model_cls in models:
+            definition = model_cls.model_json_schema(ref_template=REF_TEMPLATE)
+            for name, sub_schema in definition.pop("$defs", {}).items():
+                components.setdefault(name, sub_schema)
+            components.setdefault(model_cls.__name__, definition)
+        return schema
+
+    app.openapi = openapi
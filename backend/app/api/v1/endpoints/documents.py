@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
+from app.api.v1.responses import artifact_response
+from app.services.pipeline import document_service
+from typing import Optional
+
+router = APIRouter()
+
+
+def _document_response(document_id: str, range: Optional[str], if_none_match: Optional[str],
+                       if_range: Optional[str], head: bool = False) -> Response:
+    # Lecture des métadonnées et ouverture du fichier : appels bloquants, routes synchrones (threadpool)
+    artifact = document_service.artifacts.get(document_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Document introuvable ou expiré.")
+    return artifact_response(artifact, range, if_none_match, if_range, head=head)
+
+
+@router.get("/documents/{document_id}", name="get_document")
+def get_document(
+    document_id: str,
+    range: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    if_range: Optional[str] = Header(default=None),
+):
+    """
+    Télécharge un document déjà généré (identifiant renvoyé dans X-Document-Id),
+    sans nouveau rendu ; ETag / If-None-Match et requêtes partielles (Range).
+    """
+    return _document_response(document_id, range, if_none_match, if_range)
+
+
+@router.head("/documents/{document_id}", include_in_schema=False)
+def head_document(
+    document_id: str,
+    range: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    if_range: Optional[str] = Header(default=None),
+):
+    """En-têtes de GET /documents/{id}, sans le contenu."""
+    return _document_response(document_id, range, if_none_match, if_range, head=True)
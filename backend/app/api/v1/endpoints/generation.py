@@ -1,101 +1,110 @@
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import FileResponse
+import logging
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.api.v1.body import dat_request_body, openapi_body
+from app.api.v1.responses import document_response
+from app.core import config
+from app.schemas.batch import BatchRequest
 from app.schemas.dat import DatRequest
-from app.services.doc_generator import DocumentService
-import os
-import subprocess
-import tempfile
-from typing import Literal
+from app.services.batch import batch_generator
+from app.services.bulk_import import UnknownImport, import_store
+from app.services.converter import ConversionError, ConversionTimeout
+from app.services.concurrency import ServiceSaturated
+from app.services.pipeline import DocumentGenerationError, document_service, generate_document
+from app.services.profiling import ProfilingForbidden, profiler
+from app.services.template_cache import UnknownTemplate
+from typing import List, Literal, Optional
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _resolve_template(name: Optional[str]) -> str:
+    try:
+        return document_service.templates.resolve(name)
+    except UnknownTemplate as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def apply_imports(data: DatRequest, imports: List[str]) -> DatRequest:
+    """Sections importées (POST /imports/{section}) reprises dans le formulaire."""
+    try:
+        return import_store.apply(data, imports)
+    except UnknownImport as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 
-# On instancie le service qui va manipuler le document Word
-document_service = DocumentService()
+# Fonction synchrone : describe() lit et hashe les fichiers, FastAPI l'exécute dans un thread
+@router.get("/templates")
+def list_templates():
+    """Templates disponibles, avec leur version (hash du contenu)."""
+    return document_service.templates.describe()
 
-@router.post("/generate")
+
+@router.post("/generate", openapi_extra=openapi_body(DatRequest))
 async def generate_dat(
-    data: DatRequest,
-    format: Literal["docx", "pdf", "odt"] = Query(default="docx", description="Format de sortie")
+    request: Request,
+    # Validé directement depuis les octets du corps (voir app/api/v1/body.py)
+    data: DatRequest = Depends(dat_request_body),
+    format: Literal["docx", "pdf", "odt"] = Query(default="docx", description="Format de sortie"),
+    template: Optional[str] = Query(default=None, description="Template à utiliser (voir GET /templates)"),
+    imports: List[str] = Query(default=[], description="Imports d'inventaires à reprendre (voir POST /imports)"),
+    profile: Optional[str] = Query(default=None, description="Profilage (admin) : cprofile ou collapsed"),
+    x_darwin_profile: Optional[str] = Header(default=None),
+    x_admin_token: Optional[str] = Header(default=None),
 ):
+    template = _resolve_template(template)
+    data = apply_imports(data, imports)
+    try:
+        session = profiler.session_for(profile or x_darwin_profile, x_admin_token)
+    except ProfilingForbidden as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     try:
-        # 1. On génère d'abord le fichier DOCX
-        docx_path = document_service.generate_dat(data.model_dump()) 
-        
-        # 2. Vérification de sécurité
-        if not docx_path or not os.path.exists(docx_path):
-            print(f"Erreur : Le fichier {docx_path} n'a pas été trouvé sur le serveur.")
-            raise HTTPException(status_code=500, detail="Erreur lors de la création du fichier Word.")
+        async with profiler.activate(session):
+            document = await generate_document(data, format, template=template)
+        response = document_response(document)
+        if document.id is not None:
+            # Retéléchargeable sans nouveau rendu, avec ETag et Range
+            response.headers["Content-Location"] = str(request.url_for("get_document", document_id=document.id))
+        if session is not None:
+            # Récupérable via GET /api/v1/profiles/{id}
+            response.headers["X-Profile-Id"] = session.id
+        return response
 
-        # 3. Si format = docx, retourner directement
-        if format == "docx":
-            return FileResponse(
-                path=docx_path,
-                filename=f"DAT_{data.titre_projet}.docx",
-                media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-            )
-        
-        # 4. Conversion vers PDF ou ODT avec LibreOffice
-        output_dir = tempfile.gettempdir()
-        base_name = os.path.splitext(os.path.basename(docx_path))[0]
-        
-        if format == "pdf":
-            # Conversion DOCX -> PDF
-            output_format = "pdf"
-            media_type = "application/pdf"
-            extension = "pdf"
-        else:  # odt
-            # Conversion DOCX -> ODT
-            output_format = "odt"
-            media_type = "application/vnd.oasis.opendocument.text"
-            extension = "odt"
-        
-        try:
-            # Utiliser LibreOffice pour la conversion
-            result = subprocess.run([
-                "libreoffice",
-                "--headless",
-                "--convert-to", output_format,
-                "--outdir", output_dir,
-                docx_path
-            ], capture_output=True, text=True, timeout=60)
-            
-            if result.returncode != 0:
-                print(f"LibreOffice error: {result.stderr}")
-                # Fallback: si LibreOffice échoue, retourner le DOCX
-                if format == "pdf":
-                    raise HTTPException(
-                        status_code=500, 
-                        detail="Conversion PDF non disponible. LibreOffice requis."
-                    )
-                # Pour ODT, essayer avec python-pptx alternative
-                raise HTTPException(
-                    status_code=500, 
-                    detail="Conversion ODT non disponible. LibreOffice requis."
-                )
-            
-            output_path = os.path.join(output_dir, f"{base_name}.{extension}")
-            
-            if not os.path.exists(output_path):
-                raise HTTPException(status_code=500, detail=f"Fichier {extension.upper()} non généré.")
-            
-            return FileResponse(
-                path=output_path,
-                filename=f"DAT_{data.titre_projet}.{extension}",
-                media_type=media_type
-            )
-            
-        except subprocess.TimeoutExpired:
-            raise HTTPException(status_code=500, detail="Timeout lors de la conversion.")
-        except FileNotFoundError:
-            # LibreOffice n'est pas installé
-            if format != "docx":
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Conversion {format.upper()} non disponible. LibreOffice n'est pas installé."
-                )
-        
+    except ServiceSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DocumentGenerationError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except ConversionTimeout:
+        raise HTTPException(status_code=500, detail="Timeout lors de la conversion.")
+    except ConversionError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERREUR GÉNÉRATION : {str(e)}")
+        logger.exception("Erreur de génération")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/generate/batch")
+async def generate_batch(batch: BatchRequest):
+    """
+    Génère plusieurs DAT en parallèle et renvoie une archive ZIP en streaming.
+    Les documents en échec sont listés dans rapport.json sans bloquer le reste du lot.
+    """
+    if not batch.documents:
+        raise HTTPException(status_code=422, detail="Le lot ne contient aucun document.")
+    if len(batch.documents) > config.BATCH_MAX_DOCUMENTS:
+        raise HTTPException(status_code=413,
+                            detail=f"Lot trop volumineux (maximum {config.BATCH_MAX_DOCUMENTS} documents).")
+
+    template = _resolve_template(batch.template)
+    return StreamingResponse(
+        batch_generator.stream_zip(batch.documents, batch.format, template),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="DAT_lot.zip"'}
+    )
@@ -0,0 +1,54 @@
+import asyncio
+import codecs
+
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from app.schemas.imports import ImportReport
+from app.services.bulk_import import (IMPORT_FORMATS, SECTIONS, ImportFormatError, detect_format, import_store,
+                                      parse_rows)
+from typing import Literal, Optional
+
+router = APIRouter()
+
+
+@router.post("/imports/{section}", response_model=ImportReport, status_code=201)
+async def import_section(
+    section: str,
+    file: UploadFile = File(..., description="Inventaire CSV (avec en-tête) ou NDJSON (un objet par ligne)"),
+    format: Optional[Literal["csv", "ndjson"]] = Query(default=None, description="Format (sinon déduit du nom du fichier)"),
+    encoding: str = Query(default="utf-8-sig", description="Encodage du fichier (ex. cp1252)"),
+):
+    """
+    Importe une section liste du DAT (vms, flux_reseau, echanges_donnees...) ligne à ligne.
+    Les lignes valides sont gardées côté serveur : passer `import_id` à /generate ou /jobs (paramètre imports).
+    """
+    if section not in SECTIONS:
+        raise HTTPException(status_code=404,
+                            detail=f"Section inconnue : {section} (parmi {', '.join(sorted(SECTIONS))})")
+    format = format or detect_format(file.filename, file.content_type)
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=422, detail="Format non reconnu : précisez format=csv ou format=ndjson.")
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        raise HTTPException(status_code=422, detail=f"Encodage inconnu : {encoding}")
+
+    try:
+        # Le fichier est déjà sur disque (upload) : lecture et validation hors de la boucle
+        stored = await asyncio.to_thread(parse_rows, file.file, section, format, encoding)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return import_store.save(stored).report()
+
+
+@router.get("/imports/{import_id}", response_model=ImportReport)
+async def get_import(import_id: str):
+    stored = import_store.get(import_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Import inconnu ou expiré.")
+    return stored.report()
+
+
+@router.delete("/imports/{import_id}", status_code=204)
+async def delete_import(import_id: str):
+    if not import_store.delete(import_id):
+        raise HTTPException(status_code=404, detail="Import inconnu ou expiré.")
@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.api.v1.body import dat_request_body, openapi_body
+from app.api.v1.endpoints.generation import apply_imports
+from app.api.v1.responses import document_response
+from app.schemas.dat import DatRequest
+from app.schemas.job import JobStatus
+from app.services.concurrency import ServiceSaturated
+from app.services.jobs import Job, job_queue
+from app.services.pipeline import document_service
+from app.services.template_cache import UnknownTemplate
+from typing import List, Literal, Optional
+
+router = APIRouter()
+
+
+def _get_job(job_id: str) -> Job:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job introuvable.")
+    return job
+
+
+def _status(request: Request, job: Job) -> JobStatus:
+    document_url = None
+    if job.result is not None and job.result.id is not None:
+        document_url = str(request.url_for("get_document", document_id=job.result.id))
+    return job.to_status(result_url=str(request.url_for("get_job_result", job_id=job.id)),
+                         document_url=document_url)
+
+
+@router.post("/jobs", response_model=JobStatus, status_code=202, openapi_extra=openapi_body(DatRequest))
+async def create_job(
+    request: Request,
+    data: DatRequest = Depends(dat_request_body),
+    format: Literal["docx", "pdf", "odt"] = Query(default="docx", description="Format de sortie"),
+    template: Optional[str] = Query(default=None, description="Template à utiliser (voir GET /templates)"),
+    imports: List[str] = Query(default=[], description="Imports d'inventaires à reprendre (voir POST /imports)"),
+):
+    """Met la génération en file et retourne l'identifiant du job sans attendre le rendu."""
+    try:
+        template = document_service.templates.resolve(template)
+    except UnknownTemplate as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    data = apply_imports(data, imports)
+    try:
+        job = await job_queue.submit(data, format, template)
+    except ServiceSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return _status(request, job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(request: Request, job_id: str):
+    return _status(request, _get_job(job_id))
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(request: Request, job_id: str):
+    """Suivi de l'avancement en Server-Sent Events, jusqu'à la fin du job."""
+    _get_job(job_id)
+
+    async def events():
+        last = None
+        async for job in job_queue.watch(job_id):
+            if await request.is_disconnected():
+                break
+            state = (job.status, job.stage)
+            if state == last:
+                # Rien de nouveau : commentaire SSE pour garder la connexion ouverte
+                yield ": keepalive\n\n"
+                continue
+            last = state
+            yield f"event: {job.status}\ndata: {_status(request, job).model_dump_json()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/jobs/{job_id}/result", name="get_job_result")
+async def get_job_result(job_id: str):
+    job = _get_job(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error or "Échec de la génération.")
+    if job.status != "done" or job.result is None:
+        raise HTTPException(status_code=409, detail="Le document n'est pas encore prêt.")
+    if not job.result.exists():
+        raise HTTPException(status_code=410, detail="Le document n'est plus disponible.")
+    # Le résultat reste téléchargeable tant que le job existe
+    return document_response(job.result, discard=False)
@@ -0,0 +1,34 @@
+import asyncio
+
+from fastapi import APIRouter, Header, Request, Response
+from fastapi.responses import HTMLResponse
+from app.api.v1.body import openapi_body, parse_body
+from app.api.v1.responses import etag_matches
+from app.core.metrics import PREVIEW_REQUESTS, timed
+from app.schemas.dat import DatRequest
+from app.services.preview import preview_renderer
+from typing import Optional
+
+router = APIRouter()
+
+# Le navigateur garde l'aperçu mais le revalide à chaque fois (If-None-Match)
+CACHE_CONTROL = "private, no-cache"
+
+
+@router.post("/preview", response_class=HTMLResponse, openapi_extra=openapi_body(DatRequest))
+async def preview_dat(request: Request, if_none_match: Optional[str] = Header(default=None)):
+    """Aperçu HTML du DAT (sans .docx ni LibreOffice) ; 304 si le formulaire n'a pas changé."""
+    body = await request.body()
+    etag = preview_renderer.etag(body)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        PREVIEW_REQUESTS.inc(result="not_modified")
+        return Response(status_code=304, headers=headers)
+
+    data = parse_body(DatRequest, body)
+
+    with timed("preview"):
+        # Les grands inventaires (milliers de VMs) ne doivent pas bloquer la boucle
+        html = await asyncio.to_thread(preview_renderer.render, data)
+    PREVIEW_REQUESTS.inc(result="rendered")
+    return HTMLResponse(html, headers=headers)
@@ -0,0 +1,19 @@
+import os
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from app.services.profiling import profiler
+from typing import Optional
+
+router = APIRouter()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """Télécharge un profil enregistré (.prof cProfile ou .collapsed pour flamegraph)."""
+    if not profiler.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profilage réservé aux administrateurs.")
+    path = profiler.find(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profil introuvable.")
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
@@ -0,0 +1,163 @@
+"""
+Construction des réponses HTTP pour les documents générés.
+
+Les documents du stockage des artefacts (GET /api/v1/documents/{id}) sont
+servis avec ETag (304 sur If-None-Match) et requêtes partielles (Range,
+If-Range) : une reprise de téléchargement ou la revalidation d'un proxy ne
+relit que ce qui manque, et ne relance jamais le rendu.
+"""
+import os
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.services.artifacts import Artifact
+from app.services.pipeline import GeneratedDocument
+from app.services.render_cache import render_cache
+
+CHUNK_SIZE = 64 * 1024
+# Le client garde le document mais le revalide à chaque fois (If-None-Match)
+CACHE_CONTROL = "private, no-cache"
+
+
+def content_disposition(filename: str) -> str:
+    """En-tête Content-Disposition, avec encodage RFC 5987 pour les noms non ASCII."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _iter_bytes(content: bytes):
+    view = memoryview(content)
+    for start in range(0, len(view), CHUNK_SIZE):
+        yield view[start:start + CHUNK_SIZE]
+
+
+def _iter_file(f, length: Optional[int] = None):
+    """Lit le fichier ouvert `f` par morceaux, jusqu'à la fin ou sur `length` octets."""
+    try:
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Vrai si l'en-tête If-None-Match désigne `etag` (comparaison faible, RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Plage (début, fin incluse) demandée par l'en-tête Range, ou None pour le
+    document entier (pas d'en-tête, syntaxe invalide ou plages multiples,
+    que l'on ne sert pas). ValueError si la plage est hors du document (416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[len("bytes="):].strip().partition("-")
+    if not sep or not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+    if not first:
+        # Suffixe : les `last` derniers octets
+        if int(last) == 0:
+            raise ValueError("Plage vide")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Plage hors du document")
+    return start, end
+
+
+def document_response(document: GeneratedDocument, discard: bool = True) -> StreamingResponse:
+    """
+    Renvoie le document en streaming, depuis la mémoire ou depuis son fichier.
+    Avec `discard`, un fichier temporaire que le cache ne garde pas est supprimé après l'envoi.
+    """
+    headers = {
+        "Content-Disposition": content_disposition(document.filename),
+        "Content-Length": str(document.size),
+    }
+    if document.id is not None:
+        headers["X-Document-Id"] = document.id
+    if document.etag is not None:
+        headers["ETag"] = document.etag
+    if document.content is not None:
+        return StreamingResponse(_iter_bytes(document.content), media_type=document.media_type,
+                                 headers=headers)
+
+    # On ouvre le fichier tout de suite : il reste lisible même s'il est supprimé ensuite
+    f = open(document.path, "rb")
+    background = None
+    if discard and document.temporary and not render_cache.holds(document):
+        background = BackgroundTask(document.discard)
+    return StreamingResponse(_iter_file(f), media_type=document.media_type, headers=headers,
+                             background=background)
+
+
+def artifact_response(artifact: Artifact, range_header: Optional[str] = None,
+                      if_none_match: Optional[str] = None, if_range: Optional[str] = None,
+                      head: bool = False) -> Response:
+    """
+    Sert un document du stockage des artefacts : 304 si If-None-Match correspond,
+    206 pour une plage satisfaisable (Range, sauf si If-Range désigne une autre
+    version), 416 pour une plage hors du document, 200 sinon.
+    """
+    headers = {
+        "ETag": artifact.etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": CACHE_CONTROL,
+        "X-Document-Id": artifact.id,
+    }
+    if etag_matches(if_none_match, artifact.etag):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = content_disposition(artifact.filename)
+    # If-Range : la plage ne vaut que pour cette version du document (comparaison forte)
+    if if_range is not None and if_range.strip() != artifact.etag:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, artifact.size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{artifact.size}"})
+
+    status_code = 200
+    start, length = 0, artifact.size
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{artifact.size}"
+    headers["Content-Length"] = str(length)
+    if head:
+        return Response(status_code=status_code, headers=headers, media_type=artifact.media_type)
+
+    # On ouvre le fichier tout de suite : il reste lisible même s'il est évincé pendant l'envoi
+    f = open(artifact.path, "rb")
+    if start:
+        f.seek(start, os.SEEK_SET)
+    return StreamingResponse(_iter_file(f, length), status_code=status_code, media_type=artifact.media_type,
+                             headers=headers)
@@ -0,0 +1,175 @@
+"""
+Configuration de l'application, lue depuis les variables d'environnement.
+"""
+import os
+import tempfile
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return value.strip().lower() in ("1", "true", "yes", "on") if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# === JOURNAUX ===
+LOG_LEVEL = os.getenv("DARWIN_LOG_LEVEL", "INFO")
+
+# === PROFILAGE ===
+# Jeton d'administration autorisant le profilage à la demande (vide = profilage explicite désactivé)
+PROFILE_TOKEN = os.getenv("DARWIN_PROFILE_TOKEN", "")
+# Profile automatiquement 1 requête /generate sur N (0 = jamais)
+PROFILE_SAMPLE_RATE = _env_int("DARWIN_PROFILE_SAMPLE_RATE", 0)
+# Mode des requêtes échantillonnées : "cprofile" ou "collapsed"
+PROFILE_SAMPLE_MODE = os.getenv("DARWIN_PROFILE_SAMPLE_MODE", "cprofile")
+# Intervalle d'échantillonnage de la pile en mode "collapsed" (secondes)
+PROFILE_SAMPLE_INTERVAL = _env_float("DARWIN_PROFILE_SAMPLE_INTERVAL", 0.005)
+PROFILE_DIR = os.getenv("DARWIN_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "darwin_profiles"))
+# Nombre de profils conservés (les plus anciens sont supprimés)
+PROFILE_MAX_FILES = _env_int("DARWIN_PROFILE_MAX_FILES", 50)
+
+# === TEMPLATES ===
+# Template utilisé quand la requête n'en désigne pas (nom du .docx sans extension)
+DEFAULT_TEMPLATE = os.getenv("DARWIN_DEFAULT_TEMPLATE", "dat_template")
+# Nombre de templates gardés compilés en mémoire (LRU)
+TEMPLATE_CACHE_SIZE = _env_int("DARWIN_TEMPLATE_CACHE_SIZE", 8)
+# Recharge à chaud les templates modifiés dans app/templates
+TEMPLATE_WATCH = _env_bool("DARWIN_TEMPLATE_WATCH", True)
+# Recharge le template HTML de l'aperçu (app/templates/preview) quand il est modifié
+PREVIEW_AUTO_RELOAD = _env_bool("DARWIN_PREVIEW_AUTO_RELOAD", TEMPLATE_WATCH)
+
+# === RENDU ===
+# Listes d'inventaire (vms, flux, DNS...) rendues sans Jinja2 ligne à ligne
+FAST_TABLES = _env_bool("DARWIN_FAST_TABLES", True)
+# Rendu incrémental : seules les sections du corps dont les données ont changé sont rendues
+INCREMENTAL_RENDER = _env_bool("DARWIN_INCREMENTAL_RENDER", True)
+# Mémoire totale du XML des sections gardé en cache (octets, taille des chaînes en mémoire)
+SECTION_CACHE_MAX_BYTES = _env_int("DARWIN_SECTION_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+
+# === IMAGES DES SCHÉMAS ===
+# Résolution cible : les images plus larges que la page à cette résolution sont réduites
+IMAGE_DPI = _env_int("DARWIN_IMAGE_DPI", 150)
+IMAGE_JPEG_QUALITY = _env_int("DARWIN_IMAGE_JPEG_QUALITY", 85)
+# Images préparées gardées en mémoire (dédupliquées par hash du contenu)
+IMAGE_CACHE_MAX_BYTES = _env_int("DARWIN_IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# === IMPORT D'INVENTAIRES (CSV / NDJSON) ===
+# Lignes acceptées par fichier importé
+IMPORT_MAX_ROWS = _env_int("DARWIN_IMPORT_MAX_ROWS", 200_000)
+# Lignes en erreur détaillées dans le rapport (les suivantes sont seulement comptées)
+IMPORT_MAX_ERRORS = _env_int("DARWIN_IMPORT_MAX_ERRORS", 1000)
+# Durée de conservation d'un import avant qu'il soit utilisé par /generate ou /jobs
+IMPORT_TTL = _env_float("DARWIN_IMPORT_TTL", 3600.0)
+# Imports gardés en mémoire au plus (les plus anciens sont oubliés)
+IMPORT_MAX_STORED = _env_int("DARWIN_IMPORT_MAX_STORED", 64)
+# Lignes validées gardées en mémoire, tous imports confondus (les plus anciens imports sont oubliés)
+IMPORT_MAX_STORED_ROWS = _env_int("DARWIN_IMPORT_MAX_STORED_ROWS", 1_000_000)
+
+# === CONVERSION LIBREOFFICE ===
+LIBREOFFICE_BIN = os.getenv("DARWIN_LIBREOFFICE_BIN", "libreoffice")
+# Nombre d'instances LibreOffice gardées chaudes (0 = conversion par subprocess uniquement)
+CONVERTER_POOL_SIZE = _env_int("DARWIN_CONVERTER_POOL_SIZE", 2)
+# Une instance est recyclée après ce nombre de conversions (limite les fuites mémoire de soffice)
+CONVERTER_MAX_JOBS = _env_int("DARWIN_CONVERTER_MAX_JOBS", 200)
+CONVERSION_TIMEOUT = _env_float("DARWIN_CONVERSION_TIMEOUT", 60.0)
+CONVERTER_STARTUP_TIMEOUT = _env_float("DARWIN_CONVERTER_STARTUP_TIMEOUT", 30.0)
+# Sans pool : conversions d'un même format regroupées en un appel LibreOffice pendant
+# cette fenêtre (secondes, 0 = une conversion par appel), jusqu'à CONVERTER_BATCH_MAX fichiers
+CONVERTER_BATCH_WINDOW = _env_float("DARWIN_CONVERTER_BATCH_WINDOW", 0.2)
+CONVERTER_BATCH_MAX = _env_int("DARWIN_CONVERTER_BATCH_MAX", 16)
+# Taille totale des fichiers d'un lot : au-delà, la conversion suivante ouvre un autre lot
+CONVERTER_BATCH_MAX_BYTES = _env_int("DARWIN_CONVERTER_BATCH_MAX_BYTES", 64 * 1024 * 1024)
+# Délai accordé à un lot : CONVERSION_TIMEOUT plus ce délai par fichier supplémentaire (secondes)
+CONVERTER_BATCH_FILE_TIMEOUT = _env_float("DARWIN_CONVERTER_BATCH_FILE_TIMEOUT", 10.0)
+# Sans pool : profils LibreOffice isolés gardés pour être réutilisés entre deux conversions
+CONVERTER_PROFILE_POOL = _env_int("DARWIN_CONVERTER_PROFILE_POOL", os.cpu_count() or 1)
+
+# === CONCURRENCE ===
+# Rendus docxtpl exécutés en parallèle (threads hors de la boucle asyncio)
+RENDER_MAX_WORKERS = _env_int("DARWIN_RENDER_MAX_WORKERS", min(4, os.cpu_count() or 1))
+# Conversions LibreOffice exécutées en parallèle
+# (en mode lot, les threads attendent surtout leur lot : assez pour le remplir)
+CONVERT_MAX_WORKERS = _env_int("DARWIN_CONVERT_MAX_WORKERS", max(
+    CONVERTER_POOL_SIZE, CONVERTER_BATCH_MAX if CONVERTER_BATCH_WINDOW > 0 else 1, 1))
+# Requêtes autorisées à attendre une place ; au-delà on répond 503 immédiatement
+MAX_PENDING_JOBS = _env_int("DARWIN_MAX_PENDING_JOBS", 16)
+# Attente maximale d'une place avant de répondre 503
+QUEUE_TIMEOUT = _env_float("DARWIN_QUEUE_TIMEOUT", 30.0)
+# Valeur de l'en-tête Retry-After (secondes) renvoyée quand le service est saturé
+RETRY_AFTER = _env_int("DARWIN_RETRY_AFTER", 5)
+
+# === JOBS ASYNCHRONES ===
+# Workers in-process qui traitent la file de jobs
+JOB_WORKERS = _env_int("DARWIN_JOB_WORKERS", RENDER_MAX_WORKERS)
+# Taille maximale de la file ; au-delà, POST /jobs répond 503
+MAX_QUEUED_JOBS = _env_int("DARWIN_MAX_QUEUED_JOBS", 100)
+# Durée de conservation d'un job terminé (secondes)
+JOB_TTL = _env_float("DARWIN_JOB_TTL", 3600.0)
+# Nombre maximal de jobs gardés (en file, en cours ou terminés) ; les plus anciens terminés partent en premier
+MAX_JOBS = _env_int("DARWIN_MAX_JOBS", 1000)
+# Tentatives d'un job face à un service saturé avant de le marquer en échec
+JOB_MAX_ATTEMPTS = _env_int("DARWIN_JOB_MAX_ATTEMPTS", 20)
+
+# === CACHE DE RENDU ===
+# Taille totale des documents gardés en cache (0 = cache désactivé)
+RENDER_CACHE_MAX_BYTES = _env_int("DARWIN_RENDER_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+# Durée de vie d'une entrée du cache (secondes)
+RENDER_CACHE_TTL = _env_float("DARWIN_RENDER_CACHE_TTL", 600.0)
+
+# === CACHE PARTAGÉ ENTRE WORKERS ===
+# Répertoire du cache disque commun aux processus (vide = désactivé ; activé par app.server)
+SHARED_CACHE_DIR = os.getenv("DARWIN_SHARED_CACHE_DIR", "")
+SHARED_CACHE_MAX_BYTES = _env_int("DARWIN_SHARED_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+SHARED_CACHE_TTL = _env_float("DARWIN_SHARED_CACHE_TTL", 3600.0)
+# Attente maximale du rendu d'un autre worker pour la même clé, avant de rendre soi-même
+SHARED_CACHE_LOCK_TIMEOUT = _env_float("DARWIN_SHARED_CACHE_LOCK_TIMEOUT", 90.0)
+# Intervalle entre deux parcours du répertoire (entrées expirées, quota) ; plus tôt si le quota est dépassé
+SHARED_CACHE_PRUNE_INTERVAL = _env_float("DARWIN_SHARED_CACHE_PRUNE_INTERVAL", 60.0)
+
+# === STOCKAGE DES DOCUMENTS GÉNÉRÉS ===
+# "memory" : rendu en mémoire et renvoyé en streaming ; "disk" : écrit dans generated_docs
+OUTPUT_MODE = os.getenv("DARWIN_OUTPUT_MODE", "memory")
+# Au-delà de cette taille, un document en mémoire est déversé dans un fichier temporaire
+SPOOL_THRESHOLD = _env_int("DARWIN_SPOOL_THRESHOLD", 32 * 1024 * 1024)
+SPOOL_DIR = os.getenv("DARWIN_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "darwin_spool"))
+# Documents produits, téléchargeables via GET /api/v1/documents/{id} (commun aux workers d'un hôte).
+# Vide = stockage désactivé ; sinon un répertoire propre au service (créé en 0700)
+ARTIFACT_DIR = os.getenv("DARWIN_ARTIFACT_DIR", "")
+# Clé secrète des identifiants de documents (HMAC de la clé de cache) ; à partager entre les workers
+# pour qu'ils retrouvent les documents les uns des autres (vide = clé aléatoire propre au processus)
+ARTIFACT_SECRET = os.getenv("DARWIN_ARTIFACT_SECRET", "")
+# Taille totale des documents conservés (0 = stockage désactivé) ; au-delà, les moins récemment téléchargés sont supprimés
+ARTIFACT_MAX_BYTES = _env_int("DARWIN_ARTIFACT_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+# Durée de conservation d'un document (secondes)
+ARTIFACT_TTL = _env_float("DARWIN_ARTIFACT_TTL", 24 * 3600.0)
+# Période du nettoyage en arrière-plan (expirations, quota, fichiers de spool abandonnés)
+ARTIFACT_SWEEP_INTERVAL = _env_float("DARWIN_ARTIFACT_SWEEP_INTERVAL", 60.0)
+
+# === GÉNÉRATION PAR LOT ===
+# Processus de rendu dédiés aux lots (le rendu docxtpl est limité par le GIL)
+BATCH_MAX_WORKERS = _env_int("DARWIN_BATCH_MAX_WORKERS", os.cpu_count() or 1)
+# Nombre maximal de documents par lot
+BATCH_MAX_DOCUMENTS = _env_int("DARWIN_BATCH_MAX_DOCUMENTS", 500)
+
+# === SERVEUR (python -m app.server) ===
+SERVER_HOST = os.getenv("DARWIN_HOST", "0.0.0.0")
+SERVER_PORT = _env_int("DARWIN_PORT", 8000)
+# Nombre de processus workers (0 = un par cœur disponible)
+SERVER_WORKERS = _env_int("DARWIN_WORKERS", 0)
+# Préchauffage (template, rendu à vide, LibreOffice) avant d'accepter du trafic
+WARMUP = _env_bool("DARWIN_WARMUP", True)
+# Préchauffage en arrière-plan : le worker accepte tout de suite les connexions
+# et /readyz répond 503 jusqu'à la fin du préchauffage (sondes Kubernetes...)
+WARMUP_BACKGROUND = _env_bool("DARWIN_WARMUP_BACKGROUND", False)
+# /readyz exige un LibreOffice disponible (déploiements qui servent du PDF / ODT)
+READY_REQUIRES_CONVERTER = _env_bool("DARWIN_READY_REQUIRES_CONVERTER", False)
+# À l'arrêt : délai laissé aux requêtes, jobs et conversions en cours pour se terminer
+GRACEFUL_TIMEOUT = _env_float("DARWIN_GRACEFUL_TIMEOUT", 90.0)
@@ -0,0 +1,86 @@
+"""
+Logs structurés (une ligne JSON par événement) avec l'identifiant de requête.
+
+Les appels de log ne font que déposer l'enregistrement dans une file
+(QueueHandler) ; l'écriture sur la sortie se fait dans le thread d'un
+QueueListener, pour ne jamais bloquer la boucle asyncio ni les rendus.
+"""
+import json
+import logging
+import queue
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core import config
+
+# Identifiant de la requête HTTP en cours (propagé aux threads des pools)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Ajoute l'identifiant de requête courant à chaque enregistrement."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON : horodatage, niveau, logger, message, request_id et champs `extra={"fields": ...}`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = config.LOG_LEVEL) -> None:
+    """Configure le logger `app` (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    # Le message est déjà mis en forme (JSON) par le QueueHandler
+    stream.setFormatter(logging.Formatter("%(message)s"))
+
+    records: queue.Queue = queue.Queue(-1)
+    handler = QueueHandler(records)
+    handler.setFormatter(JsonFormatter())
+    # Le filtre s'exécute dans le thread appelant : le ContextVar y est lisible
+    handler.addFilter(RequestIdFilter())
+
+    logger = logging.getLogger("app")
+    logger.setLevel(level.upper())
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    _listener = QueueListener(records, stream)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Vide la file et arrête le thread d'écriture."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        logger = logging.getLogger("app")
+        for handler in list(logger.handlers):
+            if isinstance(handler, QueueHandler):
+                logger.removeHandler(handler)
@@ -0,0 +1,234 @@
+"""
+Métriques de l'API au format texte Prometheus (GET /metrics).
+
+Implémentation volontairement minimale (compteurs, jauges, histogrammes avec
+labels) pour ne pas ajouter de dépendance : les valeurs sont gardées en mémoire
+dans le processus. Les jauges peuvent être calculées à la lecture via
+`set_function` (files d'attente, tâches en cours...).
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Secondes : de quelques millisecondes (nettoyage) à la minute (conversion LibreOffice)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Octets : de 10 Ko à 100 Mo
+SIZE_BUCKETS = (10e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6, 100e6)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """Base commune : nom, aide, labels et verrou."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._functions: Dict[LabelKey, Callable[[], float]] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} : labels attendus {self.label_names}, reçus {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+        """La valeur de cette série est calculée par `fn` à chaque lecture."""
+        self._functions[self._key(labels)] = fn
+
+    def samples(self) -> List[Tuple[str, LabelKey, Sequence[str], float]]:
+        """(suffixe, valeurs des labels, noms des labels, valeur)."""
+        samples = []
+        for key, fn in list(self._functions.items()):
+            try:
+                samples.append(("", key, self.label_names, float(fn())))
+            except Exception:
+                logger.exception("Métrique %s illisible", self.name)
+        return samples
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, names, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [("", key, self.label_names, value) for key, value in values] + super().samples()
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> (compte par tranche, somme, nombre)
+        self._series: Dict[LabelKey, List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        names = self.label_names + ("le",)
+        samples = []
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", key + (_format_value(bound),), names, cumulative))
+            samples.append(("_sum", key, self.label_names, total))
+            samples.append(("_count", key, self.label_names, count))
+        return samples
+
+
+class Registry:
+    """Ensemble des métriques exposées par /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "darwin_stage_duration_seconds",
+    "Durée de chaque étape de génération (validation, clean, template_load, render, save, convert).",
+    labels=("stage",)))
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "darwin_http_request_duration_seconds",
+    "Durée des requêtes HTTP jusqu'à l'envoi des en-têtes.",
+    labels=("method", "route", "status")))
+OUTPUT_BYTES = registry.register(Histogram(
+    "darwin_output_size_bytes", "Taille des documents produits.",
+    labels=("format",), buckets=SIZE_BUCKETS))
+CONVERSION_BATCH_SIZE = registry.register(Histogram(
+    "darwin_conversion_batch_size", "Nombre de fichiers par appel LibreOffice en mode lot.",
+    labels=("format",), buckets=(1, 2, 4, 8, 16, 32, 64)))
+CONVERSION_FAILURES = registry.register(Counter(
+    "darwin_conversion_failures_total", "Conversions LibreOffice en échec, par cause.",
+    labels=("format", "reason")))
+EXECUTOR_IN_FLIGHT = registry.register(Gauge(
+    "darwin_executor_in_flight", "Tâches en cours d'exécution dans chaque pool.", labels=("executor",)))
+EXECUTOR_PENDING = registry.register(Gauge(
+    "darwin_executor_pending", "Tâches en attente d'une place dans chaque pool.", labels=("executor",)))
+EXECUTOR_WAIT_SECONDS = registry.register(Histogram(
+    "darwin_executor_wait_seconds", "Attente avant d'obtenir une place dans le pool.", labels=("executor",)))
+EXECUTOR_REJECTIONS = registry.register(Counter(
+    "darwin_executor_rejections_total", "Requêtes refusées (503) faute de place, par cause.",
+    labels=("executor", "reason")))
+JOBS_QUEUED = registry.register(Gauge("darwin_jobs_queued", "Jobs en file d'attente."))
+RENDER_CACHE_EVENTS = registry.register(Counter(
+    "darwin_render_cache_requests_total", "Consultations du cache de rendu.", labels=("result",)))
+RENDER_CACHE_BYTES = registry.register(Gauge(
+    "darwin_render_cache_bytes", "Taille des documents gardés dans le cache de rendu."))
+IMAGE_CACHE_EVENTS = registry.register(Counter(
+    "darwin_image_cache_requests_total", "Images de schémas déjà préparées (hit) ou à traiter (miss).",
+    labels=("result",)))
+PREVIEW_REQUESTS = registry.register(Counter(
+    "darwin_preview_requests_total", "Aperçus HTML rendus (rendered) ou servis en 304 (not_modified).",
+    labels=("result",)))
+SECTION_CACHE_EVENTS = registry.register(Counter(
+    "darwin_section_cache_requests_total", "Sections du corps réutilisées (hit) ou rendues (miss).",
+    labels=("result",)))
+ARTIFACT_BYTES = registry.register(Gauge(
+    "darwin_artifact_store_bytes", "Taille des documents conservés dans le stockage des artefacts."))
+ARTIFACT_EVICTIONS = registry.register(Counter(
+    "darwin_artifact_evictions_total", "Documents supprimés du stockage, par cause (ttl, quota).",
+    labels=("reason",)))
+SHARED_CACHE_EVENTS = registry.register(Counter(
+    "darwin_shared_cache_requests_total", "Consultations du cache disque partagé entre workers.",
+    labels=("result",)))
+
+
+@contextmanager
+def timed(stage: str, **fields) -> Iterator[None]:
+    """Mesure une étape : histogramme par étape et ligne de log structurée (niveau DEBUG)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("étape %s", stage, extra={"fields": {"stage": stage, "duration_s": round(elapsed, 6), **fields}})
+
+
+def render_latest() -> str:
+    """Texte Prometheus de toutes les métriques."""
+    return registry.render()
@@ -1,9 +1,76 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api.v1.body import install_openapi_schemas
+from app.api.v1.endpoints.documents import router as documents_router
 # ✅ CET IMPORT EST CELUI QUI MANQUAIT :
 from app.api.v1.endpoints.generation import router as generation_router
+from app.api.v1.endpoints.imports import router as imports_router
+from app.api.v1.endpoints.jobs import router as jobs_router
+from app.api.v1.endpoints.preview import router as preview_router
+from app.api.v1.endpoints.profiles import router as profiles_router
+from app.core import config
+from app.core.logs import request_id_var, setup_logging, shutdown_logging
+from app.core.metrics import HTTP_REQUEST_SECONDS, render_latest
+from app.schemas.dat import DatRequest
+from app.services.batch import batch_generator
+from app.services.concurrency import convert_executor, render_executor
+from app.services.jobs import job_queue
+from app.services.pipeline import converter, document_service, flush_stores
+from app.services.warmup import readiness, warmup
+
+logger = logging.getLogger("app.http")
+
+
+async def _run_warmup() -> None:
+    try:
+        await asyncio.to_thread(warmup)
+    except Exception:
+        # Déjà journalisé par warmup ; le worker démarre quand même et
+        # /readyz reste en 503 avec l'erreur (le répartiteur ne l'utilise pas)
+        pass
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    if config.TEMPLATE_WATCH:
+        document_service.templates.start_watching()
+    # Quota, TTL et fichiers abandonnés du stockage des documents
+    document_service.artifacts.start_sweeper()
+    warmup_task = None
+    if not config.WARMUP:
+        readiness.skip()
+    elif config.WARMUP_BACKGROUND:
+        # Connexions acceptées tout de suite ; /readyz attend la fin du préchauffage
+        warmup_task = asyncio.create_task(_run_warmup())
+    else:
+        # Le worker n'accepte de connexions qu'une fois le démarrage (lifespan) terminé
+        await _run_warmup()
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        await asyncio.wait([warmup_task], timeout=config.GRACEFUL_TIMEOUT)
+    # Arrêt : les jobs en cours peuvent se terminer, dans la limite du délai de grâce
+    await job_queue.stop(timeout=config.GRACEFUL_TIMEOUT)
+    # Arrêt propre : on laisse finir les rendus / conversions en cours
+    render_executor.shutdown()
+    batch_generator.shutdown()
+    convert_executor.shutdown()
+    # puis on arrête les instances LibreOffice du pool
+    converter.shutdown()
+    document_service.templates.stop_watching()
+    await flush_stores()
+    document_service.artifacts.stop_sweeper()
+    shutdown_logging()
+
 
-app = FastAPI(title="DARWIN API")
+app = FastAPI(title="DARWIN API", lifespan=lifespan)
 
 # --- CONFIGURATION CORS ---
 # Indispensable pour que ton React puisse parler à FastAPI
@@ -13,10 +80,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Identifiant du document généré, pour le retélécharger via /api/v1/documents/{id}
+    expose_headers=["X-Document-Id", "Content-Location"],
 )
 
 # ✅ ON UTILISE LE NOM QU'ON A DONNÉ DANS L'IMPORT CI-DESSUS
 app.include_router(generation_router, prefix="/api/v1")
+app.include_router(jobs_router, prefix="/api/v1")
+app.include_router(documents_router, prefix="/api/v1")
+app.include_router(imports_router, prefix="/api/v1")
+app.include_router(preview_router, prefix="/api/v1")
+app.include_router(profiles_router, prefix="/api/v1")
+# Corps validés depuis leurs octets (app/api/v1/body.py) : schéma déclaré à part
+install_openapi_schemas(app, DatRequest)
+
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Identifiant de requête (X-Request-ID), durée par route et ligne de log."""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        # Gabarit de la route (/api/v1/jobs/{job_id}) pour borner le nombre de séries
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=str(status))
+        logger.info("%s %s %d", request.method, route, status, extra={"fields": {
+            "method": request.method, "route": route, "status": status, "duration_s": round(elapsed, 6)}})
+        request_id_var.reset(token)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """Sonde de disponibilité : 200 une fois le worker préchauffé, 503 avant ou après un échec."""
+    return JSONResponse(readiness.snapshot(), status_code=200 if readiness.ready else 503)
+
 
 @app.get("/")
 def read_root():
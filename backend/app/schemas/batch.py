@@ -0,0 +1,23 @@
+"""
+Schémas Pydantic de la génération par lot
+"""
+from pydantic import BaseModel, Field
+from typing import Any, List, Literal, Optional
+
+
+class BatchRequest(BaseModel):
+    """Lot de DAT à générer en une seule requête"""
+    # Chaque document est validé séparément : une entrée invalide (y compris autre chose
+    # qu'un objet JSON) n'invalide pas le lot
+    documents: List[Any] = Field(default_factory=list, description="Données DatRequest de chaque document")
+    format: Literal["docx", "pdf", "odt"] = Field(default="docx", description="Format de sortie")
+    template: Optional[str] = Field(default=None, description="Template à utiliser (par défaut : DEFAULT_TEMPLATE)")
+
+
+class BatchItemReport(BaseModel):
+    """Résultat de la génération d'un document du lot"""
+    index: int = Field(description="Position du document dans le lot")
+    titre_projet: str = Field(default="", description="Titre du projet")
+    status: Literal["ok", "error"] = Field(description="Résultat de la génération")
+    filename: Optional[str] = Field(default=None, description="Nom du fichier dans l'archive")
+    error: Optional[str] = Field(default=None, description="Message d'erreur")
@@ -6,6 +6,10 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 
 
+# Marqueur des champs saisis dans l'éditeur riche (HTML à convertir en texte pour Word)
+HTML_FIELD = {"format": "html"}
+
+
 # === INTRODUCTION ===
 
 class DocumentReference(BaseModel):
@@ -35,7 +39,7 @@ class SchemaFonctionnel(BaseModel):
     """Schéma fonctionnel avec image"""
     titre: str = Field(default="", description="Titre du schéma")
     description: str = Field(default="", description="Description du schéma")
-    image: str = Field(default="", description="Chemin de l'image (optionnel)")
+    image: str = Field(default="", description="Image du schéma : data URL (data:image/png;base64,...) ou base64 (optionnel)")
 
 
 class BriqueFonctionnelle(BaseModel):
@@ -166,7 +170,7 @@ class DatRequest(BaseModel):
     description_doc: str = Field(default="", description="Description du document")
     
     # === INTRODUCTION ===
-    objet_document: str = Field(default="", description="Objet du document")
+    objet_document: str = Field(default="", description="Objet du document", json_schema_extra=HTML_FIELD)
     documents_reference: List[DocumentReference] = Field(default_factory=list)
     glossaire: List[GlossaireItem] = Field(default_factory=list)
     
@@ -174,27 +178,27 @@ class DatRequest(BaseModel):
     acteurs: List[Acteur] = Field(default_factory=list)
     has_schema: bool = Field(default=False, description="Présence de schéma fonctionnel")
     schemas: List[SchemaFonctionnel] = Field(default_factory=list)
-    schema_description: str = Field(default="", description="Description du schéma fonctionnel")
+    schema_description: str = Field(default="", description="Description du schéma fonctionnel", json_schema_extra=HTML_FIELD)
     briques_fonctionnelles: List[BriqueFonctionnelle] = Field(default_factory=list)
     echanges_donnees: List[EchangeDonnees] = Field(default_factory=list)
     
     # === SPÉCIFICATIONS TECHNIQUES ===
     composants_physiques: List[ComposantPhysique] = Field(default_factory=list)
-    description_architecture: str = Field(default="", description="Description de l'architecture")
-    description_authentification: str = Field(default="", description="Description de l'authentification")
-    description_administrationtechnique: str = Field(default="", description="Administration technique")
-    description_adminfonctionnelle: str = Field(default="", description="Administration fonctionnelle")
-    description_interapplicative: str = Field(default="", description="Administration inter-applicative")
+    description_architecture: str = Field(default="", description="Description de l'architecture", json_schema_extra=HTML_FIELD)
+    description_authentification: str = Field(default="", description="Description de l'authentification", json_schema_extra=HTML_FIELD)
+    description_administrationtechnique: str = Field(default="", description="Administration technique", json_schema_extra=HTML_FIELD)
+    description_adminfonctionnelle: str = Field(default="", description="Administration fonctionnelle", json_schema_extra=HTML_FIELD)
+    description_interapplicative: str = Field(default="", description="Administration inter-applicative", json_schema_extra=HTML_FIELD)
     flux_reseau: List[FluxReseau] = Field(default_factory=list)
     choix_technologiques: List[ChoixTechnologique] = Field(default_factory=list)
     segmentation_dr: str = Field(default="Non", description="Données DR ou sensibles")
     dns_nom: List[DnsNom] = Field(default_factory=list)
     
     # === CYCLE DE VIE ===
-    deploiement: str = Field(default="", description="Stratégie de déploiement")
-    migration_reprise: str = Field(default="", description="Migration/Reprise de données")
-    supervision: str = Field(default="", description="Supervision et observabilité")
-    sauvegarde_restauration: str = Field(default="", description="Sauvegardes et restauration")
+    deploiement: str = Field(default="", description="Stratégie de déploiement", json_schema_extra=HTML_FIELD)
+    migration_reprise: str = Field(default="", description="Migration/Reprise de données", json_schema_extra=HTML_FIELD)
+    supervision: str = Field(default="", description="Supervision et observabilité", json_schema_extra=HTML_FIELD)
+    sauvegarde_restauration: str = Field(default="", description="Sauvegardes et restauration", json_schema_extra=HTML_FIELD)
     
     # === DÉPENDANCES ===
     dependances_externes: List[DependanceExterne] = Field(default_factory=list)
@@ -206,8 +210,8 @@ class DatRequest(BaseModel):
     bases_donnees: List[BaseDeDonnees] = Field(default_factory=list)
     stockage: List[Stockage] = Field(default_factory=list)
     partages_nfs: List[PartageNFS] = Field(default_factory=list)
-    contraintes: str = Field(default="", description="Contraintes spécifiques")
-    niveau_services: str = Field(default="", description="Niveau de service attendu")
+    contraintes: str = Field(default="", description="Contraintes spécifiques", json_schema_extra=HTML_FIELD)
+    niveau_services: str = Field(default="", description="Niveau de service attendu", json_schema_extra=HTML_FIELD)
 
     class Config:
         json_schema_extra = {
@@ -0,0 +1,24 @@
+"""
+Schémas Pydantic de l'import d'inventaires (CSV / NDJSON)
+"""
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class RowError(BaseModel):
+    """Ligne rejetée lors d'un import"""
+    line: int = Field(description="Numéro de ligne dans le fichier (l'en-tête CSV est la ligne 1)")
+    field: Optional[str] = Field(default=None, description="Colonne en cause, si elle est connue")
+    message: str = Field(description="Motif du rejet")
+
+
+class ImportReport(BaseModel):
+    """Résultat d'un import d'inventaire"""
+    import_id: str = Field(description="Identifiant à passer à /generate ou /jobs (paramètre imports)")
+    section: str = Field(description="Section du DAT alimentée (vms, flux_reseau...)")
+    format: str = Field(description="Format du fichier (csv ou ndjson)")
+    rows: int = Field(description="Nombre de lignes valides importées")
+    error_count: int = Field(default=0, description="Nombre total de lignes rejetées")
+    errors: List[RowError] = Field(default_factory=list, description="Lignes rejetées (liste tronquée au-delà de la limite)")
+    ignored_columns: List[str] = Field(default_factory=list, description="Colonnes CSV sans champ correspondant")
+    expires_at: float = Field(description="Date d'expiration de l'import (timestamp)")
@@ -0,0 +1,24 @@
+"""
+Schémas Pydantic de l'API de jobs de génération asynchrone
+"""
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+
+
+JobState = Literal["queued", "running", "done", "failed"]
+
+
+class JobStatus(BaseModel):
+    """État d'un job de génération"""
+    job_id: str = Field(description="Identifiant du job")
+    status: JobState = Field(description="État du job")
+    stage: str = Field(default="queued", description="Étape en cours (queued, rendering, converting, done)")
+    progress: int = Field(default=0, description="Avancement en pourcentage")
+    format: str = Field(description="Format de sortie demandé")
+    created_at: float = Field(description="Date de création (timestamp)")
+    started_at: Optional[float] = Field(default=None, description="Date de début de traitement")
+    finished_at: Optional[float] = Field(default=None, description="Date de fin de traitement")
+    error: Optional[str] = Field(default=None, description="Message d'erreur si le job a échoué")
+    result_url: Optional[str] = Field(default=None, description="URL de téléchargement du résultat")
+    document_url: Optional[str] = Field(default=None,
+                                        description="URL du document stocké (ETag, Range), valable après la fin du job")
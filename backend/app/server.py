@@ -0,0 +1,75 @@
+"""
+Lanceur de production : plusieurs processus uvicorn servant `app.main:app`.
+
+Le rendu docxtpl est limité par le GIL : un seul processus n'utilise qu'un
+cœur. Ce lanceur démarre un worker par cœur disponible (ou DARWIN_WORKERS),
+qui se partagent le port d'écoute. Chaque worker se préchauffe (template,
+rendu à vide, LibreOffice) pendant son démarrage, avant d'accepter des
+connexions (ou en arrière-plan avec DARWIN_WARMUP_BACKGROUND, /readyz
+répondant 503 jusqu'à la fin du préchauffage). Les workers partagent un cache disque des documents générés
+(DARWIN_SHARED_CACHE_DIR, verrous filelock).
+
+À l'arrêt (SIGTERM / SIGINT), chaque worker cesse d'accepter des connexions,
+laisse jusqu'à DARWIN_GRACEFUL_TIMEOUT secondes aux requêtes en cours, puis
+termine les jobs, rendus et conversions en cours avant de s'arrêter.
+
+Les jobs asynchrones (/api/v1/jobs) restent propres à chaque worker : avec
+plusieurs workers, le suivi d'un job suppose que le répartiteur renvoie le
+client vers le même processus.
+
+    python -m app.server
+"""
+import os
+import tempfile
+
+import uvicorn
+
+from app.core import config
+
+
+def available_cpus() -> int:
+    try:
+        # Respecte les restrictions d'affinité (conteneurs, taskset)
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count() -> int:
+    return config.SERVER_WORKERS if config.SERVER_WORKERS > 0 else available_cpus()
+
+
+def worker_defaults(workers: int) -> dict:
+    """
+    Réglages par défaut de chaque worker, pour ne pas multiplier threads et
+    instances LibreOffice par le nombre de processus. Une variable déjà
+    définie dans l'environnement est conservée.
+    """
+    cpus = available_cpus()
+    return {
+        # Le parallélisme du rendu vient des processus : un thread de rendu de plus pour les E/S
+        "DARWIN_RENDER_MAX_WORKERS": "2",
+        "DARWIN_CONVERTER_POOL_SIZE": str(max(1, config.CONVERTER_POOL_SIZE // workers)),
+        "DARWIN_BATCH_MAX_WORKERS": str(max(1, cpus // workers)),
+        "DARWIN_SHARED_CACHE_DIR": os.path.join(tempfile.gettempdir(), "darwin_shared_cache"),
+    }
+
+
+def main() -> None:
+    workers = worker_count()
+    # Les workers sont des processus lancés par uvicorn : ils héritent de l'environnement
+    for name, value in worker_defaults(workers).items():
+        os.environ.setdefault(name, value)
+
+    uvicorn.run(
+        "app.main:app",
+        host=config.SERVER_HOST,
+        port=config.SERVER_PORT,
+        workers=workers,
+        timeout_graceful_shutdown=int(config.GRACEFUL_TIMEOUT),
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Stockage des documents générés (artefacts), téléchargeables par identifiant.
+
+Stockage facultatif (DARWIN_ARTIFACT_DIR) : chaque document produit (DOCX,
+PDF, ODT) est enregistré sous un identifiant stable, HMAC de la clé de cache
+du formulaire par une clé secrète du serveur (même formulaire + même template
++ même format => même identifiant), ou un identifiant aléatoire pour les
+rendus hors cache (profilage). L'identifiant ne révèle rien du formulaire et
+ne peut pas être recalculé sans la clé : connaître un formulaire ne permet
+pas de savoir s'il a été généré. GET /api/v1/documents/{id} sert ensuite le
+document depuis le disque, avec ETag et requêtes partielles (Range) : un
+nouveau téléchargement, une reprise ou la revalidation d'un proxy ne
+relancent jamais le rendu.
+
+Disposition : `{répertoire}/{id[:2]}/{id}` (contenu) et `{id}.json` (nom de
+fichier, type, taille, ETag). La date de modification du .json est la date de
+création (TTL), celle du contenu la date du dernier accès (LRU). Le
+répertoire peut être commun aux workers d'un même hôte : l'état vit dans les
+fichiers, pas dans le processus.
+
+Un nettoyage en arrière-plan (start_sweeper) supprime les documents expirés,
+puis les moins récemment utilisés au-delà de `max_bytes`, ainsi que les
+fichiers de spool abandonnés (processus tué) : l'espace disque reste borné
+sur les hôtes qui tournent longtemps.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from app.core import config
+from app.core.metrics import ARTIFACT_BYTES, ARTIFACT_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_ID = re.compile(r"^[0-9a-f]{32,64}$")
+META_SUFFIX = ".json"
+TMP_PREFIX = ".tmp_"
+# Écritures interrompues (worker tué) : supprimées après ce délai
+STALE_TMP_SECONDS = 3600.0
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Artifact:
+    """Document enregistré, prêt à être servi."""
+    id: str
+    path: str
+    filename: str
+    media_type: str
+    size: int
+    # ETag fort, entre guillemets (hash du contenu)
+    etag: str
+    created_at: float
+
+
+class ArtifactStore:
+    """Documents générés indexés par identifiant, sur disque, avec quota, TTL et nettoyage périodique."""
+
+    def __init__(self, directory: str = config.ARTIFACT_DIR,
+                 max_bytes: int = config.ARTIFACT_MAX_BYTES,
+                 ttl: float = config.ARTIFACT_TTL,
+                 sweep_interval: float = config.ARTIFACT_SWEEP_INTERVAL,
+                 spool_dir: Optional[str] = config.SPOOL_DIR,
+                 secret: str = config.ARTIFACT_SECRET):
+        self.directory = directory
+        self._secret = (secret or secrets.token_hex(32)).encode("utf-8")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.spool_dir = spool_dir
+        # Estimation locale, recalculée à chaque nettoyage (d'autres workers écrivent aussi)
+        self.total_bytes = 0
+        self._sweep_lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stopping = False
+        ARTIFACT_BYTES.set_function(lambda: self.total_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0
+
+    def id_for(self, key: str) -> str:
+        """Identifiant du document de clé de cache `key` (HMAC par la clé secrète du serveur)."""
+        return hmac.new(self._secret, key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _paths(self, artifact_id: str) -> Tuple[str, str]:
+        path = os.path.join(self.directory, artifact_id[:2], artifact_id)
+        return path, path + META_SUFFIX
+
+    def put(self, filename: str, media_type: str, content: Optional[bytes] = None,
+            source_path: Optional[str] = None, key: Optional[str] = None,
+            artifact_id: Optional[str] = None) -> Optional[Artifact]:
+        """
+        Enregistre un document (octets `content` ou copie du fichier `source_path`)
+        sous `artifact_id`, l'identifiant de la clé de cache `key` (id_for) ou un
+        identifiant aléatoire. Remplace un document de même identifiant. None si
+        le stockage est désactivé ou le document trop gros.
+        """
+        if not self.enabled:
+            return None
+        size = len(content) if content is not None else os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return None
+        if artifact_id is None:
+            artifact_id = self.id_for(key) if key else uuid.uuid4().hex
+        elif not ARTIFACT_ID.match(artifact_id):
+            raise ValueError(f"Identifiant de document invalide : {artifact_id}")
+        path, meta_path = self._paths(artifact_id)
+        # Répertoire privé : les documents ne sont lisibles que par le service
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+        # Écritures atomiques : contenu puis métadonnées, chacun via un fichier temporaire
+        digest = hashlib.sha256()
+        tmp = os.path.join(os.path.dirname(path), f"{TMP_PREFIX}{uuid.uuid4().hex}")
+        try:
+            with open(tmp, "wb") as out:
+                if content is not None:
+                    digest.update(content)
+                    out.write(content)
+                else:
+                    with open(source_path, "rb") as src:
+                        while chunk := src.read(CHUNK_SIZE):
+                            digest.update(chunk)
+                            out.write(chunk)
+            os.replace(tmp, path)
+            artifact = Artifact(id=artifact_id, path=path, filename=filename, media_type=media_type,
+                                size=size, etag=f'"{digest.hexdigest()[:32]}"', created_at=time.time())
+            self._write_meta(meta_path, artifact)
+        except BaseException:
+            self._remove(tmp)
+            raise
+
+        self.total_bytes += size
+        if self.total_bytes > self.max_bytes:
+            if self._sweeper is not None:
+                self._wake.set()
+            else:
+                self.sweep()
+        return artifact
+
+    @staticmethod
+    def _write_meta(meta_path: str, artifact: Artifact) -> None:
+        tmp = os.path.join(os.path.dirname(meta_path), f"{TMP_PREFIX}{uuid.uuid4().hex}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"filename": artifact.filename, "media_type": artifact.media_type,
+                       "size": artifact.size, "etag": artifact.etag, "created_at": artifact.created_at}, f)
+        os.replace(tmp, meta_path)
+
+    def get(self, artifact_id: str) -> Optional[Artifact]:
+        """Document `artifact_id` s'il existe et n'a pas expiré ; compte comme un accès (LRU)."""
+        if not self.enabled or not ARTIFACT_ID.match(artifact_id or ""):
+            return None
+        path, meta_path = self._paths(artifact_id)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            stat = os.stat(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta["created_at"] + self.ttl < time.time() or stat.st_size != meta["size"]:
+            return None
+        try:
+            # Date de modification du contenu = dernier accès, pour l'éviction LRU
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return Artifact(id=artifact_id, path=path, filename=meta["filename"], media_type=meta["media_type"],
+                        size=meta["size"], etag=meta["etag"], created_at=meta["created_at"])
+
+    def delete(self, artifact_id: str) -> bool:
+        if not ARTIFACT_ID.match(artifact_id or ""):
+            return False
+        path, meta_path = self._paths(artifact_id)
+        existed = os.path.exists(meta_path)
+        # Métadonnées d'abord : le document cesse d'être servi avant que son contenu disparaisse
+        self._remove(meta_path)
+        self._remove(path)
+        return existed
+
+    def sweep(self) -> None:
+        """Supprime les documents expirés, puis les moins récemment utilisés au-delà du quota."""
+        with self._sweep_lock:
+            now = time.time()
+            entries: List[Tuple[float, int, str]] = []
+            for root, _, files in os.walk(self.directory):
+                names = set(files)
+                for name in files:
+                    path = os.path.join(root, name)
+                    if name.startswith(TMP_PREFIX):
+                        self._remove_if_older(path, now - STALE_TMP_SECONDS)
+                        continue
+                    if name.endswith(META_SUFFIX):
+                        continue
+                    try:
+                        stat = os.stat(path)
+                        created = os.stat(path + META_SUFFIX).st_mtime
+                    except FileNotFoundError:
+                        # Contenu sans métadonnées : écriture en cours ou interrompue
+                        if name + META_SUFFIX not in names:
+                            self._remove_if_older(path, now - STALE_TMP_SECONDS)
+                        continue
+                    if created + self.ttl < now:
+                        self.delete(name)
+                        ARTIFACT_EVICTIONS.inc(reason="ttl")
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, name))
+                # Métadonnées orphelines (contenu supprimé à la main)
+                for name in names:
+                    if name.endswith(META_SUFFIX) and name[:-len(META_SUFFIX)] not in names:
+                        self._remove(os.path.join(root, name))
+
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                entries.sort()
+                for _, size, artifact_id in entries:
+                    self.delete(artifact_id)
+                    ARTIFACT_EVICTIONS.inc(reason="quota")
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            self.total_bytes = total
+            self._sweep_spool(now)
+
+    def _sweep_spool(self, now: float) -> None:
+        """Fichiers de spool (documents en cours d'envoi) abandonnés par un processus arrêté."""
+        if not self.spool_dir or not os.path.isdir(self.spool_dir):
+            return
+        for entry in os.scandir(self.spool_dir):
+            if entry.name.startswith("DAT_") and entry.is_file():
+                self._remove_if_older(entry.path, now - self.ttl)
+
+    def _remove_if_older(self, path: str, limit: float) -> None:
+        try:
+            if os.stat(path).st_mtime < limit:
+                self._remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        if self.directory and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
+        self.total_bytes = 0
+
+    def start_sweeper(self) -> None:
+        """Nettoyage périodique dans un thread dédié (toutes les `sweep_interval` secondes, ou dès que le quota est dépassé)."""
+        if self._sweeper is not None or not self.enabled:
+            return
+        self._stopping = False
+        self._wake.clear()
+
+        def run():
+            while not self._stopping:
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Nettoyage du stockage des documents impossible")
+                self._wake.wait(self.sweep_interval)
+                self._wake.clear()
+
+        self._sweeper = threading.Thread(target=run, name="darwin-artifacts", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        sweeper, self._sweeper = self._sweeper, None
+        if sweeper is not None:
+            self._stopping = True
+            self._wake.set()
+            sweeper.join()
+
+
+artifact_store = ArtifactStore()
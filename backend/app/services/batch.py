@@ -0,0 +1,173 @@
+"""
+Génération de DAT par lot.
+
+Les rendus sont répartis sur un pool de processus (le rendu docxtpl est lié
+au CPU et au GIL) ; chaque document terminé est aussitôt écrit dans une
+archive ZIP envoyée en streaming. Un document en échec est consigné dans
+`rapport.json` sans interrompre le reste du lot.
+
+Seuls `2 × BATCH_MAX_WORKERS` documents sont en cours à la fois (validation,
+rendu, conversion) : la file du pool de processus reste courte, et un client
+qui se déconnecte n'y laisse que quelques rendus, annulés s'ils n'ont pas
+commencé.
+"""
+import asyncio
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, List, Optional, Set
+
+from pydantic import ValidationError
+
+from app.core import config
+from app.core.metrics import timed
+from app.schemas.batch import BatchItemReport
+from app.schemas.dat import DatRequest
+from app.services.batch_worker import render_docx_bytes
+from app.services.concurrency import ServiceSaturated, convert_executor
+from app.services.doc_generator import safe_filename_title
+from app.services.pipeline import DOCX_MEDIA_TYPE, GeneratedDocument, convert_document
+
+REPORT_NAME = "rapport.json"
+
+logger = logging.getLogger(__name__)
+
+
+class _ZipSink(io.RawIOBase):
+    """Flux non positionnable : zipfile y écrit, on récupère les octets au fil de l'eau."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _validate(payload: dict) -> DatRequest:
+    with timed("validation"):
+        return DatRequest.model_validate(payload)
+
+
+class BatchGenerator:
+    """Pool de processus de rendu, démarré à la première utilisation."""
+
+    def __init__(self, max_workers: int = config.BATCH_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # "spawn" : le processus parent a des threads (pools, LibreOffice), fork serait risqué
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def shutdown(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    async def _convert(self, docx: GeneratedDocument, format: str, filename: str,
+                       slots: asyncio.Semaphore) -> bytes:
+        # Le lot ne dépasse jamais la capacité du pool de conversion ; si les requêtes
+        # unitaires l'occupent, on attend au lieu de faire échouer le document
+        async with slots:
+            while True:
+                try:
+                    converted = await convert_executor.run(convert_document, docx, format, filename)
+                    break
+                except ServiceSaturated as e:
+                    await asyncio.sleep(e.retry_after)
+        content = converted.read()
+        converted.discard()
+        return content
+
+    async def _generate_one(self, index: int, payload: Any, format: str, slots: asyncio.Semaphore,
+                            template: Optional[str] = None):
+        """Valide, rend et convertit un document. Retourne (rapport, contenu)."""
+        if not isinstance(payload, dict):
+            return BatchItemReport(index=index, status="error",
+                                   error="Données invalides : un objet JSON est attendu."), None
+        titre = str(payload.get("titre_projet", ""))
+        try:
+            # Formulaires de plusieurs Mo : validation hors de la boucle d'événements
+            data = await asyncio.to_thread(_validate, payload)
+            loop = asyncio.get_running_loop()
+            content = await loop.run_in_executor(self._get_pool(), render_docx_bytes, data, template)
+            if format != "docx":
+                docx = GeneratedDocument(filename=f"DAT_{data.titre_projet}.docx",
+                                         media_type=DOCX_MEDIA_TYPE, content=content)
+                content = await self._convert(docx, format, f"DAT_{data.titre_projet}.{format}", slots)
+        except ValidationError as e:
+            return BatchItemReport(index=index, titre_projet=titre, status="error",
+                                   error=f"Données invalides : {e.error_count()} erreur(s) - {e.errors()[0]['msg']}"), None
+        except Exception as e:
+            logger.exception("Échec du document %d du lot", index, extra={"fields": {"index": index}})
+            return BatchItemReport(index=index, titre_projet=titre, status="error", error=str(e)), None
+
+        filename = f"{index + 1:03d}_DAT_{safe_filename_title(data.titre_projet)}.{format}"
+        return BatchItemReport(index=index, titre_projet=titre, status="ok", filename=filename), content
+
+    async def stream_zip(self, documents: List[Any], format: str,
+                         template: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Produit l'archive ZIP morceau par morceau, dans l'ordre de fin des rendus."""
+        sink = _ZipSink()
+        archive = zipfile.ZipFile(sink, "w")
+        slots = asyncio.Semaphore(convert_executor.max_workers)
+        # Fenêtre de documents en cours : le pool reste occupé sans accumuler tout le lot dans sa file
+        window = max(1, 2 * self.max_workers)
+        pending = iter(enumerate(documents))
+        running: Set[asyncio.Future] = set()
+        reports = []
+
+        def fill() -> None:
+            for i, payload in itertools.islice(pending, window - len(running)):
+                running.add(asyncio.ensure_future(self._generate_one(i, payload, format, slots, template)))
+
+        try:
+            fill()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                running.difference_update(done)
+                fill()
+                for task in done:
+                    report, content = task.result()
+                    reports.append(report)
+                    if content is not None:
+                        # .docx / .odt / .pdf sont déjà compressés : stockage sans recompression
+                        archive.writestr(report.filename, content, compress_type=zipfile.ZIP_STORED)
+                        yield sink.drain()
+
+            reports.sort(key=lambda r: r.index)
+            summary = {
+                "format": format,
+                "total": len(reports),
+                "ok": sum(1 for r in reports if r.status == "ok"),
+                "errors": sum(1 for r in reports if r.status == "error"),
+                "documents": [r.model_dump() for r in reports],
+            }
+            archive.writestr(REPORT_NAME, json.dumps(summary, ensure_ascii=False, indent=2),
+                             compress_type=zipfile.ZIP_DEFLATED)
+            archive.close()
+            yield sink.drain()
+        finally:
+            # Client déconnecté : on abandonne les documents en cours ; l'annulation
+            # retire aussi du pool les rendus qui n'ont pas encore commencé
+            for task in running:
+                task.cancel()
+
+
+batch_generator = BatchGenerator()
@@ -0,0 +1,19 @@
+"""
+Fonction exécutée dans les processus du pool de génération par lot.
+Module volontairement léger : il n'importe que le générateur de documents.
+"""
+from typing import Optional
+
+from app.schemas.dat import DatRequest
+from app.services.doc_generator import DocumentService
+
+# Un service (et donc un cache de template) par processus
+_service: Optional[DocumentService] = None
+
+
+def render_docx_bytes(data: DatRequest, template: Optional[str] = None) -> bytes:
+    """Rend un DAT et retourne le contenu du .docx."""
+    global _service
+    if _service is None:
+        _service = DocumentService()
+    return _service.render_dat(data, template).getvalue()
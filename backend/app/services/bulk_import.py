@@ -0,0 +1,251 @@
+"""
+Import en masse des inventaires (vms, flux_reseau, echanges_donnees, dns_nom...).
+
+Les exports de CMDB comptent des dizaines de milliers de lignes : plutôt que
+de les envoyer dans un seul corps JSON validé d'un bloc par DatRequest, le
+fichier (CSV ou NDJSON) est téléversé seul. Il est lu ligne à ligne depuis le
+fichier temporaire de l'upload et chaque ligne est validée contre le modèle
+de la section (VM, FluxReseau...) : seules les lignes valides sont gardées,
+les rejets sont rapportés avec leur numéro de ligne (liste bornée).
+
+L'import est conservé IMPORT_TTL secondes, dans la limite de IMPORT_MAX_STORED
+imports et IMPORT_MAX_STORED_ROWS lignes validées par processus ; /generate et /jobs le reprennent
+via son identifiant (paramètre `imports`), sans que les lignes ne repassent
+par le client. Comme les jobs, les imports sont propres au processus.
+"""
+import codecs
+import csv
+import io
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Type, get_args, get_origin
+
+from pydantic import BaseModel, ValidationError
+
+from app.core import config
+from app.schemas.dat import DatRequest
+from app.schemas.imports import ImportReport, RowError
+
+IMPORT_FORMATS = ("csv", "ndjson")
+# Séparateurs reconnus dans l'en-tête CSV (les exports français utilisent souvent « ; »)
+CSV_DELIMITERS = (";", ",", "\t", "|")
+
+
+class ImportFormatError(ValueError):
+    """Fichier illisible dans son ensemble (encodage, en-tête...)."""
+
+
+class UnknownImport(LookupError):
+    """Import inconnu ou expiré."""
+
+
+def _row_sections(model_cls: Type[BaseModel]) -> Dict[str, Type[BaseModel]]:
+    """Champs liste de sous-modèles du DAT, importables ligne à ligne."""
+    sections = {}
+    for name, info in model_cls.model_fields.items():
+        if get_origin(info.annotation) is list:
+            item = get_args(info.annotation)[0]
+            if isinstance(item, type) and issubclass(item, BaseModel):
+                sections[name] = item
+    return sections
+
+
+SECTIONS = _row_sections(DatRequest)
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Format d'après l'extension ou le type MIME du fichier téléversé."""
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return "ndjson"
+    if name.endswith((".csv", ".tsv", ".txt")) or "csv" in (content_type or ""):
+        return "csv"
+    return None
+
+
+def _csv_records(file: BinaryIO, encoding: str, fields: Sequence[str],
+                 ignored: List[str]) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(ligne, champs non vides, erreur) pour chaque ligne de données du CSV."""
+    text = io.TextIOWrapper(file, encoding=encoding, newline="")
+    header_line = text.readline()
+    if not header_line.strip():
+        raise ImportFormatError("Fichier CSV vide ou sans en-tête.")
+    delimiter = max(CSV_DELIMITERS, key=header_line.count)
+    header = [name.strip().lower() for name in next(csv.reader([header_line], delimiter=delimiter))]
+    known = set(fields)
+    ignored.extend(name for name in header if name and name not in known)
+
+    reader = csv.reader(text, delimiter=delimiter)
+    # line_num compte les lignes physiques lues par le reader (sans l'en-tête) :
+    # une ligne de données commence juste après la fin de la précédente
+    next_line = 2
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # Ligne malformée (champ trop long...) : le reader reprend à la suivante
+            line, next_line = next_line, reader.line_num + 2
+            yield line, None, f"CSV invalide : {e}"
+            continue
+        line, next_line = next_line, reader.line_num + 2
+        if not values or not any(v.strip() for v in values):
+            continue
+        if len(values) > len(header):
+            yield line, None, f"{len(values)} colonnes pour {len(header)} dans l'en-tête"
+            continue
+        # Cellule vide = valeur par défaut du modèle (cpu, ram...)
+        yield line, {name: value for name, value in zip(header, values) if value != "" and name in known}, None
+
+
+def _ndjson_records(file: BinaryIO, encoding: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for line, raw in enumerate(file, start=1):
+        text = decoder.decode(raw)
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError as e:
+            yield line, None, f"JSON invalide : {e.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield line, None, "Chaque ligne doit être un objet JSON."
+            continue
+        yield line, record, None
+
+
+@dataclass
+class StoredImport:
+    """Lignes validées d'un import, en attente d'une génération."""
+    id: str
+    section: str
+    format: str
+    rows: List[BaseModel]
+    error_count: int = 0
+    errors: List[RowError] = field(default_factory=list)
+    ignored_columns: List[str] = field(default_factory=list)
+    expires_at: float = 0.0
+
+    def report(self) -> ImportReport:
+        return ImportReport(
+            import_id=self.id,
+            section=self.section,
+            format=self.format,
+            rows=len(self.rows),
+            error_count=self.error_count,
+            errors=self.errors,
+            ignored_columns=self.ignored_columns,
+            expires_at=self.expires_at,
+        )
+
+
+def parse_rows(file: BinaryIO, section: str, format: str, encoding: str = "utf-8-sig",
+               max_rows: int = config.IMPORT_MAX_ROWS,
+               max_errors: int = config.IMPORT_MAX_ERRORS) -> StoredImport:
+    """Lit et valide le fichier ligne à ligne (appel bloquant, à exécuter dans un thread)."""
+    model = SECTIONS[section]
+    result = StoredImport(id=uuid.uuid4().hex, section=section, format=format, rows=[])
+
+    def reject(line: int, message: str, field_name: Optional[str] = None) -> None:
+        result.error_count += 1
+        if len(result.errors) < max_errors:
+            result.errors.append(RowError(line=line, field=field_name, message=message))
+
+    if format == "csv":
+        records = _csv_records(file, encoding, tuple(model.model_fields), result.ignored_columns)
+    else:
+        records = _ndjson_records(file, encoding)
+
+    validate = model.model_validate
+    try:
+        for line, record, error in records:
+            if error is not None:
+                reject(line, error)
+                continue
+            if len(result.rows) >= max_rows:
+                reject(line, f"Limite de {max_rows} lignes atteinte : lignes suivantes ignorées.")
+                break
+            try:
+                result.rows.append(validate(record))
+            except ValidationError as e:
+                for detail in e.errors(include_url=False, include_input=False):
+                    loc = detail.get("loc") or ()
+                    reject(line, detail["msg"], str(loc[0]) if loc else None)
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(f"Fichier illisible en {encoding} (octet {e.start}) : précisez l'encodage.")
+    return result
+
+
+class ImportStore:
+    """
+    Imports gardés en mémoire dans le processus, jusqu'à leur expiration.
+    Le nombre d'imports et le total de lignes validées sont bornés : les plus
+    anciens sont oubliés au-delà (le dernier import enregistré est toujours gardé).
+    """
+
+    def __init__(self, ttl: float = config.IMPORT_TTL, max_entries: int = config.IMPORT_MAX_STORED,
+                 max_rows: int = config.IMPORT_MAX_STORED_ROWS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._imports: Dict[str, StoredImport] = {}
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def save(self, stored: StoredImport) -> StoredImport:
+        stored.expires_at = time.time() + self.ttl
+        with self._lock:
+            self._purge_expired()
+            self._remove(stored.id)
+            self._imports[stored.id] = stored
+            self._rows += len(stored.rows)
+            # Dicts ordonnés par insertion : les plus anciens d'abord
+            while len(self._imports) > 1 and (len(self._imports) > self.max_entries or self._rows > self.max_rows):
+                self._remove(next(iter(self._imports)))
+        return stored
+
+    def get(self, import_id: str) -> Optional[StoredImport]:
+        stored = self._imports.get(import_id)
+        if stored is None or stored.expires_at < time.time():
+            return None
+        return stored
+
+    def delete(self, import_id: str) -> bool:
+        with self._lock:
+            return self._remove(import_id)
+
+    def _remove(self, import_id: str) -> bool:
+        stored = self._imports.pop(import_id, None)
+        if stored is None:
+            return False
+        self._rows -= len(stored.rows)
+        return True
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        for import_id in [i for i, stored in self._imports.items() if stored.expires_at < now]:
+            self._remove(import_id)
+
+    def apply(self, data: DatRequest, import_ids: Sequence[str]) -> DatRequest:
+        """
+        DatRequest dont les sections importées remplacent celles du corps.
+        Plusieurs imports d'une même section sont mis bout à bout, dans l'ordre.
+        """
+        if not import_ids:
+            return data
+        sections: Dict[str, list] = {}
+        for import_id in import_ids:
+            stored = self.get(import_id)
+            if stored is None:
+                raise UnknownImport(f"Import inconnu ou expiré : {import_id}")
+            sections.setdefault(stored.section, []).extend(stored.rows)
+        # Lignes déjà validées : pas de seconde validation
+        return data.model_copy(update=sections)
+
+
+import_store = ImportStore()
@@ -0,0 +1,234 @@
+"""
+Forme compilée d'un template .docx et DocxTemplate qui la réutilise.
+
+Ce module importe docxtpl, python-docx, lxml et Jinja2 : il n'est chargé
+qu'à la première compilation d'un template (TemplateCache.get_compiled),
+normalement pendant le préchauffage du worker, pas à l'import de l'application.
+"""
+import hashlib
+import io
+import logging
+import re
+from copy import deepcopy
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from docx.document import Document
+from docx.opc.oxml import serialize_part_xml
+from docx.opc.part import Part
+from docxtpl import DocxTemplate
+from jinja2 import Template
+from jinja2.exceptions import TemplateError
+
+from app.core import config
+from app.services.fast_tables import FastBody, compile_fast_body, render_blocks, splice
+from app.services.sections import SectionPlan, compile_sections, render_body
+
+logger = logging.getLogger(__name__)
+
+# Un en-tête / pied de page sans ces marqueurs est statique : inutile de le rendre
+JINJA_MARKUP = re.compile(r'\{[\{%#_]|[\}%#]_?\}')
+
+
+@dataclass
+class CompiledTemplate:
+    """Forme pré-traitée d'un template .docx, partagée entre les rendus."""
+    path: Path
+    blob: bytes
+    sha256: str
+    mtime_ns: int
+    size: int
+    body: Template
+    # Source du corps après patch_xml, pour situer les erreurs Jinja2 (docx_context)
+    source: str = ""
+    # Document python-docx déjà parsé, copié pour chaque rendu (voir CachedDocxTemplate)
+    document: Optional[Document] = None
+    # partname -> (template compilé, encodage, source) pour les en-têtes / pieds de page dynamiques
+    parts: Dict[str, Tuple[Template, str, str]] = field(default_factory=dict)
+    # Corps où les grandes listes sont rendues hors Jinja2 (voir fast_tables)
+    fast_body: Optional[FastBody] = None
+    fast_template: Optional[Template] = None
+    # Découpage du corps pour le rendu incrémental (voir sections)
+    sections: Optional[SectionPlan] = None
+
+
+def _prepare_xml(template: DocxTemplate, xml: str) -> str:
+    """Reproduit la préparation de DocxTemplate.render_xml_part avant le rendu Jinja2."""
+    xml = template.patch_xml(xml)
+    return re.sub(r'<w:p([ >])', r'\n<w:p\1', xml)
+
+
+def _freeze_static_parts(template: DocxTemplate, dynamic: Dict[str, Tuple[Template, str, str]]) -> None:
+    """
+    Remplace, dans les relations du document, les en-têtes / pieds de page sans
+    Jinja2 par des parties binaires : ils ne sont plus ni parsés ni copiés au
+    rendu, et save() écrit leurs octets tels quels.
+    """
+    for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+        for relKey, part in list(template.get_headers_footers(uri)):
+            if str(part.partname) in dynamic:
+                continue
+            static = Part.load(part.partname, part.content_type, part.blob, part.package)
+            for rel in part.rels.values():
+                static.load_rel(rel.reltype, rel._target, rel.rId, rel.is_external)
+            template.docx.part.rels[relKey]._target = static
+
+
+def compile_template(path: Path, blob: bytes, mtime_ns: int) -> CompiledTemplate:
+    """Parse le .docx et compile le corps et les en-têtes / pieds de page."""
+    template = DocxTemplate(io.BytesIO(blob))
+    template.init_docx()
+
+    source = _prepare_xml(template, template.get_xml())
+    body = Template(source)
+    fast_body = compile_fast_body(source, template.fix_tables) if config.FAST_TABLES else None
+
+    parts = {}
+    for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+        for _, part in template.get_headers_footers(uri):
+            xml = template.get_part_xml(part)
+            if not JINJA_MARKUP.search(xml):
+                continue
+            encoding = template.get_headers_footers_encoding(xml)
+            xml = _prepare_xml(template, xml)
+            parts[str(part.partname)] = (Template(xml), encoding, xml)
+    _freeze_static_parts(template, parts)
+
+    compiled = CompiledTemplate(
+        path=path,
+        blob=blob,
+        sha256=hashlib.sha256(blob).hexdigest(),
+        mtime_ns=mtime_ns,
+        size=len(blob),
+        body=body,
+        source=source,
+        document=template.docx,
+        parts=parts,
+        fast_body=fast_body,
+        fast_template=Template(fast_body.source) if fast_body else None,
+    )
+    if config.INCREMENTAL_RENDER:
+        plan = compile_sections(source, compiled.sha256, template.docx.element, template.fix_tables)
+        if plan is not None and _sections_match(compiled, plan):
+            compiled.sections = plan
+        else:
+            logger.info("Rendu incrémental indisponible pour %s", path.name)
+    return compiled
+
+
+def _sections_match(compiled: CompiledTemplate, plan: SectionPlan) -> bool:
+    """Le rendu par sections d'un contexte vide donne-t-il le même document.xml que le rendu complet ?"""
+    full = CachedDocxTemplate(compiled)
+    full.render({})
+    doc = CachedDocxTemplate(compiled)
+    doc.render_init()
+    body = render_body(plan, doc, {}, cache=None)
+    return body is not None and plan.prefix + body.encode("utf-8") + plan.suffix == serialize_part_xml(
+        full.docx.element)
+
+
+class CachedDocxTemplate(DocxTemplate):
+    """
+    DocxTemplate qui réutilise les templates Jinja2 pré-compilés.
+    Le document est une copie du document déjà parsé à la compilation (pas de
+    re-parsing des parties XML), faite dès la construction : son coût est
+    compté dans l'étape template_load. Seuls les en-têtes / pieds de page
+    contenant du Jinja2 sont rendus.
+    """
+
+    def __init__(self, compiled: CompiledTemplate):
+        super().__init__(io.BytesIO(compiled.blob))
+        self.compiled = compiled
+        self.docx = deepcopy(compiled.document)
+        # Lignes produites hors Jinja2, réinsérées par fix_tables
+        self._row_blocks: Optional[Dict[int, str]] = None
+
+    def init_docx(self, reload: bool = True):
+        if not self.docx or (self.is_rendered and reload):
+            self.docx = deepcopy(self.compiled.document)
+            self.is_rendered = False
+
+    def _render_compiled(self, template: Template, part, context, source: str) -> str:
+        self.current_rendering_part = part
+        try:
+            dst_xml = template.render(context)
+        except TemplateError as exc:
+            # Comme DocxTemplate.render_xml_part : extrait du template autour de l'erreur
+            if getattr(exc, "lineno", None) is not None:
+                line_number = max(exc.lineno - 4, 0)
+                exc.docx_context = map(lambda x: re.sub(r'<[^>]+>', '', x),
+                                       source.splitlines()[line_number:(line_number + 7)])
+            raise
+        dst_xml = re.sub(r'\n<w:p([ >])', r'<w:p\1', dst_xml)
+        dst_xml = (dst_xml
+                   .replace('{_{', '{{')
+                   .replace('}_}', '}}')
+                   .replace('{_%', '{%')
+                   .replace('%_}', '%}'))
+        return self.resolve_listing(dst_xml)
+
+    def render(self, context, jinja_env=None, autoescape=False):
+        plan = self.compiled.sections
+        if plan is None or jinja_env is not None or autoescape:
+            return super().render(context, jinja_env, autoescape)
+
+        self.render_init()
+        body = render_body(plan, self, context)
+        if body is None:
+            return super().render(context, jinja_env, autoescape)
+        for uri in (self.HEADER_URI, self.FOOTER_URI):
+            for relKey, xml in self.build_headers_footers_xml(context, uri):
+                self.map_headers_footers_xml(relKey, xml)
+        self.render_properties(context)
+        # Le corps n'est pas re-parsé : document.xml sera écrit tel quel par save()
+        self.map_document_blob(plan.prefix + body.encode("utf-8") + plan.suffix)
+        self.is_rendered = True
+
+    def map_document_blob(self, blob: bytes) -> None:
+        """
+        Remplace, dans les relations du paquet, la partie principale par une
+        partie binaire contenant `blob` (comme map_headers_footers_xml pour les
+        en-têtes). Ses relations sont reprises : à appeler une fois le rendu
+        terminé, images et en-têtes compris.
+        """
+        part = self.docx.part
+        new_part = Part.load(part.partname, part.content_type, blob, part.package)
+        for rel in part.rels.values():
+            new_part.load_rel(rel.reltype, rel._target, rel.rId, rel.is_external)
+        for rel in part.package.rels.values():
+            if not rel.is_external and rel.target_part is part:
+                rel._target = new_part
+
+    def build_xml(self, context, jinja_env=None):
+        # Un environnement Jinja2 personnalisé impose de recompiler
+        if jinja_env is not None:
+            return super().build_xml(context, jinja_env)
+        compiled = self.compiled
+        if compiled.fast_body is not None:
+            blocks = render_blocks(compiled.fast_body, context, compiled.body.environment.getattr,
+                                   self.resolve_listing)
+            if blocks is not None:
+                self._row_blocks = blocks
+                return self._render_compiled(compiled.fast_template, self.docx._part, context,
+                                             compiled.fast_body.source)
+        return self._render_compiled(compiled.body, self.docx._part, context, compiled.source)
+
+    def fix_tables(self, xml):
+        # Le reste du document est corrigé seul ; les zones rapides n'en ont pas besoin
+        tree = super().fix_tables(xml)
+        blocks, self._row_blocks = self._row_blocks, None
+        if blocks:
+            tree = splice(tree, blocks)
+        return tree
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        if jinja_env is not None:
+            yield from super().build_headers_footers_xml(context, uri, jinja_env)
+            return
+        for relKey, part in self.get_headers_footers(uri):
+            compiled = self.compiled.parts.get(str(part.partname))
+            if compiled is None:
+                continue
+            template, encoding, source = compiled
+            yield relKey, self._render_compiled(template, part, context, source).encode(encoding)
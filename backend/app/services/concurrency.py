@@ -0,0 +1,115 @@
+"""
+Exécution du travail bloquant (rendu docxtpl, conversion LibreOffice) hors de
+la boucle asyncio, avec des limites de concurrence.
+
+Chaque étape a son propre pool de threads borné et un limiteur d'admission :
+au-delà de `max_pending` requêtes en attente, ou après `queue_timeout`
+secondes d'attente, on lève `ServiceSaturated` (traduit en 503 + Retry-After)
+plutôt que d'empiler les requêtes sans limite.
+"""
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from app.core import config
+from app.core.metrics import EXECUTOR_IN_FLIGHT, EXECUTOR_PENDING, EXECUTOR_REJECTIONS, EXECUTOR_WAIT_SECONDS
+
+T = TypeVar("T")
+
+
+class ServiceSaturated(Exception):
+    """Plus de place disponible : le client doit réessayer plus tard."""
+
+    def __init__(self, message: str, retry_after: int = config.RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """Pool de threads avec limite d'exécutions simultanées et file d'attente bornée."""
+
+    def __init__(self, name: str, max_workers: int,
+                 max_pending: int = config.MAX_PENDING_JOBS,
+                 queue_timeout: float = config.QUEUE_TIMEOUT):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._semaphore = None
+        self._loop = None
+        self.pending = 0
+        self.in_flight = 0
+        EXECUTOR_IN_FLIGHT.set_function(lambda: self.in_flight, executor=name)
+        EXECUTOR_PENDING.set_function(lambda: self.pending, executor=name)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Un sémaphore asyncio est lié à sa boucle : on en recrée un si la boucle change
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Créé à la demande, pour pouvoir redémarrer après un shutdown()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix=f"darwin-{self.name}")
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Exécute `fn` dans le pool sans bloquer la boucle asyncio."""
+        semaphore = self._get_semaphore()
+        if self.in_flight + self.pending >= self.max_workers + self.max_pending:
+            EXECUTOR_REJECTIONS.inc(executor=self.name, reason="full")
+            raise ServiceSaturated(f"Service saturé ({self.name}), réessayez plus tard.")
+
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            EXECUTOR_REJECTIONS.inc(executor=self.name, reason="timeout")
+            raise ServiceSaturated(f"Service saturé ({self.name}), réessayez plus tard.")
+        finally:
+            self.pending -= 1
+        EXECUTOR_WAIT_SECONDS.observe(time.perf_counter() - start, executor=self.name)
+
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        # Le contexte (identifiant de requête des logs) suit la tâche dans le thread
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        try:
+            future = self._get_executor().submit(call)
+        except BaseException:
+            self._release(semaphore)
+            raise
+        # La place est rendue à la fin du travail dans le thread, pas à l'annulation
+        # de la requête (client déconnecté) : le thread continue jusqu'au bout
+        future.add_done_callback(lambda _: self._release_threadsafe(loop, semaphore))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, semaphore: asyncio.Semaphore) -> None:
+        self.in_flight -= 1
+        semaphore.release()
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release, semaphore)
+        except RuntimeError:
+            # Boucle fermée : son sémaphore ne sert plus
+            pass
+
+    def shutdown(self) -> None:
+        """Attend la fin des tâches en cours puis libère les threads."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+render_executor = BoundedExecutor("render", config.RENDER_MAX_WORKERS)
+convert_executor = BoundedExecutor("convert", config.CONVERT_MAX_WORKERS)
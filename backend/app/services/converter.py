@@ -0,0 +1,607 @@
+"""
+Conversion DOCX -> PDF / ODT avec LibreOffice.
+
+Lancer `libreoffice --convert-to` à chaque requête coûte plusieurs secondes de
+démarrage. On garde donc N instances headless chaudes, pilotées via UNO
+(module `uno` fourni par LibreOffice). Chaque instance est surveillée,
+redémarrée après un crash et recyclée après un nombre fixe de conversions.
+
+Si le module `uno` n'est pas disponible, ou si le pool échoue, on retombe sur
+l'ancien mode : un processus LibreOffice par conversion. Dans ce mode, les
+conversions simultanées d'un même format sont regroupées (ConversionBatcher) :
+`--convert-to` accepte plusieurs fichiers, un seul démarrage de LibreOffice
+sert tout le lot. Chaque appel a son propre profil utilisateur LibreOffice
+(ProfilePool) : sans cela, les processus simultanés se disputent le verrou du
+profil par défaut et se retrouvent sérialisés.
+"""
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from app.core import config
+from app.core.metrics import CONVERSION_BATCH_SIZE
+
+# format -> (filtre d'export LibreOffice, type MIME)
+OUTPUT_FORMATS = {
+    "pdf": ("writer_pdf_Export", "application/pdf"),
+    "odt": ("writer8", "application/vnd.oasis.opendocument.text"),
+}
+
+# Marge laissée au lanceur d'un lot, au-delà du timeout LibreOffice, pour répartir les sorties
+BATCH_GRACE = 5.0
+# En deçà de ce délai restant, une conversion d'un lot en échec n'est pas refaite seule
+MIN_RETRY_TIMEOUT = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionError(Exception):
+    """La conversion LibreOffice a échoué."""
+
+
+class ConversionTimeout(ConversionError):
+    """La conversion a dépassé le délai autorisé."""
+
+
+class ConverterUnavailable(ConversionError):
+    """LibreOffice n'est pas installé sur le serveur."""
+
+
+class InstanceFailure(ConversionError):
+    """L'instance LibreOffice du pool ne répond plus (processus arrêté, pont UNO rompu)."""
+
+
+def _load_uno():
+    """Import paresseux de UNO : optionnel, présent seulement avec le python de LibreOffice."""
+    try:
+        import uno
+        from com.sun.star.beans import PropertyValue
+    except ImportError:
+        return None, None
+    return uno, PropertyValue
+
+
+class ProfilePool:
+    """
+    Profils utilisateur LibreOffice (UserInstallation) temporaires, un par
+    conversion en cours. Un profil neuf coûte une initialisation à LibreOffice :
+    jusqu'à `max_idle` profils libérés sont gardés pour les conversions
+    suivantes. Le profil d'une conversion en échec (processus tué, timeout)
+    est supprimé plutôt que réutilisé.
+    """
+
+    def __init__(self, max_idle: int = config.CONVERTER_PROFILE_POOL):
+        self.max_idle = max_idle
+        self._idle: List[str] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self) -> Iterator[str]:
+        """Répertoire de profil réservé à l'appelant pendant le bloc."""
+        with self._lock:
+            path = self._idle.pop() if self._idle else None
+        if path is None:
+            path = tempfile.mkdtemp(prefix="darwin_lo_profile_")
+        reusable = False
+        try:
+            yield path
+            reusable = True
+        finally:
+            with self._lock:
+                if reusable and len(self._idle) < self.max_idle:
+                    self._idle.append(path)
+                    path = None
+            if path is not None:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            paths, self._idle = self._idle, []
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+profile_pool = ProfilePool()
+
+
+class _SofficeFailed(Exception):
+    """LibreOffice a terminé avec un code d'erreur."""
+
+    def __init__(self, result: subprocess.CompletedProcess):
+        super().__init__(result.returncode)
+        self.result = result
+
+
+def _run_soffice(inputs: Sequence[str], fmt: str, output_dir: str, timeout: float) -> subprocess.CompletedProcess:
+    """`libreoffice --convert-to` sur `inputs`, avec un profil isolé."""
+    with profile_pool.acquire() as profile_dir:
+        result = subprocess.run([
+            config.LIBREOFFICE_BIN,
+            "--headless",
+            f"-env:UserInstallation={Path(profile_dir).as_uri()}",
+            "--convert-to", fmt,
+            "--outdir", output_dir,
+            *inputs
+        ], capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            # Profil peut-être laissé dans un état incohérent : pas de réutilisation
+            raise _SofficeFailed(result)
+        return result
+
+
+def convert_with_subprocess(src_path: str, fmt: str, output_dir: str,
+                            timeout: float = config.CONVERSION_TIMEOUT) -> str:
+    """
+    Conversion "à froid" : un processus LibreOffice par fichier.
+    Utilisée en secours quand le pool n'est pas disponible.
+    """
+    try:
+        _run_soffice([src_path], fmt, output_dir, timeout)
+    except _SofficeFailed as e:
+        logger.error("Erreur LibreOffice : %s", e.result.stderr)
+        raise ConversionError(f"Conversion {fmt.upper()} non disponible. LibreOffice requis.")
+    except subprocess.TimeoutExpired:
+        raise ConversionTimeout(f"Timeout lors de la conversion {fmt.upper()}.")
+    except FileNotFoundError:
+        raise ConverterUnavailable(f"Conversion {fmt.upper()} non disponible. LibreOffice n'est pas installé.")
+
+    base_name = os.path.splitext(os.path.basename(src_path))[0]
+    output_path = os.path.join(output_dir, f"{base_name}.{fmt}")
+    if not os.path.exists(output_path):
+        raise ConversionError(f"Fichier {fmt.upper()} non généré.")
+    return output_path
+
+
+class _PendingConversion:
+    """Conversion en attente dans un lot, et son résultat."""
+
+    def __init__(self, src_path: str, output_path: str):
+        self.src_path = src_path
+        self.output_path = output_path
+        self.size = os.path.getsize(src_path)
+        # Échéance de la conversion (monotonic), fixée au lancement du lot ; la reprise seule s'y tient
+        self.deadline: Optional[float] = None
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[ConversionError] = None
+        # Le lot n'a pas abouti (timeout, plantage) : la conversion est refaite seule
+        self.retry_alone = False
+
+
+class ConversionBatcher:
+    """
+    Regroupe les conversions "à froid" d'un même format arrivées pendant
+    `window` secondes en un seul appel `libreoffice --convert-to`.
+
+    Le premier appelant d'un lot attend la fenêtre (ou que le lot atteigne
+    `max_size`), puis lance LibreOffice pour tout le lot ; les autres attendent
+    leur résultat. Chaque entrée est liée sous un nom unique dans un répertoire
+    propre au lot, et chaque sortie est déplacée vers le répertoire demandé.
+    Un fichier que LibreOffice n'a pas pu convertir n'échoue que sa propre
+    requête ; si le lot entier échoue (timeout, plantage), les conversions sans
+    sortie sont refaites une par une par leur appelant.
+
+    Un lot est limité à `max_size` fichiers et `max_bytes` octets, et dispose de
+    `timeout` plus `file_timeout` par fichier supplémentaire (LibreOffice les
+    convertit l'un après l'autre). Ce délai est aussi l'échéance de chaque
+    conversion du lot : une reprise seule n'a que le temps restant, et une
+    requête ne dure jamais plus que la fenêtre plus le délai de son lot.
+    """
+
+    def __init__(self, window: float = config.CONVERTER_BATCH_WINDOW,
+                 max_size: int = config.CONVERTER_BATCH_MAX,
+                 timeout: float = config.CONVERSION_TIMEOUT,
+                 max_bytes: int = config.CONVERTER_BATCH_MAX_BYTES,
+                 file_timeout: float = config.CONVERTER_BATCH_FILE_TIMEOUT):
+        self.window = window
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.file_timeout = file_timeout
+        # format -> conversions en attente du prochain lot
+        self._pending: Dict[str, List[_PendingConversion]] = {}
+        self._cond = threading.Condition()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_size > 1
+
+    def batch_timeout(self, size: int) -> float:
+        """Délai accordé à un lot de `size` fichiers."""
+        return self.timeout + self.file_timeout * max(0, size - 1)
+
+    def _full(self, batch: List[_PendingConversion], size: int = 0) -> bool:
+        """Vrai si le lot ne peut plus accueillir un fichier de `size` octets."""
+        return len(batch) >= self.max_size or (
+            bool(batch) and sum(item.size for item in batch) + size > self.max_bytes)
+
+    def convert(self, src_path: str, fmt: str, output_dir: str) -> str:
+        """Convertit `src_path` au sein d'un lot et retourne le chemin produit dans `output_dir`."""
+        base_name = os.path.splitext(os.path.basename(src_path))[0]
+        item = _PendingConversion(src_path, os.path.join(output_dir, f"{base_name}.{fmt}"))
+        with self._cond:
+            batch = self._pending.get(fmt)
+            if batch is None or self._full(batch, item.size):
+                # Lot complet (son lanceur ne l'a pas encore retiré) : on en ouvre un autre
+                batch = self._pending[fmt] = []
+            batch.append(item)
+            leader = len(batch) == 1
+            if self._full(batch):
+                self._cond.notify_all()
+
+        if leader:
+            self._run(fmt, self._collect(fmt, batch))
+        elif not item.done.wait(self.window + self.batch_timeout(self.max_size) + BATCH_GRACE):
+            raise ConversionTimeout(f"Timeout lors de la conversion {fmt.upper()}.")
+
+        if item.retry_alone:
+            # Reprise seule dans le temps restant du lot, pas un nouveau délai complet
+            remaining = item.deadline - time.monotonic() if item.deadline is not None else self.timeout
+            if remaining < MIN_RETRY_TIMEOUT:
+                raise ConversionTimeout(f"Timeout lors de la conversion {fmt.upper()}.")
+            return convert_with_subprocess(src_path, fmt, output_dir, remaining)
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _collect(self, fmt: str, batch: List[_PendingConversion]) -> List[_PendingConversion]:
+        """Attend la fin de la fenêtre (ou un lot complet) et ferme le lot."""
+        deadline = time.monotonic() + self.window
+        with self._cond:
+            while not self._full(batch):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._pending.get(fmt) is batch:
+                del self._pending[fmt]
+            return batch
+
+    def _run(self, fmt: str, batch: List[_PendingConversion]) -> None:
+        CONVERSION_BATCH_SIZE.observe(len(batch), format=fmt)
+        workdir = tempfile.mkdtemp(prefix="darwin_convert_batch_")
+        try:
+            if len(batch) == 1:
+                item = batch[0]
+                item.result = convert_with_subprocess(item.src_path, fmt, os.path.dirname(item.output_path),
+                                                      self.timeout)
+                return
+
+            inputs = []
+            for index, item in enumerate(batch):
+                # Noms uniques : deux requêtes peuvent convertir des fichiers de même nom
+                link = os.path.join(workdir, f"{index:04d}{os.path.splitext(item.src_path)[1]}")
+                os.symlink(os.path.abspath(item.src_path), link)
+                inputs.append(link)
+            outdir = os.path.join(workdir, "out")
+
+            timeout = self.batch_timeout(len(batch))
+            deadline = time.monotonic() + timeout
+            for item in batch:
+                item.deadline = deadline
+            completed = False
+            try:
+                _run_soffice(inputs, fmt, outdir, timeout)
+                completed = True
+            except _SofficeFailed as e:
+                logger.error("Erreur LibreOffice (lot de %d) : %s", len(batch), e.result.stderr)
+            except subprocess.TimeoutExpired:
+                logger.warning("Lot de %d conversions %s en timeout", len(batch), fmt.upper())
+            except FileNotFoundError:
+                for item in batch:
+                    item.error = ConverterUnavailable(
+                        f"Conversion {fmt.upper()} non disponible. LibreOffice n'est pas installé.")
+                return
+
+            for index, item in enumerate(batch):
+                produced = os.path.join(outdir, f"{index:04d}.{fmt}")
+                if os.path.exists(produced):
+                    try:
+                        shutil.move(produced, item.output_path)
+                        item.result = item.output_path
+                    except OSError as e:
+                        # Requête abandonnée entre-temps (répertoire de travail supprimé)
+                        item.error = ConversionError(f"Fichier {fmt.upper()} non enregistré : {e}")
+                elif completed:
+                    # LibreOffice a traité le lot mais n'a pas pu ouvrir ce fichier
+                    item.error = ConversionError(f"Fichier {fmt.upper()} non généré.")
+                else:
+                    item.retry_alone = True
+        except ConversionError as e:
+            for item in batch:
+                if item.result is None and item.error is None:
+                    item.error = e
+        except Exception as e:
+            logger.exception("Lot de conversions %s en échec", fmt.upper())
+            for item in batch:
+                if item.result is None and item.error is None and not item.retry_alone:
+                    item.error = ConversionError(f"Erreur LibreOffice : {e}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+            for item in batch:
+                item.done.set()
+
+
+class LibreOfficeWorker:
+    """Une instance soffice headless, joignable par un pipe UNO nommé."""
+
+    def __init__(self, worker_id: int, binary: str = config.LIBREOFFICE_BIN):
+        self.worker_id = worker_id
+        self.binary = binary
+        self.pipe_name = f"darwin_{os.getpid()}_{worker_id}_{uuid.uuid4().hex[:8]}"
+        self.profile_dir: Optional[str] = None
+        self.process: Optional[subprocess.Popen] = None
+        self.desktop = None
+        self.jobs_done = 0
+
+    def start(self, startup_timeout: float = config.CONVERTER_STARTUP_TIMEOUT) -> None:
+        uno, _ = _load_uno()
+        if uno is None:
+            raise ConverterUnavailable("Module UNO indisponible.")
+
+        # Chaque instance a son propre profil, sinon elles se bloquent mutuellement
+        self.profile_dir = tempfile.mkdtemp(prefix="darwin_lo_profile_")
+        try:
+            self.process = subprocess.Popen([
+                self.binary,
+                "--headless", "--invisible", "--nologo", "--nodefault",
+                "--norestore", "--nolockcheck",
+                f"-env:UserInstallation={uno.systemPathToFileUrl(self.profile_dir)}",
+                f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            self._cleanup_profile()
+            raise ConverterUnavailable("LibreOffice n'est pas installé.")
+
+        deadline = time.monotonic() + startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                self._connect(uno)
+                self.jobs_done = 0
+                return
+            except Exception:
+                time.sleep(0.2)
+        self.stop()
+        raise ConversionError(f"L'instance LibreOffice {self.worker_id} n'a pas démarré.")
+
+    def _connect(self, uno) -> None:
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local)
+        ctx = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+        self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+    def is_healthy(self) -> bool:
+        """Le processus tourne et répond encore via UNO."""
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getCurrentComponent()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, src_path: str, output_path: str, fmt: str, timeout: float) -> str:
+        uno, PropertyValue = _load_uno()
+        filter_name = OUTPUT_FORMATS[fmt][0]
+
+        def prop(name, value):
+            p = PropertyValue()
+            p.Name = name
+            p.Value = value
+            return p
+
+        # Un appel UNO ne s'interrompt pas : en cas de dépassement on tue l'instance
+        timed_out = threading.Event()
+
+        def on_timeout():
+            timed_out.set()
+            self.kill()
+
+        watchdog = threading.Timer(timeout, on_timeout)
+        watchdog.start()
+        doc = None
+        try:
+            doc = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(src_path)), "_blank", 0,
+                (prop("Hidden", True),))
+            if doc is None:
+                raise ConversionError(f"LibreOffice n'a pas pu ouvrir {src_path}.")
+            doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(output_path)),
+                           (prop("FilterName", filter_name),))
+        except Exception as e:
+            if timed_out.is_set():
+                raise ConversionTimeout(f"Timeout lors de la conversion {fmt.upper()}.")
+            if isinstance(e, ConversionError):
+                raise
+            if not self.is_healthy():
+                # Processus mort ou pont UNO rompu : l'instance est en cause, pas le document
+                raise InstanceFailure(f"Instance LibreOffice {self.worker_id} hors service : {e}")
+            # L'instance répond : c'est le document qui pose problème
+            raise ConversionError(f"Erreur LibreOffice : {e}")
+        finally:
+            watchdog.cancel()
+            if doc is not None and not timed_out.is_set():
+                try:
+                    doc.close(True)
+                except Exception:
+                    pass
+            self.jobs_done += 1
+
+        if not os.path.exists(output_path):
+            raise ConversionError(f"Fichier {fmt.upper()} non généré.")
+        return output_path
+
+    def kill(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+
+    def stop(self) -> None:
+        self.desktop = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        self._cleanup_profile()
+
+    def _cleanup_profile(self) -> None:
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+class LibreOfficeConverter:
+    """
+    Pool d'instances LibreOffice chaudes avec repli sur la conversion par subprocess.
+    Le pool démarre à la première conversion (ou via `start()`).
+    """
+
+    def __init__(self, pool_size: int = config.CONVERTER_POOL_SIZE,
+                 max_jobs: int = config.CONVERTER_MAX_JOBS,
+                 timeout: float = config.CONVERSION_TIMEOUT):
+        self.pool_size = pool_size
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.batcher = ConversionBatcher(timeout=timeout)
+        self._workers: List[LibreOfficeWorker] = []
+        self._idle: "queue.Queue[LibreOfficeWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        # Instances en cours de redémarrage (hors de _idle jusqu'à ce qu'elles soient prêtes)
+        self._restarts: Dict[int, threading.Thread] = {}
+        # Passe à False si le pool ne peut pas fonctionner ici (pas de UNO, pas de LibreOffice)
+        self.pool_enabled = pool_size > 0 and _load_uno()[0] is not None
+
+    def start(self) -> None:
+        """Démarre les instances du pool. Sans effet si déjà démarré ou désactivé."""
+        with self._lock:
+            if self._started or not self.pool_enabled:
+                return
+            for worker_id in range(self.pool_size):
+                worker = LibreOfficeWorker(worker_id)
+                try:
+                    worker.start()
+                except ConversionError as e:
+                    logger.warning("Pool LibreOffice désactivé : %s", e)
+                    self.pool_enabled = False
+                    break
+                self._workers.append(worker)
+                self._idle.put(worker)
+            self._started = True
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+            restarts = list(self._restarts.values())
+            self._idle = queue.Queue()
+            self._started = False
+        for worker in workers:
+            worker.stop()
+        # Une instance redémarrée entre-temps ne fait plus partie du pool : elle s'arrête d'elle-même
+        for thread in restarts:
+            thread.join()
+        profile_pool.clear()
+
+    def is_available(self) -> bool:
+        """Vrai si une conversion est possible (pool actif ou binaire LibreOffice présent)."""
+        if self.pool_enabled and self._workers:
+            return True
+        return shutil.which(config.LIBREOFFICE_BIN) is not None
+
+    def _restart_later(self, worker: LibreOfficeWorker) -> None:
+        """
+        Redémarre l'instance dans un thread dédié (jusqu'à CONVERTER_STARTUP_TIMEOUT
+        secondes) : la requête en cours n'attend pas. L'instance ne revient dans
+        `_idle` qu'une fois prête ; si elle ne redémarre pas, elle quitte le pool.
+        """
+        def run():
+            try:
+                worker.stop()
+                worker.start()
+            except ConversionError as e:
+                logger.error("Redémarrage de l'instance LibreOffice %s impossible : %s", worker.worker_id, e)
+                with self._lock:
+                    self._restarts.pop(worker.worker_id, None)
+                    if worker in self._workers:
+                        self._workers.remove(worker)
+                return
+            with self._lock:
+                self._restarts.pop(worker.worker_id, None)
+                in_pool = worker in self._workers
+                if in_pool:
+                    self._idle.put(worker)
+            if not in_pool:
+                # Pool arrêté pendant le redémarrage
+                worker.stop()
+
+        thread = threading.Thread(target=run, name=f"darwin-lo-restart-{worker.worker_id}", daemon=True)
+        with self._lock:
+            self._restarts[worker.worker_id] = thread
+        thread.start()
+
+    def _acquire(self, fmt: str) -> LibreOfficeWorker:
+        """Instance libre et en état de marche ; les instances hors service partent en redémarrage."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                worker = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise ConversionTimeout(f"Timeout lors de la conversion {fmt.upper()}.")
+            if worker.is_healthy():
+                return worker
+            self._restart_later(worker)
+
+    def convert(self, src_path: str, fmt: str, output_dir: str) -> str:
+        """Convertit `src_path` au format `fmt` dans `output_dir` et retourne le chemin produit."""
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Format de conversion inconnu : {fmt}")
+
+        if not self._started:
+            self.start()
+        # Pool désactivé, ou toutes ses instances en sont sorties (redémarrages en échec)
+        if not self.pool_enabled or not self._workers:
+            if self.batcher.enabled:
+                return self.batcher.convert(src_path, fmt, output_dir)
+            return convert_with_subprocess(src_path, fmt, output_dir, self.timeout)
+
+        worker = self._acquire(fmt)
+
+        base_name = os.path.splitext(os.path.basename(src_path))[0]
+        output_path = os.path.join(output_dir, f"{base_name}.{fmt}")
+        healthy = False
+        try:
+            result = worker.convert(src_path, output_path, fmt, self.timeout)
+            healthy = True
+            return result
+        except InstanceFailure as e:
+            # Le document n'est pas en cause : conversion à froid pendant le redémarrage de l'instance
+            logger.warning("Pool LibreOffice (%s) en échec : %s", worker.worker_id, e)
+            worker.kill()
+            return convert_with_subprocess(src_path, fmt, output_dir, self.timeout)
+        except ConversionTimeout:
+            # Instance tuée par le chien de garde
+            raise
+        except ConversionError:
+            # Document illisible ou export refusé : l'instance reste saine, l'erreur remonte telle quelle
+            healthy = worker.is_healthy()
+            raise
+        finally:
+            if healthy and worker.jobs_done < self.max_jobs:
+                self._idle.put(worker)
+            else:
+                self._restart_later(worker)
@@ -1,51 +1,185 @@
+import io
 import os
 import re
+import uuid
 from pathlib import Path
-from docxtpl import DocxTemplate
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from html import unescape
+from typing import List, Optional, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+from app.core.metrics import timed
+from app.services.artifacts import Artifact, artifact_store
+from app.services.template_cache import TemplateRegistry
 
 # On définit des constantes pour les chemins (Bonne pratique)
 BASE_DIR = Path(__file__).resolve().parent.parent.parent  # backend/
 TEMPLATE_DIR = BASE_DIR / "app" / "templates"
 OUTPUT_DIR = BASE_DIR / "generated_docs"
 
+DOCX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+TEMPLATE_PATH = TEMPLATE_DIR / "dat_template.docx"
+
+
+# Expressions compilées une fois pour toutes (strip_html est appelé sur chaque champ riche)
+BR_TAG = re.compile(r'<br\s*/?>')
+LI_OPEN_TAG = re.compile(r'<li\b[^>]*>')
+LIST_BOUNDARY = re.compile(r'<(/?)(?:ul|ol)\b')
+LIST_TAG = re.compile(r'<(/?)(ul|ol|li)\b[^>]*>')
+ANY_TAG = re.compile(r'<[^>]+>')
+# Fin de texte déjà à la ligne (balises et espaces ignorés)
+LINE_START = re.compile(r'(?:^|\n)(?:\s|<[^>]+>)*$')
+BLANK_LINES = re.compile(r'\n\s*\n')
+
+
+def _has_nested_lists(text: str) -> bool:
+    """Vrai si une liste <ul>/<ol> est ouverte à l'intérieur d'une autre."""
+    depth = 0
+    for match in LIST_BOUNDARY.finditer(text):
+        if match.group(1):
+            depth = depth - 1 if depth else 0
+        else:
+            depth += 1
+            if depth > 1:
+                return True
+    return False
+
+
+def _indent_list_items(text: str) -> str:
+    """
+    Remplace chaque <li> par une puce indentée selon la profondeur de la liste.
+    Une sous-liste ouverte au milieu d'un élément (`<li>a<ul>...`) commence sur
+    une nouvelle ligne.
+    """
+    depth = 0
+
+    def replace(match):
+        nonlocal depth
+        closing, name = match.groups()
+        if name == 'li':
+            return '' if closing else '  ' * max(depth - 1, 0) + '• '
+        depth = (depth - 1 if depth else 0) if closing else depth + 1
+        if not closing and depth > 1 and not LINE_START.search(match.string, 0, match.start()):
+            return '\n'
+        return ''
+
+    return LIST_TAG.sub(replace, text)
+
 
 def strip_html(html_content: str) -> str:
     """
     Convertit le HTML de l'éditeur riche en texte simple pour Word.
-    Gère les listes, paragraphes, etc.
+    Gère les listes (y compris imbriquées, indentées), paragraphes, etc.
+
+    Chaque passe n'est faite que si le texte peut en avoir besoin : un champ
+    sans balise, sans entité ou sans saut de ligne ne paie pas les autres.
     """
     if not html_content:
         return ""
-    
+
     text = html_content
-    
-    # Convertir les sauts de ligne HTML
-    text = re.sub(r'<br\s*/?>', '\n', text)
-    text = re.sub(r'</p>', '\n', text)
-    text = re.sub(r'</div>', '\n', text)
-    text = re.sub(r'</li>', '\n', text)
-    
-    # Convertir les listes à puces
-    text = re.sub(r'<li[^>]*>', '• ', text)
-    
-    # Supprimer toutes les autres balises HTML
-    text = re.sub(r'<[^>]+>', '', text)
-    
+
+    if '<' in text:
+        # Convertir les sauts de ligne HTML
+        if '<br' in text:
+            text = BR_TAG.sub('\n', text)
+        text = text.replace('</p>', '\n').replace('</div>', '\n').replace('</li>', '\n')
+
+        # Convertir les listes à puces
+        if '<li' in text:
+            if _has_nested_lists(text):
+                text = _indent_list_items(text)
+            else:
+                text = LI_OPEN_TAG.sub('• ', text)
+
+        # Supprimer toutes les autres balises HTML
+        text = ANY_TAG.sub('', text)
+
     # Décoder les entités HTML
-    text = unescape(text)
-    
+    if '&' in text:
+        text = unescape(text)
+
     # Nettoyer les espaces multiples et lignes vides multiples
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    text = text.strip()
-    
-    return text
+    if '\n' in text:
+        text = BLANK_LINES.sub('\n\n', text)
+    return text.strip()
+
+
+@dataclass(frozen=True)
+class CleaningPlan:
+    """
+    Ce qu'il faut nettoyer dans un modèle Pydantic, calculé une fois par classe :
+    les champs HTML à convertir et les sous-modèles / listes qui en contiennent.
+    Les listes sans champ HTML (vms, flux_reseau...) sont passées telles quelles.
+    """
+    field_names: Tuple[str, ...]
+    html_fields: Tuple[str, ...]
+    # (nom du champ, plan du sous-modèle, est-ce une liste)
+    nested: Tuple[Tuple[str, "CleaningPlan", bool], ...]
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.html_fields and not self.nested
+
+    def apply(self, model: BaseModel) -> dict:
+        """Contexte de rendu construit directement depuis le modèle validé, sans model_dump()."""
+        context = dict(model.__dict__)
+        for name in self.html_fields:
+            context[name] = strip_html(context[name])
+        for name, plan, is_list in self.nested:
+            value = context[name]
+            if value is None:
+                continue
+            context[name] = [plan.apply(item) for item in value] if is_list else plan.apply(value)
+        return context
+
+
+def _submodel(annotation) -> Tuple[Optional[type], bool]:
+    """Retourne (classe du sous-modèle, est-ce une liste) pour une annotation de champ."""
+    origin = get_origin(annotation)
+    if origin in (list, List):
+        item = get_args(annotation)[0]
+        return (item, True) if isinstance(item, type) and issubclass(item, BaseModel) else (None, False)
+    if origin is Union:
+        for arg in get_args(annotation):
+            if arg is not type(None):
+                return _submodel(arg)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None, False
+
+
+@lru_cache(maxsize=None)
+def compile_cleaning_plan(model_cls: Type[BaseModel]) -> CleaningPlan:
+    """Parcourt l'arbre des modèles Pydantic et repère les champs marqués HTML_FIELD."""
+    html_fields = []
+    nested = []
+    for name, field in model_cls.model_fields.items():
+        extra = field.json_schema_extra if isinstance(field.json_schema_extra, dict) else {}
+        if extra.get("format") == "html":
+            html_fields.append(name)
+            continue
+        submodel, is_list = _submodel(field.annotation)
+        if submodel is not None:
+            plan = compile_cleaning_plan(submodel)
+            if not plan.is_empty:
+                nested.append((name, plan, is_list))
+    return CleaningPlan(tuple(model_cls.model_fields), tuple(html_fields), tuple(nested))
+
+
+def build_render_context(data: BaseModel) -> dict:
+    """Contexte docxtpl prêt à l'emploi pour un modèle validé (DatRequest)."""
+    return compile_cleaning_plan(type(data)).apply(data)
 
 
 def clean_data_for_word(data: dict) -> dict:
     """
     Nettoie récursivement toutes les chaînes HTML dans le dictionnaire.
+    Conservé pour les appels avec un dict ; pour un modèle validé, utiliser
+    build_render_context qui ne nettoie que les champs réellement HTML.
     """
     cleaned = {}
     
@@ -81,45 +215,108 @@ def clean_data_for_word(data: dict) -> dict:
     return cleaned
 
 
+def safe_filename_title(title: str) -> str:
+    """Réduit un titre de projet aux caractères sûrs pour un nom de fichier."""
+    safe_title = "".join([c for c in title if c.isalnum() or c in (' ', '-', '_')]).strip()
+    return safe_title or "document"
+
+
 class DocumentService:
     def __init__(self):
-        # On s'assure que le dossier de sortie existe
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        # Templates parsés une seule fois, rechargés si leur fichier change.
+        # Rien n'est lu ni compilé ici : l'instance est créée à l'import du module
+        self.templates = TemplateRegistry(TEMPLATE_DIR)
+        # Documents produits, servis par GET /api/v1/documents/{id}
+        self.artifacts = artifact_store
+
+    def _render(self, data: Union[BaseModel, dict], template: Optional[str] = None):
+        # 1. & 2. Copie fraîche du template en cache (UnknownTemplate / FileNotFoundError si absent)
+        with timed("template_load"):
+            doc = self.templates.get_template(template)
 
-    def generate_dat(self, data: dict) -> str:
+        # 3. Nettoyer les données HTML avant le rendu
+        with timed("clean"):
+            if isinstance(data, BaseModel):
+                cleaned_data = build_render_context(data)
+            else:
+                cleaned_data = clean_data_for_word(data)
+
+        # Images des schémas : préparées (cache) et liées à ce document
+        # (import paresseux : python-docx / docxtpl, déjà chargés par le template à ce stade)
+        from app.services.images import embed_images
+        with timed("images"):
+            cleaned_data = embed_images(doc, cleaned_data)
+
+        # 4. Rendu (Injection des variables Jinja2)
+        with timed("render"):
+            doc.render(cleaned_data)
+        return doc
+
+    def render_dat(self, data: Union[BaseModel, dict], template: Optional[str] = None) -> io.BytesIO:
         """
-        Génère un DAT à partir d'un dictionnaire de données.
+        Génère un DAT en mémoire, sans écrire sur le disque.
+
+        Args:
+            data (DatRequest | dict): Le modèle validé, ou son .model_dump()
+            template (str, optionnel): Nom du template (par défaut : DEFAULT_TEMPLATE)
+
+        Returns:
+            io.BytesIO: Le contenu du .docx, positionné au début
+        """
+        doc = self._render(data, template)
+        buffer = io.BytesIO()
+        with timed("save"):
+            doc.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def generate_dat(self, data: Union[BaseModel, dict], template: Optional[str] = None,
+                     output_dir: Union[str, Path, None] = None) -> str:
+        """
+        Génère un DAT à partir des données du formulaire.
         
         Args:
-            data (dict): Les données validées par Pydantic (.model_dump())
+            data (DatRequest | dict): Le modèle validé, ou son .model_dump()
+            template (str, optionnel): Nom du template (par défaut : DEFAULT_TEMPLATE)
+            output_dir (str, optionnel): Dossier de sortie (par défaut : generated_docs)
             
         Returns:
             str: Le chemin absolu du fichier généré
         """
-        template_path = TEMPLATE_DIR / "dat_template.docx"
-        
-        # 1. Vérification de l'existence du template
-        if not template_path.exists():
-            raise FileNotFoundError(f"Le template est introuvable : {template_path}")
-
-        # 2. Chargement du template
-        doc = DocxTemplate(template_path)
-
-        # 3. Nettoyer les données HTML avant le rendu
-        cleaned_data = clean_data_for_word(data)
-
-        # 4. Rendu (Injection des variables Jinja2)
-        doc.render(cleaned_data)
+        doc = self._render(data, template)
 
         # 5. Construction du nom de fichier unique
-        safe_title = "".join([c for c in data.get('titre_projet', 'document') if c.isalnum() or c in (' ', '-', '_')]).strip()
-        if not safe_title:
-            safe_title = "document"
+        # (suffixe aléatoire : deux requêtes dans la même seconde ne s'écrasent pas)
+        title = data.titre_projet if isinstance(data, BaseModel) else data.get('titre_projet', 'document')
+        safe_title = safe_filename_title(title)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"DAT_{safe_title}_{timestamp}.docx"
-        output_path = OUTPUT_DIR / filename
+        filename = f"DAT_{safe_title}_{timestamp}_{uuid.uuid4().hex[:8]}.docx"
+        output_dir = Path(output_dir) if output_dir is not None else OUTPUT_DIR
+        output_path = output_dir / filename
 
-        # 6. Sauvegarde
-        doc.save(output_path)
+        # 6. Sauvegarde (dossier de sortie créé au premier usage, pas à l'import)
+        os.makedirs(output_dir, exist_ok=True)
+        with timed("save"):
+            doc.save(output_path)
         
         return str(output_path)
+
+    def store_dat(self, data: BaseModel, template: Optional[str] = None,
+                  key: Optional[str] = None) -> Optional[Artifact]:
+        """
+        Génère un DAT et l'enregistre dans le stockage des artefacts.
+
+        Args:
+            data (DatRequest): Le modèle validé
+            template (str, optionnel): Nom du template (par défaut : DEFAULT_TEMPLATE)
+            key (str, optionnel): Clé de cache, dont dérive un identifiant stable (aléatoire sinon)
+
+        Returns:
+            Artifact | None: Le document enregistré, None si le stockage est désactivé
+        """
+        if not self.artifacts.enabled:
+            return None
+        buffer = self.render_dat(data, template)
+        with timed("save"):
+            return self.artifacts.put(f"DAT_{data.titre_projet}.docx", DOCX_MEDIA_TYPE,
+                                      content=buffer.getvalue(), key=key)
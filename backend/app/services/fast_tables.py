@@ -0,0 +1,335 @@
+"""
+Rendu rapide des grandes listes d'inventaire (vms, flux, échanges, DNS...).
+
+Avec docxtpl, une boucle `{% for vm in vms %}` est évaluée par Jinja2 sur le
+XML sérialisé du document, puis tout le document repasse par resolve_listing
+(regex par paragraphe) et fix_tables (parcours lxml de chaque tableau) : le coût
+et la mémoire explosent avec des milliers de lignes.
+
+Ici, à la compilation du template, chaque boucle simple (corps composé
+uniquement de XML et de `{{ item.champ }}`) est repérée avec les éléments qui
+l'entourent (lignes de tableau, ou paragraphes / tableaux du corps). Cette zone
+est remplacée dans le source Jinja2 par un commentaire XML. Au rendu, les
+lignes sont produites en une passe par simple concaténation du prototype et des
+valeurs, puis réinsérées à la place du marqueur une fois fix_tables appliqué au
+reste du document. Le résultat est identique à celui de docxtpl : une boucle pour
+laquelle ce n'est pas garanti (boucles imbriquées, images, tableaux dont la
+grille dépendrait des lignes répétées...) reste rendue par Jinja2. Une zone dont
+une valeur contient `&`, `<`, `{` ou `}` est rendue par Jinja2 seule, avec le
+template de la zone : les autres zones restent rapides.
+"""
+import re
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from jinja2 import Template
+from lxml import etree
+
+MARKER = "<!--darwin:rows:{}-->"
+MARKER_TAG = re.compile(r"<!--darwin:rows:(\d+)-->")
+
+JINJA_TAG = re.compile(r"\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\}", re.DOTALL)
+FOR_TAG = re.compile(r"\{%\s*for\s+(\w+)\s+in\s+(\w+)\s*%\}")
+ENDFOR_TAG = re.compile(r"\{%\s*endfor\s*%\}")
+BLOCK_TAG = re.compile(r"\{%-?\s*(\w+)")
+XML_TAG = re.compile(r"<(/?)([A-Za-z][\w.:-]*)(?:\s[^>]*?)?(/?)>")
+# Caractères transformés par DocxTemplate.resolve_listing
+LISTING_CHARS = ("\t", "\a", "\n", "\f")
+# Caractères qu'une valeur ne peut pas contenir dans le rendu par concaténation
+SPECIAL_CHARS = re.compile(r"[&<{}]")
+# Début de balise, de commentaire ou d'instruction dans une valeur du contexte
+MARKUP_START = re.compile(r"<[/!?:_]|<[^\W\d]")
+
+# Les boucles imbriquées dans ces éléments ne peuvent pas être greffées telles quelles
+_INLINE_PARENTS = ("w:p", "w:r", "w:t", "w:hyperlink", "w:sdtContent", "w:smartTag")
+
+
+@dataclass(frozen=True)
+class RowLoop:
+    """Boucle `{% for var in liste %}` rendue sans Jinja2, à partir de son prototype XML."""
+    index: int
+    list_name: str
+    var: str
+    # XML de la zone avant le {% for %}, après le {% endfor %}
+    prefix: str
+    suffix: str
+    # Corps de la boucle découpé autour des `{{ var.champ }}` : len(pieces) == len(fields) + 1.
+    # Une fois compilées, ces parties ont déjà subi le post-traitement de docxtpl.
+    pieces: Tuple[str, ...]
+    fields: Tuple[str, ...]
+    # Zone complète (boucle comprise), rendue par Jinja2 quand une valeur l'impose
+    template: Optional[Template] = None
+
+    def render(self, items: Sequence[Any], getattr_: Callable[[Any, str], Any]) -> Optional[str]:
+        """
+        XML de la zone pour ces éléments, comme l'aurait produit Jinja2.
+
+        Une valeur contenant `&` ou `<` est insérée telle quelle par docxtpl et
+        c'est le parseur en mode "recover" de fix_tables qui décide du
+        résultat ; `{` / `}` sont réécrits après le rendu (`{_{` -> `{{`). La
+        zone est alors rendue par son template Jinja2, avec le même
+        post-traitement, et le parseur de splice applique la même reprise.
+        None si une valeur est un objet docxtpl (image...) ou du balisage
+        (`<b>`, `</`...) qui pourrait changer la structure des tableaux : seul
+        le rendu complet reproduit alors le même document.
+        """
+        out = [self.prefix]
+        append = out.append
+        pairs = tuple(zip(self.pieces, self.fields))
+        last = self.pieces[-1]
+        special = False
+        for item in items:
+            for piece, name in pairs:
+                value = getattr_(item, name)
+                # Objets docxtpl (InlineImage, RichText...) : leur rendu agit sur le document
+                if hasattr(value, "__html__"):
+                    return None
+                value = str(value)
+                if SPECIAL_CHARS.search(value):
+                    if "<" in value and MARKUP_START.search(value):
+                        return None
+                    special = True
+                append(piece)
+                append(value)
+            append(last)
+        if special:
+            if self.template is None:
+                return None
+            return _postprocess(self.template.render({self.list_name: items}))
+        out.append(self.suffix)
+        return "".join(out)
+
+
+@dataclass(frozen=True)
+class FastBody:
+    """Source Jinja2 du corps où chaque boucle rapide est remplacée par un marqueur."""
+    source: str
+    loops: Tuple[RowLoop, ...]
+
+
+def _element_stacks(source: str, positions: Sequence[int]) -> Dict[int, List[list]]:
+    """
+    Ancêtres XML de chaque position : liste de [nom, début, fin] de la racine
+    vers l'élément le plus proche (la fin est renseignée à la fermeture).
+    """
+    wanted = sorted(set(positions))
+    snapshots: Dict[int, List[list]] = {}
+    stack: List[list] = []
+    i = 0
+    for m in XML_TAG.finditer(source):
+        while i < len(wanted) and wanted[i] < m.start():
+            snapshots[wanted[i]] = list(stack)
+            i += 1
+        closing, name, self_closing = m.group(1), m.group(2), m.group(3)
+        if self_closing:
+            continue
+        if closing:
+            while stack:
+                element = stack.pop()
+                if element[0] == name:
+                    element[2] = m.end()
+                    break
+        else:
+            stack.append([name, m.start(), None])
+    while i < len(wanted):
+        snapshots[wanted[i]] = list(stack)
+        i += 1
+    return snapshots
+
+
+def _split_body(body: str, var: str) -> Optional[Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+    """Découpe le corps autour des `{{ var.champ }}` ; None s'il contient autre chose."""
+    pieces, fields = [], []
+    position = 0
+    for m in JINJA_TAG.finditer(body):
+        expression = re.fullmatch(r"\{\{\s*(\w+)\.(\w+)\s*\}\}", m.group(0))
+        if expression is None or expression.group(1) != var:
+            return None
+        pieces.append(body[position:m.start()])
+        fields.append(expression.group(2))
+        position = m.end()
+    pieces.append(body[position:])
+    return tuple(pieces), tuple(fields)
+
+
+def _postprocess(xml: str) -> str:
+    """Transformations de texte appliquées par docxtpl après le rendu Jinja2."""
+    xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", xml)
+    return (xml
+            .replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}"))
+
+
+def splice(tree, blocks: Dict[int, str]):
+    """
+    Remplace chaque marqueur par le XML de sa zone et retourne le nouvel arbre.
+    Le document est re-parsé en une fois : bien plus rapide que de déplacer des
+    milliers d'éléments d'un arbre lxml à l'autre.
+    """
+    xml = etree.tostring(tree, encoding="unicode")
+    xml = MARKER_TAG.sub(lambda m: blocks.get(int(m.group(1)), m.group(0)), xml)
+    return etree.fromstring(xml, parser=etree.XMLParser(recover=True))
+
+
+def _literals_are_independent(loop: RowLoop) -> bool:
+    """
+    Le post-traitement de docxtpl (`\\n<w:p`, `{_{`...) peut-il être appliqué aux
+    parties fixes une fois pour toutes ? Oui si aucun motif ne peut chevaucher
+    deux parties, ni une partie et une valeur (qui ne contient ni `<` ni accolade).
+    """
+    first, last = loop.pieces[0], loop.pieces[-1]
+    for left, right in ((loop.prefix, first), (last, first), (last, loop.suffix), (loop.prefix, loop.suffix)):
+        if _postprocess(left + right) != _postprocess(left) + _postprocess(right):
+            return False
+    for piece in loop.pieces[:-1]:
+        if piece.endswith(("{", "}", "%", "_")):
+            return False
+    for piece in loop.pieces[1:]:
+        if piece.startswith(("{", "}", "%", "_", "<w:p ", "<w:p>")):
+            return False
+    return True
+
+
+def _region_xml(loop: RowLoop, count: int) -> str:
+    items = [dict.fromkeys(loop.fields, "x")] * count
+    return loop.render(items, lambda item, name: item[name])
+
+
+def _is_transparent(fix_tables: Callable[[str], Any], root_tag: str, loop: RowLoop,
+                    source: str, start: int, end: int, outer: Optional[Tuple[int, int]]) -> bool:
+    """
+    Vérifie que greffer la zone après fix_tables donne le même arbre que de
+    passer le document entier dans fix_tables (grille des tableaux inchangée).
+    """
+    context_start, context_end = outer if outer else (start, end)
+    before = source[context_start:start]
+    after = source[end:context_end]
+    marker = MARKER.format(loop.index)
+    for count in (0, 1, 2):
+        region = _region_xml(loop, count)
+        expected = fix_tables(_postprocess(root_tag + before + region + after + "</w:body>"))
+        tree = fix_tables(_postprocess(root_tag + before + marker + after + "</w:body>"))
+        tree = splice(tree, {loop.index: _postprocess(region)})
+        if etree.tostring(expected) != etree.tostring(tree):
+            return False
+    return True
+
+
+def compile_fast_body(source: str, fix_tables: Callable[[str], Any]) -> Optional[FastBody]:
+    """
+    Repère les boucles rendables sans Jinja2 dans le source du corps (après
+    patch_xml) et retourne le source modifié, ou None si aucune ne l'est.
+    `fix_tables` est DocxTemplate.fix_tables, utilisé pour valider chaque boucle.
+    """
+    root_match = re.match(r"<w:body\b[^>]*>", source)
+    if root_match is None:
+        return None
+    root_tag = root_match.group(0)
+
+    # Boucles de premier niveau dont le corps ne contient aucune autre instruction
+    candidates = []
+    depth = 0
+    opened = None
+    for m in BLOCK_TAG.finditer(source):
+        keyword = m.group(1)
+        if keyword == "for":
+            depth += 1
+            opened = FOR_TAG.match(source, m.start()) if depth == 1 else None
+        elif keyword == "endfor":
+            depth -= 1
+            end_match = ENDFOR_TAG.match(source, m.start())
+            if depth == 0 and opened is not None and end_match is not None:
+                candidates.append((opened, end_match))
+            opened = None
+        elif depth:
+            opened = None
+
+    stacks = _element_stacks(source, [p for f, e in candidates for p in (f.start(), e.start())])
+
+    loops: List[RowLoop] = []
+    regions: List[Tuple[int, int]] = []
+    for for_match, end_match in candidates:
+        body = _split_body(source[for_match.end():end_match.start()], for_match.group(1))
+        if body is None:
+            continue
+        open_stack, close_stack = stacks[for_match.start()], stacks[end_match.start()]
+        common = 0
+        while (common < len(open_stack) and common < len(close_stack)
+               and open_stack[common] is close_stack[common]):
+            common += 1
+        if common == 0 or common >= len(open_stack) or common >= len(close_stack):
+            continue
+        if any(element[0] in _INLINE_PARENTS for element in open_stack[:common]):
+            continue
+        start, end = open_stack[common][1], close_stack[common][2]
+        if source[start - 1:start] == "\n":
+            # Saut de ligne ajouté devant <w:p> à la préparation : il suit la zone
+            start -= 1
+        if end is None or (regions and start < regions[-1][1]):
+            continue
+        prefix = source[start:for_match.start()]
+        suffix = source[end_match.end():end]
+        region_source = source[start:end]
+        if JINJA_TAG.search(prefix) or JINJA_TAG.search(suffix) or "docPr" in region_source:
+            continue
+
+        pieces, fields = body
+        loop = RowLoop(
+            index=len(loops),
+            list_name=for_match.group(2),
+            var=for_match.group(1),
+            prefix=prefix,
+            suffix=suffix,
+            pieces=pieces,
+            fields=fields,
+        )
+        # Le tableau englobant le plus externe sert de contexte à la vérification
+        tables = [element for element in open_stack[:common] if element[0] == "w:tbl"]
+        outer = (tables[0][1], tables[0][2]) if tables else None
+        if not _literals_are_independent(loop) or \
+                not _is_transparent(fix_tables, root_tag, loop, source, start, end, outer):
+            continue
+        loops.append(replace(
+            loop,
+            prefix=_postprocess(prefix),
+            suffix=_postprocess(suffix),
+            pieces=tuple(_postprocess(piece) for piece in pieces),
+            template=Template(region_source),
+        ))
+        regions.append((start, end))
+
+    if not loops:
+        return None
+
+    parts = []
+    position = 0
+    for loop, (start, end) in zip(loops, regions):
+        parts.append(source[position:start])
+        parts.append(MARKER.format(loop.index))
+        position = end
+    parts.append(source[position:])
+    return FastBody(source="".join(parts), loops=tuple(loops))
+
+
+def render_blocks(fast: FastBody, context: dict, getattr_: Callable[[Any, str], Any],
+                  resolve_listing: Callable[[str], str]) -> Optional[Dict[int, str]]:
+    """
+    XML de chaque zone rapide pour ce contexte, ou None si une liste n'est pas
+    une vraie liste (absente, None...) ou contient du balisage ou des objets
+    docxtpl : le rendu Jinja2 complet s'applique alors.
+    """
+    blocks = {}
+    for loop in fast.loops:
+        items = context.get(loop.list_name)
+        if not isinstance(items, (list, tuple)):
+            return None
+        xml = loop.render(items, getattr_)
+        if xml is None:
+            return None
+        # Sans caractère spécial, resolve_listing ne change rien : on s'en dispense
+        if any(c in xml for c in LISTING_CHARS):
+            xml = resolve_listing(xml)
+        blocks[loop.index] = xml
+    return blocks
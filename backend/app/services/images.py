@@ -0,0 +1,207 @@
+"""
+Images des schémas fonctionnels (SchemaFonctionnel.image).
+
+Le frontend envoie l'image collée sous forme de data URL
+(`data:image/png;base64,...`) ou de base64 brut. Avant d'être insérée dans le
+document (InlineImage de docxtpl), chaque image est préparée une seule fois :
+réduite à la largeur de la zone de texte de la page (à IMAGE_DPI) puis
+recompressée (PNG optimisé, JPEG pour les photos). Le résultat est gardé dans
+un cache indexé par le hash du contenu : un même schéma, collé dans plusieurs
+DAT, n'est traité qu'une fois et les documents restent légers à rendre,
+enregistrer et convertir.
+
+Pillow est optionnel : sans lui, les images sont insérées telles quelles
+(toujours dédupliquées et mises à la largeur de la page).
+"""
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from docx.image.image import Image as DocxImage
+from docx.shared import Emu, Inches, Mm
+from docxtpl import InlineImage
+
+from app.core import config
+from app.core.metrics import IMAGE_CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+DATA_URL = re.compile(r"^data:image/[\w.+-]+;base64,", re.IGNORECASE)
+BASE64 = re.compile(r"^[A-Za-z0-9+/\s]+={0,2}\s*$")
+# Signatures des formats acceptés par python-docx
+SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"GIF87a", b"GIF89a", b"BM", b"II*\x00", b"MM\x00*")
+# Largeur utile par défaut si le template ne la précise pas (A4, marges de 25 mm)
+DEFAULT_TEXT_WIDTH = Mm(160)
+
+
+def _load_pillow():
+    """Import paresseux de Pillow : optionnel."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def decode_image(value: str) -> Optional[bytes]:
+    """
+    Octets de l'image portée par `value` (data URL ou base64), ou None si ce
+    n'est pas une image (ancien usage : chemin ou texte libre).
+    Lève ValueError pour une data URL illisible.
+    """
+    if not value:
+        return None
+    match = DATA_URL.match(value)
+    if match is None and (len(value) < 64 or not BASE64.match(value)):
+        return None
+    try:
+        raw = base64.b64decode(value[match.end():] if match else value)
+    except (binascii.Error, ValueError):
+        if match:
+            raise ValueError("Image illisible (base64 invalide).")
+        return None
+    if not raw.startswith(SIGNATURES):
+        if match:
+            raise ValueError("Format d'image non pris en charge.")
+        return None
+    return raw
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """Image prête à insérer : octets recompressés et largeur native (EMU)."""
+    blob: bytes
+    width: int
+
+
+def _recompress(raw: bytes, max_width_px: int) -> bytes:
+    """Réduit l'image à `max_width_px` et la recompresse ; `raw` si Pillow manque ou si rien n'y gagne."""
+    Image = _load_pillow()
+    if Image is None:
+        return raw
+    try:
+        with Image.open(io.BytesIO(raw)) as original:
+            source_format = original.format
+            img = original
+            img.load()
+            resized = img.width > max_width_px
+            if resized:
+                height = max(1, round(img.height * max_width_px / img.width))
+                img = img.resize((max_width_px, height), Image.LANCZOS)
+
+            out = io.BytesIO()
+            if source_format == "JPEG":
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                img.save(out, format="JPEG", quality=config.IMAGE_JPEG_QUALITY, optimize=True,
+                         dpi=(config.IMAGE_DPI, config.IMAGE_DPI))
+            else:
+                # Schémas : aplats de couleur, le PNG reste le plus compact et sans perte
+                if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+                    img = img.convert("RGBA")
+                img.save(out, format="PNG", optimize=True, dpi=(config.IMAGE_DPI, config.IMAGE_DPI))
+            blob = out.getvalue()
+    except Exception:
+        logger.warning("Image non recompressée (Pillow n'a pas pu la lire)", exc_info=True)
+        return raw
+    return blob if resized or len(blob) < len(raw) else raw
+
+
+class ImageCache:
+    """Images préparées, indexées par hash du contenu ; LRU borné en octets."""
+
+    def __init__(self, max_bytes: int = config.IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, PreparedImage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prepare(self, raw: bytes, text_width: int) -> PreparedImage:
+        max_width_px = max(1, round(text_width / Inches(1) * config.IMAGE_DPI))
+        key = f"{hashlib.sha256(raw).hexdigest()}:{max_width_px}"
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is not None:
+                self._entries.move_to_end(key)
+        if prepared is not None:
+            IMAGE_CACHE_EVENTS.inc(result="hit")
+            return prepared
+
+        IMAGE_CACHE_EVENTS.inc(result="miss")
+        blob = _recompress(raw, max_width_px)
+        image = DocxImage.from_blob(blob)
+        prepared = PreparedImage(blob=blob, width=min(image.width, text_width))
+        self._put(key, prepared)
+        return prepared
+
+    def _put(self, key: str, prepared: PreparedImage) -> None:
+        size = len(prepared.blob)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous.blob)
+            self._entries[key] = prepared
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted.blob)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+image_cache = ImageCache()
+
+
+def text_width(doc) -> int:
+    """Largeur de la zone de texte (EMU) de la dernière section du document."""
+    # Le .docx n'est chargé qu'au rendu ; init_docx ne le recharge pas s'il l'est déjà
+    doc.init_docx()
+    section = doc.docx.sections[-1]
+    if section.page_width is None or section.left_margin is None or section.right_margin is None:
+        return DEFAULT_TEXT_WIDTH
+    return section.page_width - section.left_margin - section.right_margin
+
+
+def embed_images(doc, context: dict) -> dict:
+    """
+    Remplace, dans le contexte de rendu, les images des schémas par des
+    InlineImage liées à `doc`. Le contexte d'origine n'est pas modifié.
+    """
+    schemas = context.get("schemas")
+    if not schemas:
+        return context
+
+    width = None
+    items = []
+    changed = False
+    for schema in schemas:
+        fields = dict(schema) if isinstance(schema, dict) else dict(schema.__dict__)
+        try:
+            raw = decode_image(fields.get("image") or "")
+            if raw is not None:
+                if width is None:
+                    width = text_width(doc)
+                prepared = image_cache.prepare(raw, width)
+                fields["image"] = InlineImage(doc, io.BytesIO(prepared.blob), width=Emu(prepared.width))
+                changed = True
+        except Exception as e:
+            # Une image corrompue ne doit ni faire échouer le DAT ni y finir en texte base64
+            logger.warning("Schéma « %s » : image ignorée (%s)", fields.get("titre", ""), e)
+            fields["image"] = ""
+            changed = True
+        items.append(fields)
+    if not changed:
+        return context
+    return {**context, "schemas": items}
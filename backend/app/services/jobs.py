@@ -0,0 +1,282 @@
+"""
+File de jobs de génération asynchrone.
+
+POST /jobs enregistre le job et rend la main immédiatement ; des workers
+in-process (tâches asyncio) dépilent la file et exécutent la même chaîne que
+/generate. Le stockage des jobs passe par un `JobBackend` remplaçable
+(mémoire locale par défaut).
+
+Le nombre de jobs gardés est borné (MAX_JOBS) : les jobs terminés expirent
+après JOB_TTL (purge périodique) et les plus anciens sont supprimés au-delà
+de la limite. Les résultats terminés sont déversés sur disque plutôt que
+gardés en mémoire pendant toute leur durée de vie.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core import config
+from app.core.metrics import JOBS_QUEUED
+from app.schemas.dat import DatRequest
+from app.schemas.job import JobStatus
+from app.services.concurrency import ServiceSaturated
+from app.services.pipeline import GeneratedDocument, generate_document, spool_document
+
+# Avancement affiché pour chaque étape
+STAGE_PROGRESS = {"queued": 0, "rendering": 10, "converting": 60, "done": 100, "failed": 100}
+FINAL_STATES = ("done", "failed")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """Job de génération et son résultat."""
+    id: str
+    format: str
+    request: Optional[DatRequest]
+    template: Optional[str] = None
+    status: str = "queued"
+    stage: str = "queued"
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[GeneratedDocument] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINAL_STATES
+
+    def to_status(self, result_url: Optional[str] = None, document_url: Optional[str] = None) -> JobStatus:
+        return JobStatus(
+            job_id=self.id,
+            status=self.status,
+            stage=self.stage,
+            progress=STAGE_PROGRESS.get(self.stage, 0),
+            format=self.format,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            error=self.error,
+            result_url=result_url if self.status == "done" else None,
+            document_url=document_url if self.status == "done" else None,
+        )
+
+
+class JobBackend(ABC):
+    """Stockage des jobs. Implémenter cette interface pour changer de backend."""
+
+    @abstractmethod
+    def save(self, job: Job) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        """Nombre de jobs gardés, terminés ou non."""
+
+    @abstractmethod
+    def list_finished_before(self, timestamp: float) -> List[Job]:
+        """Jobs terminés avant `timestamp`, du plus ancien au plus récent."""
+
+
+class InMemoryJobBackend(JobBackend):
+    """Jobs gardés en mémoire dans le processus (perdus au redémarrage)."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def count(self) -> int:
+        return len(self._jobs)
+
+    def list_finished_before(self, timestamp: float) -> List[Job]:
+        with self._lock:
+            jobs = [job for job in self._jobs.values()
+                    if job.is_finished and job.finished_at is not None and job.finished_at < timestamp]
+        return sorted(jobs, key=lambda job: job.finished_at)
+
+
+class JobQueue:
+    """File bornée de jobs traitée par des workers asyncio in-process."""
+
+    def __init__(self, backend: Optional[JobBackend] = None,
+                 workers: int = config.JOB_WORKERS,
+                 max_queued: int = config.MAX_QUEUED_JOBS,
+                 ttl: float = config.JOB_TTL,
+                 max_jobs: int = config.MAX_JOBS,
+                 max_attempts: int = config.JOB_MAX_ATTEMPTS):
+        self.backend = backend or InMemoryJobBackend()
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.max_attempts = max(1, max_attempts)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._changed: Optional[asyncio.Event] = None
+        self._loop = None
+        JOBS_QUEUED.set_function(lambda: self._queue.qsize() if self._queue is not None else 0)
+
+    def _ensure_started(self) -> None:
+        # Les workers sont liés à la boucle courante : démarrage à la première utilisation
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._changed = asyncio.Event()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._purge_periodically()))
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """Arrête les workers, après avoir laissé `timeout` secondes aux jobs en file ou en cours."""
+        if timeout > 0 and self._queue is not None and self._loop is asyncio.get_running_loop():
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Arrêt : délai dépassé, %d job(s) encore en file abandonné(s)", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def _notify(self) -> None:
+        # Réveille les abonnés SSE puis prépare l'événement suivant
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+    def _delete(self, job: Job) -> None:
+        self.backend.delete(job.id)
+        if job.result is not None:
+            job.result.discard()
+
+    def _purge_expired(self) -> None:
+        for job in self.backend.list_finished_before(time.time() - self.ttl):
+            self._delete(job)
+
+    def _make_room(self) -> None:
+        """Supprime les jobs terminés les plus anciens pour rester sous `max_jobs`."""
+        excess = self.backend.count() - self.max_jobs + 1
+        if excess <= 0:
+            return
+        for job in self.backend.list_finished_before(float("inf"))[:excess]:
+            self._delete(job)
+
+    async def _purge_periodically(self) -> None:
+        # Sans nouveau job soumis, les résultats expirés doivent partir quand même
+        while True:
+            await asyncio.sleep(min(self.ttl, 60.0))
+            self._purge_expired()
+
+    async def submit(self, data: DatRequest, format: str, template: Optional[str] = None) -> Job:
+        """Met un job en file et le retourne immédiatement."""
+        self._ensure_started()
+        self._purge_expired()
+        self._make_room()
+        if self._queue.full() or self.backend.count() >= self.max_jobs:
+            raise ServiceSaturated("File de jobs pleine, réessayez plus tard.")
+
+        job = Job(id=uuid.uuid4().hex, format=format, request=data, template=template, created_at=time.time())
+        self.backend.save(job)
+        self._queue.put_nowait(job.id)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.backend.get(job_id)
+
+    async def watch(self, job_id: str, heartbeat: float = 15.0) -> AsyncIterator[Job]:
+        """
+        Produit l'état du job à chaque changement (et au moins toutes les
+        `heartbeat` secondes) jusqu'à ce qu'il soit terminé.
+        """
+        while True:
+            changed = self._changed
+            job = self.backend.get(job_id)
+            if job is None:
+                return
+            yield job
+            if job.is_finished or changed is None:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                pass
+
+    def _set_stage(self, job: Job, stage: str) -> None:
+        job.stage = stage
+        self.backend.save(job)
+        self._notify()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self.backend.get(job_id)
+                if job is not None:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        self._set_stage(job, "rendering")
+        stage = "failed"
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = await generate_document(
+                    job.request, job.format, on_stage=lambda stage: self._set_stage(job, stage),
+                    template=job.template)
+                # Le résultat reste téléchargeable jusqu'à l'expiration du job : sur disque, pas en mémoire,
+                # dans un fichier propre au job (le cache de rendu peut évincer le sien)
+                job.result = await asyncio.to_thread(spool_document, result)
+                job.status = "done"
+                stage = "done"
+                break
+            except ServiceSaturated as e:
+                # Les requêtes synchrones occupent les pools : on réessaie plus tard
+                if attempt == self.max_attempts:
+                    logger.warning("Job %s abandonné : service saturé", job.id, extra={"fields": {"job_id": job.id}})
+                    job.status = "failed"
+                    job.error = f"Service saturé : job abandonné après {attempt} tentatives."
+                    break
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.exception("Échec du job %s", job.id, extra={"fields": {"job_id": job.id}})
+                job.status = "failed"
+                job.error = str(e)
+                break
+        job.finished_at = time.time()
+        # Les données du formulaire ne sont plus utiles une fois le job terminé
+        job.request = None
+        self._set_stage(job, stage)
+
+
+job_queue = JobQueue()
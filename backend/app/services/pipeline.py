@@ -0,0 +1,370 @@
+"""
+Chaîne de génération complète : rendu DOCX puis conversion éventuelle.
+Partagée par l'endpoint synchrone /generate et par la file de jobs.
+
+En mode "memory" (par défaut), le document est rendu dans un buffer et
+renvoyé en streaming ; il n'est déversé dans un fichier temporaire que s'il
+dépasse `SPOOL_THRESHOLD`. En mode "disk", il est écrit directement dans le
+stockage des artefacts (ou, s'il est désactivé, dans un fichier temporaire
+du spool).
+
+Si le stockage des artefacts est activé (DARWIN_ARTIFACT_DIR), le document
+final y est enregistré sous un identifiant stable : tant qu'il y est, le même
+formulaire est resservi sans rendu ni conversion, et il reste téléchargeable
+via GET /api/v1/documents/{id}. Un document en mémoire y est écrit en
+arrière-plan, sans retarder la réponse.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, Optional, Set, Tuple
+
+from app.core import config
+from app.core.metrics import CONVERSION_FAILURES, OUTPUT_BYTES, timed
+from app.schemas.dat import DatRequest
+from app.services.artifacts import Artifact
+from app.services.concurrency import convert_executor, render_executor
+from app.services.converter import (
+    OUTPUT_FORMATS,
+    ConversionError,
+    ConversionTimeout,
+    ConverterUnavailable,
+    LibreOfficeConverter,
+)
+from app.services.doc_generator import DOCX_MEDIA_TYPE, DocumentService
+from app.services.profiling import is_active as profiling_active, profiled
+from app.services.render_cache import form_digest, render_cache, request_key
+from app.services.shared_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# On instancie le service qui va manipuler le document Word
+document_service = DocumentService()
+# Pool de LibreOffice headless pour les conversions PDF / ODT
+converter = LibreOfficeConverter()
+
+
+class DocumentGenerationError(Exception):
+    """Le fichier Word n'a pas pu être produit."""
+
+
+@dataclass
+class GeneratedDocument:
+    """
+    Document produit, prêt à être renvoyé au client.
+    Le contenu est soit en mémoire (`content`), soit dans un fichier (`path`).
+    """
+    filename: str
+    media_type: str
+    content: Optional[bytes] = None
+    path: Optional[str] = None
+    # Fichier temporaire (spool) à supprimer quand le document n'est plus utilisé
+    temporary: bool = False
+    # Identifiant et ETag dans le stockage des artefacts (GET /documents/{id})
+    id: Optional[str] = None
+    etag: Optional[str] = None
+
+    @classmethod
+    def from_artifact(cls, artifact: Artifact) -> "GeneratedDocument":
+        return cls(filename=artifact.filename, media_type=artifact.media_type, path=artifact.path,
+                   id=artifact.id, etag=artifact.etag)
+
+    @property
+    def size(self) -> int:
+        if self.content is not None:
+            return len(self.content)
+        return os.path.getsize(self.path)
+
+    def exists(self) -> bool:
+        return self.content is not None or (self.path is not None and os.path.exists(self.path))
+
+    def read(self) -> bytes:
+        if self.content is not None:
+            return self.content
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def discard(self) -> None:
+        if self.temporary and self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def _document_size(document: GeneratedDocument) -> int:
+    return document.size
+
+
+def _document_exists(document: GeneratedDocument) -> bool:
+    return document.exists()
+
+
+def media_type_for(format: str) -> str:
+    if format == "docx":
+        return DOCX_MEDIA_TYPE
+    return OUTPUT_FORMATS[format][1]
+
+
+def spool(content: bytes, filename: str, media_type: str,
+          threshold: int = config.SPOOL_THRESHOLD) -> GeneratedDocument:
+    """Garde le document en mémoire, ou le déverse sur disque s'il dépasse `threshold` octets."""
+    if len(content) <= threshold:
+        return GeneratedDocument(filename=filename, media_type=media_type, content=content)
+    os.makedirs(config.SPOOL_DIR, exist_ok=True)
+    extension = os.path.splitext(filename)[1]
+    fd, path = tempfile.mkstemp(prefix="DAT_", suffix=extension, dir=config.SPOOL_DIR)
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return GeneratedDocument(filename=filename, media_type=media_type, path=path, temporary=True)
+
+
+def spool_document(document: GeneratedDocument) -> GeneratedDocument:
+    """
+    Copie sur disque (fichier temporaire) propre à l'appelant (appel bloquant).
+    Un document déjà sur disque peut appartenir au cache de rendu ou au stockage
+    des artefacts, qui le suppriment à l'éviction : il est lié (ou copié) sous
+    un nouveau nom plutôt que partagé.
+    """
+    if document.content is not None:
+        spooled = spool(document.content, document.filename, document.media_type, threshold=-1)
+        return replace(spooled, id=document.id, etag=document.etag)
+    os.makedirs(config.SPOOL_DIR, exist_ok=True)
+    extension = os.path.splitext(document.filename)[1]
+    path = os.path.join(config.SPOOL_DIR, f"DAT_{uuid.uuid4().hex}{extension}")
+    try:
+        # Lien physique : pas de copie, le fichier survit à la suppression de l'original
+        os.link(document.path, path)
+    except OSError:
+        shutil.copyfile(document.path, path)
+    return replace(document, path=path, temporary=True)
+
+
+def _render_in_memory(data: DatRequest, template: Optional[str] = None,
+                      key: Optional[str] = None) -> GeneratedDocument:
+    buffer = document_service.render_dat(data, template)
+    return spool(buffer.getvalue(), f"DAT_{data.titre_projet}.docx", DOCX_MEDIA_TYPE)
+
+
+def _render_to_disk(data: DatRequest, template: Optional[str] = None,
+                    key: Optional[str] = None) -> GeneratedDocument:
+    artifact = document_service.store_dat(data, template, key=key)
+    # Stockage désactivé : fichier temporaire du spool, supprimé après l'envoi
+    # (ou à l'éviction du cache de rendu) plutôt qu'un fichier de generated_docs jamais nettoyé
+    docx_path = (artifact.path if artifact is not None
+                 else document_service.generate_dat(data, template, output_dir=config.SPOOL_DIR))
+
+    # Vérification de sécurité
+    if not docx_path or not os.path.exists(docx_path):
+        logger.error("Le fichier %s n'a pas été trouvé sur le serveur.", docx_path)
+        raise DocumentGenerationError("Erreur lors de la création du fichier Word.")
+    if artifact is not None:
+        return GeneratedDocument.from_artifact(artifact)
+    return GeneratedDocument(filename=f"DAT_{data.titre_projet}.docx", media_type=DOCX_MEDIA_TYPE,
+                             path=docx_path, temporary=True)
+
+
+def store_document(document: GeneratedDocument, key: Optional[str] = None) -> GeneratedDocument:
+    """
+    Enregistre le document dans le stockage des artefacts, sous l'identifiant
+    de la clé de cache `key` (appel bloquant). Le document renvoyé porte
+    l'identifiant et l'ETag ; inchangé si le stockage est désactivé.
+    """
+    store = document_service.artifacts
+    if document.id is not None and (key is None or document.id == store.id_for(key)):
+        return document
+    artifact = store.put(document.filename, document.media_type, content=document.content,
+                         source_path=document.path if document.content is None else None, key=key)
+    if artifact is None:
+        return document
+    if document.content is not None:
+        return replace(document, id=artifact.id, etag=artifact.etag)
+    # Document sur disque : servi désormais depuis le stockage ; un fichier de spool
+    # que le cache ne garde pas n'a plus d'utilité
+    if document.temporary and not render_cache.holds(document):
+        document.discard()
+    return GeneratedDocument.from_artifact(artifact)
+
+
+# Écritures en arrière-plan dans le stockage des artefacts (références gardées jusqu'à leur fin)
+_pending_stores: Set[asyncio.Task] = set()
+
+
+def _store_done(task: asyncio.Task) -> None:
+    _pending_stores.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Enregistrement du document impossible", exc_info=task.exception())
+
+
+async def _store(document: GeneratedDocument, key: Optional[str] = None) -> GeneratedDocument:
+    """
+    Enregistre le document final. Un document en mémoire reçoit tout de suite
+    son identifiant et est écrit en arrière-plan : la réponse n'attend pas le
+    disque. Un document sur disque est copié avant la réponse (son fichier de
+    spool peut être supprimé juste après l'envoi).
+    """
+    store = document_service.artifacts
+    if not store.enabled:
+        return document
+    if document.content is None:
+        return await asyncio.to_thread(store_document, document, key)
+    if document.id is not None:
+        return document
+    artifact_id = store.id_for(key) if key else uuid.uuid4().hex
+    task = asyncio.create_task(asyncio.to_thread(
+        store.put, document.filename, document.media_type, content=document.content, artifact_id=artifact_id))
+    _pending_stores.add(task)
+    task.add_done_callback(_store_done)
+    return replace(document, id=artifact_id)
+
+
+async def flush_stores() -> None:
+    """Attend la fin des écritures en arrière-plan (arrêt du worker)."""
+    if _pending_stores:
+        await asyncio.gather(*list(_pending_stores), return_exceptions=True)
+
+
+def find_document(key: str) -> Optional[GeneratedDocument]:
+    """Document final déjà produit pour cette clé et encore stocké, ou None."""
+    store = document_service.artifacts
+    if not store.enabled:
+        return None
+    artifact = store.get(store.id_for(key))
+    return GeneratedDocument.from_artifact(artifact) if artifact is not None else None
+
+
+def _convert(src_path: str, format: str, output_dir: str) -> str:
+    """Appel LibreOffice mesuré (étape "convert") et échecs comptés par cause."""
+    try:
+        with timed("convert", format=format):
+            return converter.convert(src_path, format, output_dir)
+    except ConversionTimeout:
+        CONVERSION_FAILURES.inc(format=format, reason="timeout")
+        raise
+    except ConverterUnavailable:
+        CONVERSION_FAILURES.inc(format=format, reason="unavailable")
+        raise
+    except ConversionError:
+        CONVERSION_FAILURES.inc(format=format, reason="error")
+        raise
+
+
+def convert_document(docx: GeneratedDocument, format: str, filename: str) -> GeneratedDocument:
+    """Convertit un DOCX en PDF / ODT (appel bloquant, à exécuter dans un thread)."""
+    # LibreOffice travaille sur des fichiers : répertoire de travail (et de sortie) propre
+    # à la conversion, supprimé ensuite, pour que deux conversions ne se croisent pas
+    with tempfile.TemporaryDirectory(prefix="darwin_convert_") as workdir:
+        if docx.path is not None and not docx.temporary:
+            # Mode disque : le DOCX est déjà dans le stockage des artefacts
+            src_path = docx.path
+        else:
+            src_path = os.path.join(workdir, f"DAT_{uuid.uuid4().hex}.docx")
+            with open(src_path, "wb") as f:
+                f.write(docx.read())
+        output_path = _convert(src_path, format, workdir)
+        with open(output_path, "rb") as f:
+            content = f.read()
+    return spool(content, filename, media_type_for(format))
+
+
+async def _shared(key: str, factory: Callable[[], Awaitable[GeneratedDocument]],
+                  filename: str, media_type: str) -> GeneratedDocument:
+    """Passe par le cache disque partagé entre workers, s'il est activé."""
+    if not shared_cache.enabled:
+        return await factory()
+
+    produced = None
+
+    async def produce() -> bytes:
+        nonlocal produced
+        produced = await factory()
+        return produced.read()
+
+    content = await shared_cache.get_or_create(key, produce)
+    if produced is not None:
+        return produced
+    return spool(content, filename, media_type)
+
+
+def _lookup(data: DatRequest, template: Optional[str],
+            format: str) -> Tuple[str, str, Optional[GeneratedDocument]]:
+    """
+    Empreinte du formulaire, hash du template et document déjà stocké pour ce
+    format (appel bloquant). Une seule sérialisation du formulaire sert aux clés
+    du DOCX et de la conversion ; la clé porte sur le contenu du template, sans
+    le compiler : une nouvelle version invalide les rendus.
+    """
+    form = form_digest(data)
+    template_hash = document_service.templates.version(template)
+    return form, template_hash, find_document(request_key(form, template_hash, format))
+
+
+async def generate_document(
+    data: DatRequest,
+    format: str = "docx",
+    on_stage: Optional[Callable[[str], None]] = None,
+    template: Optional[str] = None,
+) -> GeneratedDocument:
+    """
+    Génère le DAT au format demandé, avec le template `template` (par défaut : DEFAULT_TEMPLATE).
+    `on_stage` est appelé avec "rendering" puis "converting" pour suivre l'avancement.
+    """
+    render = _render_to_disk if config.OUTPUT_MODE == "disk" else _render_in_memory
+
+    async def render_docx(key: Optional[str] = None) -> GeneratedDocument:
+        # 1. On génère d'abord le DOCX (dans un thread : le rendu est bloquant)
+        if on_stage:
+            on_stage("rendering")
+        document = await render_executor.run(profiled, render, data, template, key)
+        OUTPUT_BYTES.observe(document.size, format="docx")
+        return document
+
+    async def convert(docx: GeneratedDocument) -> GeneratedDocument:
+        # 3. Conversion vers PDF ou ODT avec LibreOffice (pool d'instances chaudes)
+        if on_stage:
+            on_stage("converting")
+        document = await convert_executor.run(profiled, convert_document, docx, format,
+                                              f"DAT_{data.titre_projet}.{format}")
+        OUTPUT_BYTES.observe(document.size, format=format)
+        return document
+
+    # Une requête profilée refait tout le travail : le cache fausserait la mesure
+    if profiling_active():
+        docx = await render_docx()
+        if format == "docx":
+            return await _store(docx)
+        try:
+            return await _store(await convert(docx))
+        finally:
+            docx.discard()
+
+    # Hash du template, empreinte d'un formulaire de plusieurs Mo et accès disque :
+    # hors de la boucle d'événements
+    form, template_hash, stored = await asyncio.to_thread(_lookup, data, template, format)
+    key = request_key(form, template_hash, format)
+    # Document final encore dans le stockage des artefacts : ni rendu ni conversion
+    if stored is not None:
+        return stored
+
+    # Un DOCX déjà rendu pour ce formulaire est réutilisé, y compris pour une conversion
+    # (cache mémoire du worker, puis cache disque commun aux workers)
+    docx_key = request_key(form, template_hash, "docx")
+    docx = await render_cache.get_or_create(
+        docx_key,
+        lambda: _shared(docx_key, lambda: render_docx(docx_key), f"DAT_{data.titre_projet}.docx",
+                        DOCX_MEDIA_TYPE),
+        _document_size, _document_exists)
+
+    # 2. Si format = docx, retourner directement
+    if format == "docx":
+        return await _store(docx, key)
+
+    converted = await render_cache.get_or_create(
+        key,
+        lambda: _shared(key, lambda: convert(docx), f"DAT_{data.titre_projet}.{format}", media_type_for(format)),
+        _document_size, _document_exists)
+    return await _store(converted, key)
@@ -0,0 +1,81 @@
+"""
+Aperçu HTML du DAT, pour le volet de prévisualisation du frontend.
+
+Générer un .docx (voire un PDF via LibreOffice) à chaque frappe serait bien
+trop lent : l'aperçu reprend les sections de create_template.py dans un
+template HTML rendu par Jinja2, sans docxtpl ni LibreOffice. Les templates
+compilés sont gardés par l'Environment Jinja2 (rechargés si leur fichier
+change, avec PREVIEW_AUTO_RELOAD).
+
+Chaque aperçu a un ETag calculé avant le rendu, à partir de la version du
+template et des octets du corps de la requête : un formulaire inchangé
+(If-None-Match) est servi en 304 sans être ni validé ni rendu. Le frontend
+sérialise toujours le formulaire de la même façon ; deux corps équivalents
+mais écrits différemment ont simplement des ETags distincts.
+"""
+import hashlib
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.core import config
+from app.services.doc_generator import TEMPLATE_DIR, build_render_context
+
+if TYPE_CHECKING:
+    from jinja2 import Environment, Template
+
+PREVIEW_DIR = TEMPLATE_DIR / "preview"
+PREVIEW_TEMPLATE = "dat.html"
+
+
+class PreviewRenderer:
+    """Rend un modèle validé (DatRequest) en HTML."""
+
+    def __init__(self, directory: Path = PREVIEW_DIR, template_name: str = PREVIEW_TEMPLATE,
+                 auto_reload: bool = config.PREVIEW_AUTO_RELOAD):
+        self.directory = directory
+        self.template_name = template_name
+        self.auto_reload = auto_reload
+        # Environment créé au premier aperçu : Jinja2 n'est pas importé avec l'application
+        self._environment: Optional["Environment"] = None
+        # (template compilé, hash de son source) : recalculé quand Jinja2 recharge le fichier
+        self._current: Optional[Tuple["Template", str]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def environment(self) -> "Environment":
+        if self._environment is None:
+            from jinja2 import Environment, FileSystemLoader, select_autoescape
+            with self._lock:
+                if self._environment is None:
+                    self._environment = Environment(
+                        loader=FileSystemLoader(str(self.directory)),
+                        # Les valeurs viennent du formulaire : tout est échappé
+                        autoescape=select_autoescape(["html"]),
+                        auto_reload=self.auto_reload,
+                    )
+        return self._environment
+
+    def _template(self) -> Tuple["Template", str]:
+        template = self.environment.get_template(self.template_name)
+        with self._lock:
+            if self._current is None or self._current[0] is not template:
+                source, _, _ = self.environment.loader.get_source(self.environment, self.template_name)
+                self._current = (template, hashlib.sha256(source.encode("utf-8")).hexdigest())
+            return self._current
+
+    def etag(self, body: bytes) -> str:
+        """ETag (fort, entre guillemets) de l'aperçu du corps JSON `body`, sans le valider ni le rendre."""
+        _, version = self._template()
+        digest = hashlib.sha256(version.encode("ascii"))
+        digest.update(body)
+        return f'"{digest.hexdigest()[:32]}"'
+
+    def render(self, data: BaseModel) -> str:
+        template, _ = self._template()
+        return template.render(build_render_context(data))
+
+
+preview_renderer = PreviewRenderer()
@@ -0,0 +1,233 @@
+"""
+Profilage à la demande d'une génération (diagnostic des formulaires lents).
+
+Une requête /generate peut être exécutée sous profileur, soit explicitement
+(paramètre `profile` ou en-tête `X-Darwin-Profile`, réservé aux
+administrateurs), soit par échantillonnage (1 requête sur N). Deux modes :
+
+- "cprofile"  : statistiques cProfile (fichier .prof, lisible avec pstats,
+                snakeviz...) ;
+- "collapsed" : échantillonnage de la pile à intervalle fixe, au format
+                « piles repliées » (fichier .collapsed, pour flamegraph.pl
+                ou speedscope).
+
+Le rendu et la conversion tournent dans les pools de threads : la session
+active est portée par un ContextVar (copié dans les threads par
+BoundedExecutor) et seules les fonctions passées par `profiled` sont
+mesurées. Les résultats sont écrits dans PROFILE_DIR (hors de la boucle
+d'événements) ; les plus anciens sont supprimés au-delà de PROFILE_MAX_FILES.
+
+À partir de Python 3.12, cProfile repose sur sys.monitoring : un seul
+profileur peut être actif dans le processus, et il voit tous les threads.
+Une étape lancée pendant qu'un autre profil cProfile est en cours n'est donc
+pas mesurée (le nombre d'étapes ignorées est journalisé), et un profil peut
+contenir le travail d'autres requêtes exécutées en même temps.
+"""
+import asyncio
+import cProfile
+import glob
+import hmac
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Optional, TypeVar
+
+from app.core import config
+
+T = TypeVar("T")
+
+PROFILE_MODES = {"cprofile": ".prof", "collapsed": ".collapsed"}
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+logger = logging.getLogger(__name__)
+
+current_profile: ContextVar[Optional["ProfileSession"]] = ContextVar("current_profile", default=None)
+
+# Python 3.12+ : un seul cProfile actif à la fois dans le processus (sys.monitoring)
+SINGLE_CPROFILE = sys.version_info >= (3, 12)
+_cprofile_lock = threading.Lock()
+
+
+class ProfilingForbidden(Exception):
+    """Profilage demandé sans jeton d'administration valide."""
+
+
+class _StackSampler(threading.Thread):
+    """Relève la pile d'un thread toutes les `interval` secondes."""
+
+    def __init__(self, thread_id: int, interval: float, stacks: Counter):
+        super().__init__(name="darwin-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = stacks
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+class ProfileSession:
+    """Profil d'une requête, accumulé sur les étapes exécutées via `run`."""
+
+    def __init__(self, mode: str, reason: str):
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.reason = reason
+        self.started = time.time()
+        self._profile = cProfile.Profile() if mode == "cprofile" else None
+        self._stacks: Counter = Counter()
+        # Étapes non mesurées : un autre profil cProfile était actif (Python 3.12+)
+        self.skipped = 0
+        # Les étapes d'une requête sont séquentielles, mais un profileur ne sert qu'un thread à la fois
+        self._lock = threading.Lock()
+
+    @property
+    def filename(self) -> str:
+        return self.id + PROFILE_MODES[self.mode]
+
+    def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        with self._lock:
+            if self._profile is not None:
+                if SINGLE_CPROFILE and not _cprofile_lock.acquire(blocking=False):
+                    self.skipped += 1
+                    return fn(*args, **kwargs)
+                try:
+                    self._profile.enable()
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        self._profile.disable()
+                finally:
+                    if SINGLE_CPROFILE:
+                        _cprofile_lock.release()
+
+            sampler = _StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL, self._stacks)
+            sampler.start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                sampler.stop()
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.filename)
+        if self._profile is not None:
+            self._profile.dump_stats(path)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        return path
+
+
+def profiled(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Appelle `fn`, sous le profileur de la requête courante s'il y en a un."""
+    session = current_profile.get()
+    if session is None:
+        return fn(*args, **kwargs)
+    return session.run(fn, *args, **kwargs)
+
+
+def is_active() -> bool:
+    return current_profile.get() is not None
+
+
+class Profiler:
+    """Décide quelles requêtes profiler et range les résultats."""
+
+    def __init__(self, directory: str = config.PROFILE_DIR, token: str = config.PROFILE_TOKEN,
+                 sample_rate: int = config.PROFILE_SAMPLE_RATE, max_files: int = config.PROFILE_MAX_FILES):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self._counter = itertools.count(1)
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        return bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+
+    def session_for(self, mode: Optional[str], token: Optional[str]) -> Optional[ProfileSession]:
+        """
+        Session de profilage pour une requête : explicite (`mode` + jeton admin)
+        ou tirée par l'échantillonnage. None si la requête n'est pas profilée.
+        """
+        if mode:
+            if mode not in PROFILE_MODES:
+                raise ValueError(f"Mode de profilage inconnu : {mode} (parmi {', '.join(PROFILE_MODES)})")
+            if not self.is_admin(token):
+                raise ProfilingForbidden("Profilage réservé aux administrateurs.")
+            return ProfileSession(mode, "requested")
+        if self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0:
+            return ProfileSession(config.PROFILE_SAMPLE_MODE, "sampled")
+        return None
+
+    @asynccontextmanager
+    async def activate(self, session: Optional[ProfileSession]) -> AsyncIterator[None]:
+        """
+        Active `session` pour le bloc, puis enregistre le profil (même si la
+        génération échoue), dans un thread : l'écriture ne bloque pas la boucle.
+        """
+        if session is None:
+            yield
+            return
+        token = current_profile.set(session)
+        try:
+            yield
+        finally:
+            current_profile.reset(token)
+            try:
+                path = await asyncio.to_thread(self.save, session)
+                logger.info("Profil enregistré : %s", path, extra={"fields": {
+                    "profile_id": session.id, "profile_mode": session.mode, "profile_reason": session.reason,
+                    "profile_skipped": session.skipped, "duration_s": round(time.time() - session.started, 6)}})
+            except OSError:
+                logger.exception("Impossible d'enregistrer le profil %s", session.id)
+
+    def save(self, session: ProfileSession) -> str:
+        path = session.save(self.directory)
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        files = [f for ext in PROFILE_MODES.values() for f in glob.glob(os.path.join(self.directory, "*" + ext))]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def find(self, profile_id: str) -> Optional[str]:
+        """Chemin du profil `profile_id`, ou None."""
+        if not PROFILE_ID.match(profile_id):
+            return None
+        for ext in PROFILE_MODES.values():
+            path = os.path.join(self.directory, profile_id + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+
+profiler = Profiler()
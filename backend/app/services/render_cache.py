@@ -0,0 +1,147 @@
+"""
+Cache des documents générés, adressé par contenu.
+
+La clé combine le hash canonique du DatRequest validé, le hash du template et
+le format de sortie : un formulaire ré-envoyé à l'identique (double clic,
+nouvel essai, autre format) ne refait ni le rendu docxtpl ni la conversion
+LibreOffice. Les requêtes identiques simultanées attendent un seul rendu en
+cours (single-flight) au lieu d'en lancer plusieurs.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core import config
+from app.core.metrics import RENDER_CACHE_BYTES, RENDER_CACHE_EVENTS
+from app.schemas.dat import DatRequest
+
+
+def form_digest(data: DatRequest) -> str:
+    """Empreinte canonique du formulaire, à calculer une fois par requête."""
+    # model_dump_json suit l'ordre des champs du modèle : sortie déterministe
+    return hashlib.sha256(data.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def request_key(form: str, template_hash: str, format: str) -> str:
+    """Clé canonique : même formulaire (form_digest) + même template + même format => même clé."""
+    digest = hashlib.sha256(form.encode("ascii"))
+    digest.update(b"\0" + template_hash.encode("ascii"))
+    digest.update(b"\0" + format.encode("ascii"))
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    size: int
+    expires_at: float
+
+
+class RenderCache:
+    """Cache LRU borné en taille totale et en durée de vie, avec déduplication des rendus en vol."""
+
+    def __init__(self, max_bytes: int = config.RENDER_CACHE_MAX_BYTES,
+                 ttl: float = config.RENDER_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        RENDER_CACHE_EVENTS.set_function(lambda: self.hits, result="hit")
+        RENDER_CACHE_EVENTS.set_function(lambda: self.misses, result="miss")
+        RENDER_CACHE_BYTES.set_function(lambda: self.total_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str, is_valid: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic() or (is_valid and not is_valid(entry.value)):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def put(self, key: str, value: Any, size: int) -> bool:
+        """Ajoute une entrée ; retourne False si elle est trop grosse pour le cache."""
+        if not self.enabled or size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(value, size, time.monotonic() + self.ttl)
+            self.total_bytes += size
+            # Éviction LRU jusqu'à repasser sous le quota
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return True
+
+    def holds(self, value: Any) -> bool:
+        """Vrai si cette valeur est actuellement gardée par le cache."""
+        with self._lock:
+            return any(entry.value is value for entry in self._entries.values())
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        # Les valeurs adossées à un fichier temporaire le suppriment elles-mêmes
+        discard = getattr(entry.value, "discard", None)
+        if discard is not None:
+            discard()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    async def get_or_create(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        size_of: Callable[[Any], int],
+        is_valid: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        Retourne la valeur en cache, ou la produit via `factory`.
+        Un seul `factory` tourne par clé ; les appels concurrents attendent son résultat.
+        """
+        if not self.enabled:
+            return await factory()
+
+        value = self.get(key, is_valid)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+
+            async def produce():
+                try:
+                    result = await factory()
+                    self.put(key, result, size_of(result))
+                    return result
+                finally:
+                    self._in_flight.pop(key, None)
+
+            # Tâche indépendante : l'annulation d'un client n'interrompt pas les autres
+            task = asyncio.ensure_future(produce())
+            self._in_flight[key] = task
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+
+render_cache = RenderCache()
@@ -0,0 +1,331 @@
+"""
+Rendu incrémental du corps du document, section par section.
+
+Quand un utilisateur modifie une seule partie du formulaire (par exemple
+« Supervision ») puis régénère, tout le corps repasse par Jinja2, fix_tables,
+le re-parsing lxml et la sérialisation, y compris les sections d'inventaire
+qui n'ont pas changé.
+
+À la compilation, le source du corps est découpé avant chaque titre de
+niveau 1 à 3 situé directement dans <w:body> et hors de tout bloc Jinja2.
+Chaque section devient un template indépendant, avec la liste des variables
+qu'elle lit. Au rendu, le XML final d'une section (après Jinja2, lignes
+rapides, resolve_listing et fix_tables) est gardé en cache, indexé par le hash
+du template et les valeurs de ses variables : seules les sections dont les
+données ont changé sont rendues à nouveau. Le corps est réassemblé par
+concaténation et écrit tel quel dans document.xml, sans re-parser le document
+entier.
+
+Le découpage n'est retenu que si le rendu par sections d'un contexte vide
+produit exactement le même document.xml que le rendu complet ; un contexte
+dont les valeurs contiennent du balisage (`<b>`, `</`, `<!--`...) ou des objets
+docxtpl (RichText, images...) passe par le rendu complet.
+"""
+import hashlib
+import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from docx.opc.oxml import serialize_part_xml
+from jinja2 import Template, meta, nodes
+from lxml import etree
+from pydantic import BaseModel
+
+from app.core import config
+from app.core.metrics import SECTION_CACHE_EVENTS
+from app.services.fast_tables import (
+    BLOCK_TAG,
+    MARKUP_START,
+    FastBody,
+    _element_stacks,
+    compile_fast_body,
+    render_blocks,
+)
+
+BODY_OPEN = re.compile(r"<w:body\b[^>]*>")
+BODY_CLOSE = "</w:body>"
+# Titres qui ouvrent une nouvelle section (styles Word anglais ou français)
+HEADING_STYLE = re.compile(r'<w:pStyle w:val="(?:Heading|Titre)[1-3]"/>')
+PARAGRAPH_START = re.compile(r"\n<w:p[ >]")
+DOCPR_ID = re.compile(r'(<wp:docPr\b[^>]*?\sid=")\d+(")')
+
+_JINJA_OPENERS = {"for", "if", "macro", "call", "filter", "block", "with", "raw", "autoescape", "trans"}
+# Instructions dont l'effet déborde de la section où elles apparaissent
+_CROSS_SECTION_NODES = (nodes.Assign, nodes.AssignBlock, nodes.Macro, nodes.Import,
+                        nodes.FromImport, nodes.Extends, nodes.Block)
+
+
+@dataclass(frozen=True)
+class Section:
+    index: int
+    template: Template
+    # Source de la section, pour situer les erreurs Jinja2 (docx_context)
+    source: str
+    # Variables du contexte lues par la section : elles forment la clé de cache
+    variables: Tuple[str, ...]
+    fast_body: Optional[FastBody] = None
+    fast_template: Optional[Template] = None
+
+
+@dataclass(frozen=True)
+class SectionPlan:
+    """Découpage du corps d'un template et enveloppe sérialisée de document.xml."""
+    sha256: str
+    sections: Tuple[Section, ...]
+    # Racine de document.xml sans corps : chaque section y est rattachée avant
+    # sérialisation, pour que lxml retire les mêmes déclarations d'espaces de
+    # noms redondantes que dans le rendu complet (map_tree)
+    shell: Any
+    # document.xml avant et après le contenu du corps (balises <w:body> comprises)
+    prefix: bytes
+    suffix: bytes
+
+
+class SectionCache:
+    """
+    XML rendu des sections, LRU borné en mémoire totale (octets). La taille d'une
+    entrée est celle de la chaîne en mémoire (sys.getsizeof) : jusqu'à 4 octets
+    par caractère selon les caractères présents (accents typographiques...).
+    """
+
+    def __init__(self, max_bytes: int = config.SECTION_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            xml = self._entries.get(key)
+            if xml is not None:
+                self._entries.move_to_end(key)
+            return xml
+
+    def put(self, key: str, xml: str) -> None:
+        size = sys.getsizeof(xml)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= sys.getsizeof(previous)
+            self._entries[key] = xml
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= sys.getsizeof(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+section_cache = SectionCache()
+
+
+def _jinja_depths(source: str, positions: Sequence[int]) -> List[int]:
+    """Profondeur d'imbrication des blocs Jinja2 à chaque position (triées)."""
+    depths = []
+    depth = 0
+    tags = iter(BLOCK_TAG.finditer(source))
+    tag = next(tags, None)
+    for position in positions:
+        while tag is not None and tag.start() < position:
+            keyword = tag.group(1)
+            if keyword in _JINJA_OPENERS:
+                depth += 1
+            elif keyword.startswith("end"):
+                depth -= 1
+            tag = next(tags, None)
+        depths.append(depth)
+    return depths
+
+
+def _split_points(source: str) -> List[int]:
+    """Débuts (`\\n<w:p`) des paragraphes de titre où le corps peut être coupé."""
+    candidates = []
+    for m in HEADING_STYLE.finditer(source):
+        start = source.rfind("\n<w:p", 0, m.start())
+        if start <= 0 or not PARAGRAPH_START.match(source, start) or "</w:p>" in source[start:m.start()]:
+            continue
+        # Pas de contrôle d'espaces Jinja2 (`-%}`) qui mangerait le saut de ligne de la coupure
+        if source[:start].rstrip().endswith(("-%}", "-}}", "-#}")):
+            continue
+        candidates.append(start)
+    candidates = sorted(set(candidates))
+    stacks = _element_stacks(source, candidates)
+    depths = _jinja_depths(source, candidates)
+    return [position for position, depth in zip(candidates, depths)
+            if depth == 0 and len(stacks[position]) == 1 and stacks[position][0][0] == "w:body"]
+
+
+def compile_sections(source: str, sha256: str, document_root, fix_tables: Callable[[str], Any],
+                     fast_tables: bool = config.FAST_TABLES) -> Optional[SectionPlan]:
+    """
+    Découpe le source du corps (après patch_xml) en sections indépendantes.
+    `document_root` est l'élément racine de document.xml du template, dont on
+    garde la sérialisation autour du corps. None si le template ne s'y prête pas.
+    """
+    root_match = BODY_OPEN.match(source)
+    if root_match is None or not source.endswith(BODY_CLOSE):
+        return None
+    root_tag = root_match.group(0)
+
+    environment = Template("").environment
+    try:
+        if any(True for _ in environment.parse(source).find_all(_CROSS_SECTION_NODES)):
+            return None
+    except Exception:
+        return None
+
+    points = _split_points(source)
+    if not points:
+        return None
+    bounds = [0] + points + [len(source)]
+
+    sections = []
+    for index, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        text = source[start:end]
+        if index > 0:
+            text = root_tag + text
+        if end < len(source):
+            text += BODY_CLOSE
+        try:
+            variables = tuple(sorted(meta.find_undeclared_variables(environment.parse(text))))
+        except Exception:
+            return None
+        fast_body = compile_fast_body(text, fix_tables) if fast_tables else None
+        sections.append(Section(
+            index=index,
+            template=Template(text),
+            source=text,
+            variables=variables,
+            fast_body=fast_body,
+            fast_template=Template(fast_body.source) if fast_body else None,
+        ))
+
+    shell = deepcopy(document_root)
+    body = shell.find("{%s}body" % shell.nsmap["w"])
+    if body is None or body.getnext() is not None:
+        return None
+    shell.remove(body)
+
+    # Enveloppe de document.xml : un corps réduit à un repère, comme après map_tree
+    root = deepcopy(shell)
+    root.append(etree.fromstring(root_tag + "<!--darwin:body-->" + BODY_CLOSE))
+    prefix, _, suffix = serialize_part_xml(root).partition(b"<!--darwin:body-->")
+    if not suffix:
+        return None
+
+    return SectionPlan(sha256=sha256, sections=tuple(sections), shell=shell,
+                       prefix=prefix, suffix=suffix)
+
+
+def _model_fields(value: Any) -> dict:
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    # RichText, InlineImage, Subdoc... : effets de bord sur le document, pas de cache
+    raise TypeError(type(value).__name__)
+
+
+def _digest(value: Any) -> Optional[str]:
+    """Hash d'une valeur du contexte ; None si elle ne permet pas le rendu par section."""
+    try:
+        dumped = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+                            default=_model_fields)
+    except (TypeError, ValueError):
+        return None
+    # Balisage brut : le parseur "recover" de fix_tables pourrait déborder de la section
+    if "<" in dumped and MARKUP_START.search(dumped):
+        return None
+    return hashlib.sha256(dumped.encode("utf-8")).hexdigest()
+
+
+def _fingerprint(section: Section, context: dict, digests: Dict[str, Optional[str]]) -> Optional[str]:
+    """
+    Hash des valeurs lues par la section ; None si elles ne permettent pas le
+    rendu par section. `digests` garde le hash de chaque variable pour la
+    durée de la requête : une liste lue par plusieurs sections n'est
+    sérialisée qu'une fois.
+    """
+    parts = []
+    for name in section.variables:
+        if name not in digests:
+            digests[name] = _digest(context.get(name))
+        digest = digests[name]
+        if digest is None:
+            return None
+        parts.append(f"{name}={digest}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _render_section(plan: SectionPlan, section: Section, doc, context: dict) -> Optional[str]:
+    """XML des éléments de la section, tel qu'il apparaîtra dans le corps du document."""
+    xml = None
+    if section.fast_body is not None:
+        blocks = render_blocks(section.fast_body, context, section.template.environment.getattr,
+                               doc.resolve_listing)
+        if blocks is not None:
+            doc._row_blocks = blocks
+            xml = doc._render_compiled(section.fast_template, doc.docx._part, context, section.fast_body.source)
+    if xml is None:
+        xml = doc._render_compiled(section.template, doc.docx._part, context, section.source)
+    tree = doc.fix_tables(xml)
+    deepcopy(plan.shell).append(tree)
+    return _inner(etree.tostring(tree, encoding="unicode"))
+
+
+def _inner(serialized: str) -> Optional[str]:
+    """Contenu d'un <w:body> sérialisé, sans ses balises ouvrante et fermante."""
+    m = BODY_OPEN.match(serialized)
+    if m is None:
+        return None
+    if m.group(0).endswith("/>"):
+        return "" if m.end() == len(serialized) else None
+    if not serialized.endswith(BODY_CLOSE):
+        return None
+    return serialized[m.end():-len(BODY_CLOSE)]
+
+
+def render_body(plan: SectionPlan, doc, context: dict, cache: Optional[SectionCache] = section_cache) -> Optional[str]:
+    """
+    Contenu sérialisé du corps (entre plan.prefix et plan.suffix) pour ce
+    contexte, en réutilisant les sections inchangées. `doc` est le CachedDocxTemplate en cours de rendu. None si le
+    contexte impose le rendu complet.
+    """
+    keys = []
+    digests: Dict[str, Optional[str]] = {}
+    for section in plan.sections:
+        fingerprint = _fingerprint(section, context, digests)
+        if fingerprint is None:
+            return None
+        keys.append(f"{plan.sha256}:{section.index}:{fingerprint}")
+
+    fragments = []
+    for section, key in zip(plan.sections, keys):
+        xml = cache.get(key) if cache is not None else None
+        if xml is not None:
+            SECTION_CACHE_EVENTS.inc(result="hit")
+        else:
+            SECTION_CACHE_EVENTS.inc(result="miss")
+            xml = _render_section(plan, section, doc, context)
+            if xml is None:
+                return None
+            if cache is not None:
+                cache.put(key, xml)
+        fragments.append(xml)
+
+    body = "".join(fragments)
+    if "docPr" in body:
+        # Équivalent de DocxTemplate.fix_docpr_ids : numérotation dans l'ordre du document
+        def renumber(m):
+            doc.docx_ids_index += 1
+            return f"{m.group(1)}{doc.docx_ids_index}{m.group(2)}"
+        body = DOCPR_ID.sub(renumber, body)
+    return body
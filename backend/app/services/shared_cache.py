@@ -0,0 +1,204 @@
+"""
+Cache disque des documents générés, partagé entre les workers du serveur.
+
+Le cache de rendu (render_cache) vit dans la mémoire d'un processus : avec
+plusieurs workers, le même formulaire serait rendu une fois par worker. Ce
+second niveau garde les octets des documents dans un répertoire commun, avec
+les mêmes clés. Un verrou fichier (filelock) par clé fait qu'un seul worker
+rend un document donné ; les autres attendent puis lisent le résultat, sans
+bloquer les workers qui rendent d'autres formulaires.
+
+Les écritures sont atomiques (fichier temporaire puis os.replace) ; les
+entrées expirent après `ttl` et les moins récemment lues sont supprimées
+au-delà de `max_bytes`. Le répertoire n'est parcouru qu'au nettoyage : toutes
+les `prune_interval` secondes, ou dès que la taille estimée par le worker
+dépasse le quota. filelock supprime le fichier de verrou à sa
+libération ; ceux laissés par un worker tué sont supprimés avec les entrées
+expirées.
+"""
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from filelock import FileLock, Timeout
+
+from app.core import config
+from app.core.metrics import SHARED_CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+class SharedDiskCache:
+    """Documents (octets) indexés par clé dans un répertoire commun à plusieurs processus."""
+
+    def __init__(self, directory: str = config.SHARED_CACHE_DIR,
+                 max_bytes: int = config.SHARED_CACHE_MAX_BYTES,
+                 ttl: float = config.SHARED_CACHE_TTL,
+                 lock_timeout: float = config.SHARED_CACHE_LOCK_TIMEOUT,
+                 prune_interval: float = config.SHARED_CACHE_PRUNE_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.prune_interval = prune_interval
+        # Estimation locale, recalculée à chaque nettoyage (d'autres workers écrivent aussi)
+        self.total_bytes = 0
+        self._next_prune = 0.0
+        self._prune_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, "data", key[:2], key)
+
+    def _lock_path(self, key: str) -> str:
+        return os.path.join(self.directory, "locks", key[:2], key + ".lock")
+
+    def _lock(self, key: str) -> FileLock:
+        path = self._lock_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Acquis et relâché depuis des threads différents (asyncio.to_thread)
+        return FileLock(path, timeout=self.lock_timeout, thread_local=False)
+
+    def read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime + self.ttl < time.time():
+                return None
+            with open(path, "rb") as f:
+                content = f.read()
+            # La date d'accès sert à l'éviction LRU ; la date de modification à l'expiration
+            os.utime(path, (time.time(), stat.st_mtime))
+            return content
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.total_bytes += len(content)
+        if self.total_bytes > self.max_bytes or time.monotonic() >= self._next_prune:
+            self.prune()
+
+    def prune(self) -> None:
+        """Supprime les entrées expirées, puis les moins récemment lues au-delà du quota."""
+        with self._prune_lock:
+            self._next_prune = time.monotonic() + self.prune_interval
+            self.total_bytes = self._prune(time.time())
+
+    def _prune(self, now: float) -> int:
+        """Parcourt le répertoire ; retourne la taille des entrées gardées."""
+        entries = []
+        for root, _, files in os.walk(os.path.join(self.directory, "data")):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.startswith(".tmp_"):
+                    # Écriture interrompue (worker tué) : on laisse une marge aux écritures en cours
+                    if stat.st_mtime + self.lock_timeout < now:
+                        self._remove(path)
+                elif stat.st_mtime + self.ttl < now:
+                    self._remove(path)
+                else:
+                    entries.append((stat.st_atime, stat.st_size, path))
+
+        self._prune_locks(now)
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return total
+        entries.sort()
+        for _, size, path in entries:
+            self._remove(path)
+            total -= size
+            if total <= self.max_bytes:
+                break
+        return total
+
+    def _prune_locks(self, now: float) -> None:
+        """Supprime les fichiers de verrou créés depuis plus de `ttl` et libres (worker tué)."""
+        for root, _, files in os.walk(os.path.join(self.directory, "locks")):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_mtime + self.ttl >= now:
+                        continue
+                except FileNotFoundError:
+                    continue
+                # Verrou tenu par un autre worker : on le laisse
+                lock = FileLock(path, timeout=0, thread_local=False)
+                try:
+                    lock.acquire()
+                except Timeout:
+                    continue
+                try:
+                    self._remove(path)
+                finally:
+                    lock.release()
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def get_or_create(self, key: str, produce: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Retourne le document en cache, ou le produit via `produce` et l'enregistre.
+        Un seul worker produit une clé donnée ; au-delà de `lock_timeout`, on produit sans attendre.
+        """
+        content = await asyncio.to_thread(self.read, key)
+        if content is not None:
+            SHARED_CACHE_EVENTS.inc(result="hit")
+            return content
+
+        lock = self._lock(key)
+        try:
+            await asyncio.to_thread(lock.acquire)
+        except Timeout:
+            logger.warning("Verrou du cache partagé non obtenu pour %s", key)
+            SHARED_CACHE_EVENTS.inc(result="miss")
+            return await produce()
+
+        try:
+            # Un autre worker a pu produire le document pendant l'attente
+            content = await asyncio.to_thread(self.read, key)
+            if content is not None:
+                SHARED_CACHE_EVENTS.inc(result="hit")
+                return content
+            SHARED_CACHE_EVENTS.inc(result="miss")
+            content = await produce()
+            try:
+                await asyncio.to_thread(self.write, key, content)
+            except OSError:
+                logger.exception("Écriture dans le cache partagé impossible")
+            return content
+        finally:
+            lock.release()
+
+
+shared_cache = SharedDiskCache()
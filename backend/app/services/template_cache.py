@@ -0,0 +1,256 @@
+"""
+Cache des templates DAT.
+
+Le chargement d'un DocxTemplate est coûteux : décompression du .docx, parsing
+XML, nettoyage des balises (patch_xml) puis compilation Jinja2 du corps et de
+chaque en-tête / pied de page. On fait ce travail une seule fois, on garde en
+mémoire les octets du fichier et les templates Jinja2 déjà compilés, et chaque
+rendu reçoit une copie fraîche construite depuis la mémoire.
+
+Plusieurs variantes peuvent coexister (par service, version « synthèse »...) :
+le TemplateRegistry découvre les .docx du répertoire des templates, les
+désigne par leur nom de fichier sans extension, garde compilés les plus
+récemment utilisés et recompile à chaud les fichiers modifiés.
+
+La compilation elle-même (compiled_template) est importée à la première
+utilisation : importer l'application ne charge ni docxtpl ni python-docx, et
+le répertoire n'est parcouru qu'au premier accès au registre.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.core import config
+
+if TYPE_CHECKING:
+    from app.services.compiled_template import CachedDocxTemplate, CompiledTemplate
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateCache:
+    """
+    Garde un template compilé en mémoire et le recharge automatiquement
+    quand le fichier change (mtime / taille, puis confirmation par hash).
+    """
+
+    def __init__(self, template_path: Path):
+        self.template_path = Path(template_path)
+        self._compiled: Optional["CompiledTemplate"] = None
+        # (mtime_ns, taille, sha256) du fichier, pour version() sans compilation
+        self._version: Optional[Tuple[int, int, str]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_compiled(self) -> bool:
+        """Vrai si une version compilée est en mémoire."""
+        return self._compiled is not None
+
+    def version(self) -> str:
+        """
+        Hash du contenu du fichier, sans compiler le template : celui de la
+        version compilée si le fichier n'a pas changé, sinon relu et mis en cache.
+        """
+        try:
+            stat = os.stat(self.template_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Le template est introuvable : {self.template_path}")
+        compiled = self._compiled
+        if compiled and compiled.mtime_ns == stat.st_mtime_ns and compiled.size == stat.st_size:
+            return compiled.sha256
+        cached = self._version
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        sha256 = hashlib.sha256(self.template_path.read_bytes()).hexdigest()
+        self._version = (stat.st_mtime_ns, stat.st_size, sha256)
+        return sha256
+
+    def get_compiled(self) -> "CompiledTemplate":
+        """Retourne le template compilé, rechargé si le fichier a changé."""
+        try:
+            stat = os.stat(self.template_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Le template est introuvable : {self.template_path}")
+
+        compiled = self._compiled
+        if compiled and compiled.mtime_ns == stat.st_mtime_ns and compiled.size == stat.st_size:
+            return compiled
+
+        with self._lock:
+            compiled = self._compiled
+            if compiled and compiled.mtime_ns == stat.st_mtime_ns and compiled.size == stat.st_size:
+                return compiled
+
+            blob = self.template_path.read_bytes()
+            sha256 = hashlib.sha256(blob).hexdigest()
+            if compiled and compiled.sha256 == sha256:
+                # Fichier touché mais contenu identique : pas de recompilation
+                compiled.mtime_ns = stat.st_mtime_ns
+                return compiled
+
+            # Import paresseux : docxtpl, python-docx, lxml et Jinja2 ne sont chargés qu'ici
+            from app.services.compiled_template import compile_template
+            self._compiled = compile_template(self.template_path, blob, stat.st_mtime_ns)
+            return self._compiled
+
+    def get_template(self) -> "CachedDocxTemplate":
+        """Retourne une copie fraîche, prête pour un unique rendu."""
+        compiled = self.get_compiled()
+        from app.services.compiled_template import CachedDocxTemplate
+        return CachedDocxTemplate(compiled)
+
+    def invalidate(self) -> None:
+        """Force le rechargement au prochain appel."""
+        with self._lock:
+            self._compiled = None
+
+
+class UnknownTemplate(LookupError):
+    """Aucun template de ce nom dans le répertoire des templates."""
+
+
+class TemplateRegistry:
+    """
+    Templates disponibles (un TemplateCache par fichier .docx) et LRU des
+    versions compilées : au-delà de `max_compiled`, le moins récemment utilisé
+    est libéré et sera recompilé à sa prochaine utilisation.
+    """
+
+    def __init__(self, directory: Path, default: str = config.DEFAULT_TEMPLATE,
+                 max_compiled: int = config.TEMPLATE_CACHE_SIZE):
+        self.directory = Path(directory)
+        self.default = default
+        self.max_compiled = max(1, max_compiled)
+        self._caches: Dict[str, TemplateCache] = {}
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+        # Répertoire parcouru au premier accès, pas à la construction (import du module)
+        self._discovered = False
+
+    def discover(self) -> List[str]:
+        """Relit le répertoire : ajoute les nouveaux templates, oublie ceux qui ont disparu."""
+        paths = {path.stem: path for path in self.directory.glob("*.docx")
+                 # Fichiers de verrou de Word (~$nom.docx)
+                 if not path.name.startswith("~$")}
+        with self._lock:
+            for name in list(self._caches):
+                if name not in paths:
+                    del self._caches[name]
+                    self._recent.pop(name, None)
+            for name, path in paths.items():
+                if name not in self._caches:
+                    self._caches[name] = TemplateCache(path)
+            self._discovered = True
+            return sorted(self._caches)
+
+    def names(self) -> List[str]:
+        if not self._discovered:
+            return self.discover()
+        with self._lock:
+            return sorted(self._caches)
+
+    def resolve(self, name: Optional[str] = None) -> str:
+        """Nom effectif du template (celui par défaut si `name` est vide) ; UnknownTemplate s'il n'existe pas."""
+        name = name or self.default
+        with self._lock:
+            if name in self._caches:
+                return name
+        # Fichier ajouté depuis le dernier passage (sans surveillance active)
+        if name in self.discover():
+            return name
+        raise UnknownTemplate(f"Template inconnu : {name}")
+
+    def _cache(self, name: Optional[str]) -> Tuple[str, TemplateCache]:
+        name = self.resolve(name)
+        with self._lock:
+            cache = self._caches.get(name)
+        if cache is None:
+            raise UnknownTemplate(f"Template inconnu : {name}")
+        return name, cache
+
+    def get_compiled(self, name: Optional[str] = None) -> "CompiledTemplate":
+        """Template compilé `name`, rechargé si le fichier a changé."""
+        name, cache = self._cache(name)
+        compiled = cache.get_compiled()
+        self._touch(name)
+        return compiled
+
+    def version(self, name: Optional[str] = None) -> str:
+        """Hash du contenu du template `name`, sans le compiler (appel bloquant : E/S disque)."""
+        _, cache = self._cache(name)
+        return cache.version()
+
+    def get_template(self, name: Optional[str] = None) -> "CachedDocxTemplate":
+        """Copie fraîche du template `name`, prête pour un unique rendu."""
+        compiled = self.get_compiled(name)
+        from app.services.compiled_template import CachedDocxTemplate
+        return CachedDocxTemplate(compiled)
+
+    def _touch(self, name: str) -> None:
+        with self._lock:
+            self._recent[name] = None
+            self._recent.move_to_end(name)
+            while len(self._recent) > self.max_compiled:
+                evicted, _ = self._recent.popitem(last=False)
+                cache = self._caches.get(evicted)
+                if cache is not None:
+                    cache.invalidate()
+
+    def describe(self) -> List[dict]:
+        """Nom, version (hash du contenu) et état de chaque template (appel bloquant : E/S disque)."""
+        entries = []
+        for name in self.names():
+            _, cache = self._cache(name)
+            compiled = cache.is_compiled
+            try:
+                sha256 = cache.version()
+            except FileNotFoundError:
+                continue
+            entries.append({"name": name, "version": sha256[:12], "sha256": sha256,
+                            "default": name == self.default, "compiled": compiled})
+        return entries
+
+    def refresh(self) -> None:
+        """Redécouvre les fichiers et recompile tout de suite les templates en mémoire qui ont changé."""
+        self.discover()
+        with self._lock:
+            loaded = list(self._recent)
+        for name in loaded:
+            try:
+                self.get_compiled(name)
+            except (UnknownTemplate, FileNotFoundError):
+                with self._lock:
+                    self._recent.pop(name, None)
+            except Exception:
+                # Fichier en cours d'écriture ou invalide : nouvel essai à la prochaine utilisation
+                logger.exception("Recompilation du template %s impossible", name)
+
+    def start_watching(self) -> None:
+        """Surveille le répertoire (watchfiles) et recharge les templates modifiés sans redémarrage."""
+        if self._watcher is not None:
+            return
+        from watchfiles import watch
+
+        def run():
+            for changes in watch(self.directory, stop_event=self._stop_watching,
+                                 watch_filter=lambda _, path: path.endswith(".docx"),
+                                 recursive=False):
+                logger.info("Templates modifiés, rechargement", extra={"fields": {
+                    "files": sorted(os.path.basename(path) for _, path in changes)}})
+                self.refresh()
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=run, name="darwin-templates", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            self._stop_watching.set()
+            watcher.join()
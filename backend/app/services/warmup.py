@@ -0,0 +1,139 @@
+"""
+Préchauffage d'un worker avant qu'il ne reçoive du trafic, et état de
+disponibilité servi par /readyz.
+
+Importer l'application ne charge ni docxtpl, ni python-docx, ni lxml, ni
+Jinja2, et ne lit aucun template : le worker démarre vite. Sans préchauffage,
+c'est la première requête qui paierait ces imports, la compilation du template
+et le démarrage des instances LibreOffice. Le préchauffage le fait
+explicitement, étape par étape :
+
+1. « template »  : compilation du template par défaut ;
+2. « render »    : rendu à vide, dont le résultat doit être un .docx lisible ;
+3. « preview »   : aperçu HTML à vide ;
+4. « converter » : démarrage du pool LibreOffice et vérification du
+   convertisseur (bloquante avec DARWIN_READY_REQUIRES_CONVERTER).
+
+/readyz ne répond 200 qu'une fois ces étapes réussies ; pendant le
+préchauffage ou après un échec, il répond 503 avec l'état de chaque étape.
+"""
+import io
+import logging
+import threading
+import time
+import zipfile
+from typing import Any, Callable, Dict, Optional
+
+from app.core import config
+from app.schemas.dat import DatRequest
+from app.services.pipeline import converter, document_service
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupError(RuntimeError):
+    """Une étape obligatoire du préchauffage a échoué : le worker n'est pas prêt."""
+
+
+class Readiness:
+    """État du préchauffage du worker : starting, warming, ready ou failed."""
+
+    def __init__(self):
+        self.state = "starting"
+        self.checks: Dict[str, Dict[str, Any]] = {}
+        self.error: Optional[str] = None
+        self.duration_s: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def set_state(self, state: str, error: Optional[str] = None, duration_s: Optional[float] = None) -> None:
+        with self._lock:
+            self.state = state
+            self.error = error
+            self.duration_s = duration_s
+
+    def record(self, name: str, **fields) -> None:
+        with self._lock:
+            self.checks[name] = fields
+
+    def skip(self) -> None:
+        """Préchauffage désactivé (DARWIN_WARMUP=0) : le worker est prêt dès son démarrage."""
+        self.set_state("ready")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "status": self.state,
+                "checks": {name: dict(fields) for name, fields in self.checks.items()},
+                "error": self.error,
+                "duration_s": self.duration_s,
+            }
+
+
+readiness = Readiness()
+
+
+def _step(name: str, fn: Callable[[], Optional[dict]]) -> None:
+    """Exécute une étape et note sa durée (et ses détails) dans `readiness`."""
+    start = time.perf_counter()
+    try:
+        details = fn() or {}
+    except Exception as e:
+        readiness.record(name, ok=False, error=str(e), duration_s=round(time.perf_counter() - start, 6))
+        raise
+    readiness.record(name, ok=True, duration_s=round(time.perf_counter() - start, 6), **details)
+
+
+def _load_template() -> dict:
+    compiled = document_service.templates.get_compiled()
+    return {"template_sha256": compiled.sha256, "incremental": compiled.sections is not None}
+
+
+def _render_empty() -> dict:
+    buffer = document_service.render_dat(DatRequest(titre_projet="Préchauffage"))
+    try:
+        with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as archive:
+            if "word/document.xml" not in archive.namelist() or archive.testzip() is not None:
+                raise WarmupError("Le rendu à vide n'a pas produit de document Word valide.")
+    except zipfile.BadZipFile:
+        raise WarmupError("Le rendu à vide n'a pas produit de document Word valide.")
+    return {"bytes": len(buffer.getvalue())}
+
+
+def _render_preview() -> dict:
+    # Import paresseux : Jinja2 et le template HTML ne sont chargés qu'ici
+    from app.services.preview import preview_renderer
+    return {"bytes": len(preview_renderer.render(DatRequest(titre_projet="Préchauffage")))}
+
+
+def _start_converter() -> dict:
+    converter.start()
+    available = converter.is_available()
+    if not available:
+        if config.READY_REQUIRES_CONVERTER:
+            raise WarmupError("LibreOffice indisponible : conversions PDF / ODT impossibles.")
+        logger.warning("LibreOffice indisponible : les conversions PDF / ODT échoueront")
+    return {"available": available, "pool": converter.pool_enabled}
+
+
+def warmup() -> None:
+    """
+    Préchauffe le worker (bloquant) et met `readiness` à jour.
+    Lève l'exception de la première étape en échec.
+    """
+    start = time.perf_counter()
+    readiness.set_state("warming")
+    try:
+        _step("template", _load_template)
+        _step("render", _render_empty)
+        _step("preview", _render_preview)
+        _step("converter", _start_converter)
+    except Exception as e:
+        readiness.set_state("failed", error=str(e), duration_s=round(time.perf_counter() - start, 6))
+        logger.error("Préchauffage en échec : worker non prêt", extra={"fields": readiness.snapshot()})
+        raise
+    readiness.set_state("ready", duration_s=round(time.perf_counter() - start, 6))
+    logger.info("Worker préchauffé", extra={"fields": readiness.snapshot()})
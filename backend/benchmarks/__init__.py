@@ -0,0 +1,4 @@
+"""
+Benchmarks de la chaîne de génération DARWIN.
+À lancer depuis backend/ : python -m benchmarks.<module>
+"""
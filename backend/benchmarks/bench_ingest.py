@@ -0,0 +1,108 @@
+"""
+Benchmark de l'ingestion d'un formulaire : des octets du corps HTTP au
+contexte de rendu docxtpl, sans le rendu lui-même.
+
+Trois chaînes sont comparées sur les scénarios de payloads.py :
+
+- "historique" : json.loads -> DatRequest -> model_dump() -> clean_data_for_word
+  (quatre matérialisations complètes du formulaire) ;
+- "dict"       : json.loads -> DatRequest -> build_render_context
+  (paramètre `data: DatRequest` de FastAPI) ;
+- "octets"     : DatRequest.model_validate_json -> build_render_context
+  (app/api/v1/body.py).
+
+Pour chacune : meilleur temps sur `--repeat` essais et pic d'allocation
+mesuré par tracemalloc (essai séparé, tracemalloc ralentissant l'exécution).
+
+    python -m benchmarks.bench_ingest [--scenarios petit,moyen,grand] [--repeat 5]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from app.schemas.dat import DatRequest
+from app.services.doc_generator import build_render_context, clean_data_for_word
+from benchmarks.payloads import SCENARIOS, make_scenario
+
+DEFAULT = ["petit", "moyen", "grand"]
+
+
+def ingest_legacy(body: bytes) -> dict:
+    return clean_data_for_word(DatRequest.model_validate(json.loads(body)).model_dump())
+
+
+def ingest_dict(body: bytes) -> dict:
+    return build_render_context(DatRequest.model_validate(json.loads(body)))
+
+
+def ingest_bytes(body: bytes) -> dict:
+    return build_render_context(DatRequest.model_validate_json(body))
+
+
+PATHS: Dict[str, Callable[[bytes], dict]] = {
+    "historique": ingest_legacy,
+    "dict": ingest_dict,
+    "octets": ingest_bytes,
+}
+
+
+def best_time(fn: Callable[[bytes], dict], body: bytes, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(body)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_allocation(fn: Callable[[bytes], dict], body: bytes) -> int:
+    """Pic d'allocation (octets) pendant l'appel, résultat compris."""
+    tracemalloc.start()
+    try:
+        result = fn(body)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def run(scenarios: List[str], repeat: int = 5) -> list:
+    results = []
+    for name in scenarios:
+        body = json.dumps(make_scenario(name), ensure_ascii=False).encode("utf-8")
+        assert DatRequest.model_validate_json(body) == DatRequest.model_validate(json.loads(body))
+        for path, fn in PATHS.items():
+            results.append({
+                "scenario": name,
+                "body_bytes": len(body),
+                "path": path,
+                "best_s": best_time(fn, body, repeat),
+                "peak_bytes": peak_allocation(fn, body),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(DEFAULT), help=f"Parmi : {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"Scénarios inconnus : {', '.join(unknown)}")
+
+    print(f"{'scénario':>9} | {'corps (Mo)':>10} | {'chaîne':>10} | {'temps (ms)':>10} | {'pic (Mo)':>9} | {'gain':>6}")
+    reference = {}
+    for r in run(scenarios, args.repeat):
+        base = reference.setdefault(r["scenario"], r)
+        print(f"{r['scenario']:>9} | {r['body_bytes'] / 1e6:>10.2f} | {r['path']:>10} | "
+              f"{r['best_s'] * 1000:>10.1f} | {r['peak_bytes'] / 1e6:>9.2f} | x{base['best_s'] / r['best_s']:>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""
+Test de charge de POST /api/v1/generate : combien de générations simultanées
+un hôte tient-il avant que la latence (p99) ne décroche ?
+
+Générateur asynchrone en boucle fermée : à chaque niveau de concurrence N,
+N clients enchaînent les requêtes (la suivante dès la réponse précédente
+reçue) pendant --duration secondes, ou jusqu'à --requests requêtes. Chaque
+requête tire un format (--formats) et un scénario de formulaire de
+payloads.py selon les poids de --mix. Le formulaire est rendu unique
+(description_doc) pour que ni les caches de rendu ni le stockage des
+documents ne répondent à la place du rendu, sauf avec --cache.
+
+Deux cibles :
+
+- in-process (défaut) : l'application ASGI dans ce processus (lifespan
+  compris). Le générateur partage la boucle et le GIL avec l'API : les
+  chiffres servent à comparer deux versions, pas à dimensionner un hôte ;
+- --url http://127.0.0.1:8000 : un serveur déjà lancé ; --serve démarre
+  python -m app.server sur un port local (--workers processus) et attend
+  que /readyz réponde 200.
+
+Par niveau : débit (réponses 200 par seconde), latences p50 / p95 / p99 des
+réponses 200 (globales et par format), taux d'erreurs (HTTP autre que 200,
+erreur réseau) et de timeouts (--timeout). Le rapport JSON est écrit dans
+benchmarks/results/ ; le résumé indique le plus haut niveau qui tient
+l'objectif (--p99-slo, --max-error-rate). Avec --baseline, un débit en baisse
+ou un p99 en hausse au-delà de --tolerance fait échouer le script (code 1).
+
+    python -m benchmarks.bench_load [--concurrency 1,2,4,8] [--duration 15 | --requests 40]
+                                    [--formats docx,pdf,odt] [--mix minimal:3,petit:2,moyen:1]
+                                    [--url http://127.0.0.1:8000 | --serve [--workers 4]]
+                                    [--timeout 120] [--p99-slo 5] [--cache]
+                                    [--output fichier.json] [--baseline fichier.json] [--tolerance 0.25]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.payloads import SCENARIOS, make_scenario
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+FORMATS = ("docx", "pdf", "odt")
+DEFAULT_MIX = "minimal:3,petit:2,moyen:1"
+# Remplacé dans le corps déjà encodé par un numéro de requête : formulaire unique sans réencoder le JSON
+RUN_MARKER = "__DARWIN_LOAD_RUN__"
+PERCENTILES = (50, 95, 99)
+MAX_ERROR_DETAILS = 5
+# Les écarts de latence sous ce seuil (en secondes) relèvent du bruit de mesure
+MIN_SIGNIFICANT_S = 0.005
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """"minimal:3,moyen:1" -> {"minimal": 3, "moyen": 1} (poids 1 si absent)."""
+    mix = {}
+    for part in (p.strip() for p in text.split(",")):
+        if not part:
+            continue
+        name, _, weight = part.partition(":")
+        if name not in SCENARIOS:
+            raise ValueError(f"Scénario inconnu : {name} (parmi : {', '.join(SCENARIOS)})")
+        if weight and (not weight.isdigit() or int(weight) == 0):
+            raise ValueError(f"Poids invalide pour {name} : {weight}")
+        mix[name] = int(weight or 1)
+    if not mix:
+        raise ValueError("Mélange de scénarios vide")
+    return mix
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Percentile `q` (0-100) de `values` triées, par interpolation linéaire."""
+    if not values:
+        return None
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+class Workload:
+    """Requêtes à envoyer : corps encodés une fois par scénario, tirés selon les poids du mélange."""
+
+    def __init__(self, mix: Dict[str, int], formats: List[str], unique: bool = True, seed: int = 0):
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.formats = formats
+        self.unique = unique
+        self.rng = random.Random(seed)
+        self.counter = itertools.count()
+        self.bodies: Dict[str, bytes] = {}
+        for name in self.names:
+            payload = make_scenario(name)
+            payload["description_doc"] = RUN_MARKER
+            self.bodies[name] = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    def next(self) -> Tuple[str, str, bytes]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        format = self.rng.choice(self.formats)
+        run = f"Charge {next(self.counter)}" if self.unique else "Charge"
+        return name, format, self.bodies[name].replace(RUN_MARKER.encode("ascii"), run.encode("ascii"), 1)
+
+
+async def send_one(client: httpx.AsyncClient, workload: Workload, timeout: float) -> dict:
+    """Une génération complète (corps de la réponse lu jusqu'au bout)."""
+    scenario, format, body = workload.next()
+    sample = {"scenario": scenario, "format": format, "status": None, "outcome": "ok", "bytes": 0}
+    start = time.perf_counter()
+    try:
+        # wait_for plutôt que le timeout de httpx : il s'applique aussi au transport ASGI
+        response = await asyncio.wait_for(
+            client.post("/api/v1/generate", params={"format": format}, content=body,
+                        headers={"Content-Type": "application/json"}),
+            timeout)
+        sample["status"] = response.status_code
+        sample["bytes"] = len(response.content)
+        if response.status_code != 200:
+            sample["outcome"] = "error"
+            sample["detail"] = response.text[:300]
+    except asyncio.TimeoutError:
+        sample["outcome"] = "timeout"
+    except httpx.HTTPError as e:
+        sample["outcome"] = "error"
+        sample["detail"] = f"{type(e).__name__}: {e}"
+    sample["latency_s"] = time.perf_counter() - start
+    return sample
+
+
+def _latencies(samples: List[dict]) -> Dict[str, Optional[float]]:
+    values = sorted(s["latency_s"] for s in samples if s["outcome"] == "ok")
+    stats: Dict[str, Optional[float]] = {f"p{q}_s": percentile(values, q) for q in PERCENTILES}
+    stats["mean_s"] = statistics.fmean(values) if values else None
+    stats["max_s"] = values[-1] if values else None
+    return stats
+
+
+def _by(samples: List[dict], field: str) -> Dict[str, dict]:
+    groups: Dict[str, List[dict]] = {}
+    for s in samples:
+        groups.setdefault(s[field], []).append(s)
+    return {name: {"requests": len(group), **_latencies(group)} for name, group in sorted(groups.items())}
+
+
+def summarize(concurrency: int, samples: List[dict], elapsed: float) -> dict:
+    count = len(samples)
+    ok = sum(1 for s in samples if s["outcome"] == "ok")
+    errors = sum(1 for s in samples if s["outcome"] == "error")
+    timeouts = sum(1 for s in samples if s["outcome"] == "timeout")
+    statuses: Dict[str, int] = {}
+    for s in samples:
+        key = str(s["status"]) if s["status"] is not None else s["outcome"]
+        statuses[key] = statuses.get(key, 0) + 1
+    # Quelques messages d'erreur distincts, pour le diagnostic
+    details: Dict[str, str] = {}
+    for s in samples:
+        if "detail" in s and len(details) < MAX_ERROR_DETAILS:
+            details.setdefault(s["detail"], f"{s['format']} / {s['scenario']} : HTTP {s['status']}")
+    return {
+        "concurrency": concurrency,
+        "requests": count,
+        "ok": ok,
+        "elapsed_s": elapsed,
+        "throughput_rps": ok / elapsed if elapsed else 0.0,
+        "error_rate": errors / count if count else 0.0,
+        "timeout_rate": timeouts / count if count else 0.0,
+        "statuses": statuses,
+        "errors": [f"{where} : {detail}" for detail, where in details.items()],
+        "latency": _latencies(samples),
+        "by_format": _by(samples, "format"),
+        "by_scenario": _by(samples, "scenario"),
+    }
+
+
+async def run_level(client: httpx.AsyncClient, workload: Workload, concurrency: int,
+                    duration: float, requests: int, warmup: int, timeout: float) -> dict:
+    """Un niveau de concurrence : `concurrency` clients en boucle fermée."""
+    # Requêtes de mise en route (connexions, threads), non comptées
+    for _ in range(warmup):
+        await send_one(client, workload, timeout)
+
+    samples: List[dict] = []
+    budget = itertools.count() if requests else None
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def user() -> None:
+        while True:
+            if budget is not None:
+                if next(budget) >= requests:
+                    return
+            elif time.perf_counter() >= deadline:
+                return
+            samples.append(await send_one(client, workload, timeout))
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return summarize(concurrency, samples, time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def in_process_client() -> AsyncIterator[httpx.AsyncClient]:
+    """Client branché directement sur l'application ASGI, lifespan (préchauffage, pools) compris."""
+    # Une ligne de journal par requête fausserait la mesure : seuls les avertissements
+    os.environ.setdefault("DARWIN_LOG_LEVEL", "WARNING")
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://darwin", timeout=None) as client:
+            yield client
+
+
+@asynccontextmanager
+async def http_client(url: str, max_connections: int) -> AsyncIterator[httpx.AsyncClient]:
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+        yield client
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, process: Optional[subprocess.Popen] = None, timeout: float = 300.0) -> None:
+    """Attend que /readyz réponde 200 (préchauffage terminé)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté au démarrage (code {process.returncode})")
+        try:
+            if httpx.get(f"{url}/readyz", timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url}/readyz ne répond pas 200 après {timeout:.0f} s")
+
+
+@contextmanager
+def serve(workers: int, log_path: str, startup_timeout: float) -> Iterator[str]:
+    """python -m app.server sur un port libre de 127.0.0.1, arrêté en sortie."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "DARWIN_HOST": "127.0.0.1", "DARWIN_PORT": str(port), "DARWIN_LOG_LEVEL": "WARNING"}
+    if workers:
+        env["DARWIN_WORKERS"] = str(workers)
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen([sys.executable, "-m", "app.server"], cwd=BACKEND_DIR, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+        try:
+            wait_ready(url, process, startup_timeout)
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+async def run(target: str, url: Optional[str], levels: List[int], workload: Workload, duration: float,
+              requests: int, warmup: int, timeout: float) -> List[dict]:
+    max_connections = max(levels)
+    client_factory = in_process_client() if url is None else http_client(url, max_connections)
+    results = []
+    async with client_factory as client:
+        for concurrency in levels:
+            print(f"{target} : {concurrency} client(s)...", file=sys.stderr, flush=True)
+            results.append(await run_level(client, workload, concurrency, duration, requests, warmup, timeout))
+    return results
+
+
+def sustained_level(levels: List[dict], p99_slo: Optional[float], max_error_rate: float) -> Optional[dict]:
+    """
+    Plus haut niveau qui tient l'objectif (p99 sous `p99_slo`, erreurs et timeouts
+    sous `max_error_rate`) ; sans objectif de latence, le niveau au meilleur débit.
+    """
+    healthy = [level for level in levels
+               if level["ok"] and level["error_rate"] + level["timeout_rate"] <= max_error_rate]
+    if p99_slo is not None:
+        healthy = [level for level in healthy if level["latency"]["p99_s"] <= p99_slo]
+        return max(healthy, key=lambda level: level["concurrency"], default=None)
+    return max(healthy, key=lambda level: level["throughput_rps"], default=None)
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Niveaux dont le débit baisse, ou le p99 augmente, au-delà de la tolérance."""
+    reference = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for level in current["levels"]:
+        before = reference.get(level["concurrency"])
+        if before is None or not before["ok"]:
+            continue
+        if level["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{level['concurrency']} client(s) : débit {before['throughput_rps']:.2f} -> "
+                               f"{level['throughput_rps']:.2f} req/s")
+        now_p99, before_p99 = level["latency"]["p99_s"], before["latency"]["p99_s"]
+        if now_p99 is None:
+            regressions.append(f"{level['concurrency']} client(s) : aucune réponse 200")
+        elif now_p99 - before_p99 > MIN_SIGNIFICANT_S and now_p99 > before_p99 * (1 + tolerance):
+            regressions.append(f"{level['concurrency']} client(s) : p99 {before_p99 * 1000:.0f} -> "
+                               f"{now_p99 * 1000:.0f} ms (x{now_p99 / before_p99:.2f})")
+    return regressions
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+def print_summary(report: dict) -> None:
+    print(f"Cible : {report['target']} | formats : {','.join(report['formats'])} | "
+          f"mélange : {report['mix']} | cache : {'oui' if report['cache'] else 'non'}")
+    print(f"\n{'clients':>7} | {'requêtes':>8} | {'débit (req/s)':>13} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | "
+          f"{'p99 (ms)':>8} | {'erreurs':>7} | {'timeouts':>8}")
+    for level in report["levels"]:
+        latency = level["latency"]
+        print(f"{level['concurrency']:>7} | {level['requests']:>8} | {level['throughput_rps']:>13.2f} | "
+              f"{_ms(latency['p50_s']):>8} | {_ms(latency['p95_s']):>8} | {_ms(latency['p99_s']):>8} | "
+              f"{level['error_rate']:>7.1%} | {level['timeout_rate']:>8.1%}")
+    if len(report["formats"]) > 1:
+        print("\np50 / p99 par format (ms) :")
+        for level in report["levels"]:
+            parts = [f"{format} {_ms(stats['p50_s'])} / {_ms(stats['p99_s'])}"
+                     for format, stats in level["by_format"].items()]
+            print(f"{level['concurrency']:>7} client(s) : {', '.join(parts)}")
+    errors = {status for level in report["levels"] for status in level["statuses"] if status != "200"}
+    if errors:
+        print(f"\nRéponses en échec : {', '.join(sorted(errors))} (détail dans le rapport JSON)")
+
+    sustained = report["sustained"]
+    objective = (f"p99 <= {report['p99_slo'] * 1000:.0f} ms, " if report["p99_slo"] is not None else "") + \
+        f"erreurs <= {report['max_error_rate']:.1%}"
+    if sustained is None:
+        print(f"\nAucun niveau ne tient l'objectif ({objective}).")
+    else:
+        print(f"\nNiveau tenu ({objective}) : {sustained['concurrency']} client(s), "
+              f"{sustained['throughput_rps']:.2f} req/s, p99 {_ms(sustained['latency']['p99_s'])} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Niveaux de concurrence, dans l'ordre")
+    parser.add_argument("--duration", type=float, default=15.0, help="Durée de chaque niveau (secondes)")
+    parser.add_argument("--requests", type=int, default=0, help="Nombre de requêtes par niveau (remplace --duration)")
+    parser.add_argument("--warmup", type=int, default=2, help="Requêtes non comptées avant chaque niveau")
+    parser.add_argument("--formats", default=",".join(FORMATS), help=f"Parmi : {', '.join(FORMATS)}")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scénarios pondérés, parmi : {', '.join(SCENARIOS)}")
+    parser.add_argument("--cache", action="store_true", help="Formulaires identiques : mesure les caches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Délai maximal d'une requête (secondes)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=None, help="Serveur déjà lancé (sinon : application in-process)")
+    target.add_argument("--serve", action="store_true", help="Lance python -m app.server sur un port local")
+    parser.add_argument("--workers", type=int, default=0, help="Processus du serveur lancé par --serve (0 = un par cœur)")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--p99-slo", type=float, default=None, help="Objectif de latence p99 (secondes)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Erreurs + timeouts tolérés (0.01 = 1 %%)")
+    parser.add_argument("--output", default=None, help="Fichier JSON des résultats (défaut : benchmarks/results/)")
+    parser.add_argument("--baseline", default=None, help="Rapport de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Dégradation tolérée (0.25 = 25 %%)")
+    args = parser.parse_args()
+
+    try:
+        levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if not levels or min(levels) < 1:
+        parser.error("Niveaux de concurrence invalides")
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown or not formats:
+        parser.error(f"Format(s) inconnu(s) : {', '.join(unknown)}")
+
+    workload = Workload(mix, formats, unique=not args.cache, seed=args.seed)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = f"{datetime.now():%Y%m%d_%H%M%S}"
+
+    def measure(url: Optional[str]) -> List[dict]:
+        return asyncio.run(run(url or "in-process", url, levels, workload, args.duration, args.requests,
+                               args.warmup, args.timeout))
+
+    if args.serve:
+        with serve(args.workers, os.path.join(RESULTS_DIR, f"load_{stamp}_server.log"), args.startup_timeout) as url:
+            results = measure(url)
+    else:
+        if args.url:
+            wait_ready(args.url.rstrip("/"), timeout=args.startup_timeout)
+        results = measure(args.url.rstrip("/") if args.url else None)
+
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "target": "serve" if args.serve else (args.url or "in-process"),
+        "workers": args.workers if args.serve else None,
+        "formats": formats,
+        "mix": mix,
+        "cache": args.cache,
+        "duration_s": None if args.requests else args.duration,
+        "requests_per_level": args.requests or None,
+        "timeout_s": args.timeout,
+        "p99_slo": args.p99_slo,
+        "max_error_rate": args.max_error_rate,
+        "levels": results,
+        "sustained": sustained_level(results, args.p99_slo, args.max_error_rate),
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{stamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print_summary(report)
+    print(f"\nRésultats : {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) au-delà de {args.tolerance:.0%} :")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nAucune régression par rapport à la référence.")
+
+
+if __name__ == "__main__":
+    main()
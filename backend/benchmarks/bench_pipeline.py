@@ -0,0 +1,203 @@
+"""
+Benchmark de la chaîne de génération, étape par étape, sur les scénarios de
+benchmarks/payloads.py (du formulaire minimal à 10 000 lignes d'inventaire) :
+
+- validation      : DatRequest.model_validate sur le JSON du formulaire ;
+- clean_legacy    : clean_data_for_word(model_dump()) (ancien chemin, référence) ;
+- clean           : build_render_context sur le modèle validé ;
+- template_load   : DocxTemplate(dat_template.docx), parsing à froid (ancien chemin, référence) ;
+- template_cache  : TemplateRegistry.get_template, copie du document déjà parsé
+                    (même coût que l'étape template_load des métriques du service) ;
+- render          : doc.render(contexte) ;
+- save            : doc.save() dans un buffer mémoire ;
+- end_to_end      : POST /api/v1/generate via le client ASGI in-process.
+
+Les résultats sont écrits en JSON et comparés à une référence enregistrée :
+une étape plus lente que la référence au-delà de la tolérance fait échouer
+le script (code de sortie 1).
+
+Le scénario "grand" (10 000 lignes) n'est pas lancé par défaut : le document
+contient un tableau par VM, son rendu demande plusieurs Go de mémoire et
+plusieurs minutes pour l'ensemble des étapes.
+
+    python -m benchmarks.bench_pipeline [--scenarios minimal,petit,moyen] [--repeat 3]
+                                        [--output fichier.json] [--baseline fichier.json]
+                                        [--tolerance 0.25] [--update-baseline]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from docxtpl import DocxTemplate
+
+from app.schemas.dat import DatRequest
+from app.services.doc_generator import (
+    TEMPLATE_PATH,
+    DocumentService,
+    build_render_context,
+    clean_data_for_word,
+)
+from benchmarks.payloads import DEFAULT_SCENARIOS, SCENARIOS, make_scenario
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline_pipeline.json")
+
+# Les écarts sous ce seuil (en secondes) relèvent du bruit de mesure
+MIN_SIGNIFICANT_S = 0.002
+
+
+def measure(fn: Callable, repeat: int, setup: Optional[Callable] = None) -> Dict[str, float]:
+    """Exécute `fn(setup())` `repeat` fois ; seul l'appel à `fn` est chronométré."""
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        timings.append(time.perf_counter() - start)
+    return {"best_s": min(timings), "median_s": statistics.median(timings)}
+
+
+def load_template() -> DocxTemplate:
+    # DocxTemplate n'ouvre le fichier qu'au premier rendu : on force le parsing
+    doc = DocxTemplate(TEMPLATE_PATH)
+    doc.init_docx()
+    return doc
+
+
+def bench_scenario(name: str, repeat: int, service: DocumentService, client) -> Dict[str, Dict[str, float]]:
+    payload = make_scenario(name)
+    data = DatRequest.model_validate(payload)
+    context = build_render_context(data)
+
+    def rendered():
+        doc = service.templates.get_template()
+        doc.render(context)
+        return doc
+
+    stages = {
+        "validation": measure(lambda: DatRequest.model_validate(payload), repeat),
+        "clean_legacy": measure(lambda: clean_data_for_word(data.model_dump()), repeat),
+        "clean": measure(lambda: build_render_context(data), repeat),
+        "template_load": measure(load_template, repeat),
+        "template_cache": measure(service.templates.get_template, repeat),
+        "render": measure(lambda doc: doc.render(context), repeat, setup=service.templates.get_template),
+        "save": measure(lambda doc: doc.save(io.BytesIO()), repeat, setup=rendered),
+    }
+
+    # Un champ différent à chaque itération : le cache de rendu ne doit pas répondre
+    counter = iter(range(sys.maxsize))
+
+    def post(body):
+        response = client.post("/api/v1/generate", json=body)
+        assert response.status_code == 200, f"{name} : HTTP {response.status_code} {response.text[:200]}"
+
+    stages["end_to_end"] = measure(post, repeat, setup=lambda: {**payload, "description_doc": f"run {next(counter)}"})
+    return stages
+
+
+def run(scenarios: List[str], repeat: int = 3) -> dict:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    service = DocumentService()
+    results = {}
+    with TestClient(app) as client:
+        for name in scenarios:
+            results[name] = bench_scenario(name, repeat, service, client)
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Liste des étapes plus lentes que la référence au-delà de la tolérance."""
+    regressions = []
+    for scenario, stages in current["results"].items():
+        for stage, timing in stages.items():
+            reference = baseline.get("results", {}).get(scenario, {}).get(stage)
+            if reference is None:
+                continue
+            now, before = timing["best_s"], reference["best_s"]
+            if now - before > MIN_SIGNIFICANT_S and now > before * (1 + tolerance):
+                regressions.append(f"{scenario}/{stage} : {before * 1000:.1f} ms -> {now * 1000:.1f} ms "
+                                   f"(x{now / before:.2f})")
+    return regressions
+
+
+def print_table(report: dict, baseline: Optional[dict]) -> None:
+    print(f"{'scénario':>9} | {'étape':>14} | {'meilleur (ms)':>13} | {'médiane (ms)':>12} | {'référence':>9}")
+    for scenario, stages in report["results"].items():
+        for stage, timing in stages.items():
+            reference = (baseline or {}).get("results", {}).get(scenario, {}).get(stage)
+            ratio = f"x{timing['best_s'] / reference['best_s']:.2f}" if reference else "-"
+            print(f"{scenario:>9} | {stage:>14} | {timing['best_s'] * 1000:>13.1f} | "
+                  f"{timing['median_s'] * 1000:>12.1f} | {ratio:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        help=f"Parmi : {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Fichier JSON des résultats (défaut : benchmarks/results/)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Ralentissement toléré (0.25 = +25 %%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Enregistre ces résultats comme référence")
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"Scénario(s) inconnu(s) : {', '.join(unknown)}")
+
+    report = run(scenarios, args.repeat)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_table(report, baseline)
+    print(f"\nRésultats : {output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Référence mise à jour : {args.baseline}")
+        return
+
+    if baseline is None:
+        print("Aucune référence : relancer avec --update-baseline pour en enregistrer une.")
+        return
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} régression(s) au-delà de +{args.tolerance:.0%} :")
+        for line in regressions:
+            print(f"  - {line}")
+        sys.exit(1)
+    print("\nAucune régression par rapport à la référence.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Temps de démarrage d'un worker, mesurés dans des processus neufs (comme un
+worker uvicorn qui vient d'être lancé) :
+
+- « import »  : `import app.main`, et les modules lourds (docxtpl, python-docx,
+  lxml, Jinja2) éventuellement chargés à l'import ; avec --importtime, les
+  modules les plus coûteux selon `python -X importtime` ;
+- « démarrage » : lifespan complet (préchauffage compris) jusqu'à /readyz en
+  200, puis durée de la première génération, avec et sans préchauffage.
+
+    python -m benchmarks.bench_startup [--repeat 5] [--importtime]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["docxtpl", "docx", "lxml.etree", "jinja2", "PIL"]
+MARKER = "BENCH "
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print({MARKER!r} + json.dumps({{"import_s": elapsed,
+                               "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+STARTUP_SCRIPT = f"""
+import json, time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+imported = time.perf_counter()
+with TestClient(app) as client:
+    started = time.perf_counter()
+    ready = client.get("/readyz")
+    before = time.perf_counter()
+    response = client.post("/api/v1/generate", json={{"titre_projet": "Démarrage"}})
+    first = time.perf_counter() - before
+print({MARKER!r} + json.dumps({{
+    "import_s": imported - start,
+    "startup_s": started - imported,
+    "ready_status": ready.status_code,
+    "checks": {{name: check.get("duration_s") for name, check in ready.json()["checks"].items()}},
+    "first_request_s": first,
+    "first_status": response.status_code,
+}}))
+"""
+
+
+def _run(script: str, env: Dict[str, str]) -> dict:
+    result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True,
+                            env={**os.environ, **env}, check=True)
+    for line in result.stdout.splitlines():
+        if line.startswith(MARKER):
+            return json.loads(line[len(MARKER):])
+    raise RuntimeError(f"Pas de résultat :\n{result.stderr[-2000:]}")
+
+
+def importtime(limit: int = 15) -> List[dict]:
+    """Modules les plus coûteux à l'import de app.main (temps propre, en ms)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            rows.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda r: r["self_ms"], reverse=True)[:limit]
+
+
+def run(repeat: int = 5) -> dict:
+    imports = [_run(IMPORT_SCRIPT, {}) for _ in range(repeat)]
+    startups = {
+        mode: [_run(STARTUP_SCRIPT, {"DARWIN_WARMUP": flag, "DARWIN_WARMUP_BACKGROUND": "0"})
+               for _ in range(max(1, repeat // 2))]
+        for mode, flag in (("préchauffage", "1"), ("sans", "0"))
+    }
+    return {"imports": imports, "startups": startups}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="Détail par module (python -X importtime)")
+    args = parser.parse_args()
+
+    report = run(args.repeat)
+    import_times = [r["import_s"] for r in report["imports"]]
+    print(f"import app.main : médiane {statistics.median(import_times) * 1000:.0f} ms, "
+          f"min {min(import_times) * 1000:.0f} ms ({len(import_times)} processus)")
+    print(f"modules lourds chargés à l'import : {', '.join(report['imports'][0]['heavy']) or 'aucun'}")
+
+    print(f"\n{'mode':>13} | {'import (ms)':>11} | {'démarrage (ms)':>14} | {'/readyz':>7} | {'1re génération (ms)':>19}")
+    for mode, runs in report["startups"].items():
+        print(f"{mode:>13} | {statistics.median(r['import_s'] for r in runs) * 1000:>11.0f} | "
+              f"{statistics.median(r['startup_s'] for r in runs) * 1000:>14.0f} | {runs[0]['ready_status']:>7} | "
+              f"{statistics.median(r['first_request_s'] for r in runs) * 1000:>19.0f}")
+        if runs[0]["checks"]:
+            steps = ", ".join(f"{name} {(duration or 0) * 1000:.0f} ms" for name, duration in runs[0]["checks"].items())
+            print(f"{'':>13}   étapes : {steps}")
+
+    if args.importtime:
+        print(f"\n{'module':>45} | {'propre (ms)':>11} | {'cumulé (ms)':>11}")
+        for row in importtime():
+            print(f"{row['module']:>45} | {row['self_ms']:>11.1f} | {row['cumulative_ms']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
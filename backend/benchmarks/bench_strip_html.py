@@ -0,0 +1,109 @@
+"""
+Micro-benchmark de strip_html contre l'ancienne chaîne de 8 re.sub, sur des
+contenus de 1 Ko à 10 Mo et trois profils :
+
+- "dense"     : HTML très balisé, listes imbriquées (pire cas) ;
+- "editeur"   : paragraphes et listes simples, comme les produit TipTap ;
+- "texte"     : champ sans aucune balise (cas le plus fréquent).
+
+Pour les profils sans liste imbriquée, on vérifie aussi que les deux
+implémentations donnent exactement le même texte.
+
+    python -m benchmarks.bench_strip_html [--max-size 10000000] [--repeat 3]
+"""
+import argparse
+import re
+import time
+from html import unescape
+
+from app.services.doc_generator import strip_html
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+# Fragment très balisé, avec listes imbriquées
+DENSE = (
+    '<p>Le service <strong>DARWIN</strong> expose une API REST &amp; un front React.</p>'
+    '<ul class="list-disc pl-5 space-y-1"><li><p>Serveur applicatif&nbsp;: 2 VMs</p></li>'
+    '<li><p>Base <em>PostgreSQL</em> en HA</p><ul><li><p>Réplication &lt;synchrone&gt;</p></li></ul></li></ul>'
+    '<p>Supervision via Centreon<br>Alerting par mail<br/></p><div>Sauvegarde quotidienne</div>'
+    '<ol><li><p>Étape 1</p></li><li><p>Étape 2</p></li></ol><p></p><p></p>'
+)
+
+# Fragment représentatif de ce que produit l'éditeur riche (TipTap)
+EDITOR = (
+    '<p>Le service <strong>DARWIN</strong> expose une API REST &amp; un front React servi par nginx, '
+    'avec une authentification OIDC et des journaux centralisés dans la supervision.</p>'
+    '<ul class="list-disc pl-5 space-y-1"><li><p>Serveur applicatif : deux VMs en actif/actif</p></li>'
+    '<li><p>Base PostgreSQL en haute disponibilité avec réplication synchrone</p></li></ul>'
+    '<p>Les alertes partent par mail aux équipes d\'astreinte.<br>Tableaux de bord sur Grafana.</p>'
+)
+
+PLAIN = "Serveur applicatif principal hébergé en zone interne, sans mise en forme. "
+
+PROFILES = {"dense": DENSE, "editeur": EDITOR, "texte": PLAIN}
+
+
+def legacy_strip_html(html_content: str) -> str:
+    """Ancienne implémentation (8 passes de re.sub), gardée comme référence."""
+    if not html_content:
+        return ""
+    text = html_content
+    text = re.sub(r'<br\s*/?>', '\n', text)
+    text = re.sub(r'</p>', '\n', text)
+    text = re.sub(r'</div>', '\n', text)
+    text = re.sub(r'</li>', '\n', text)
+    text = re.sub(r'<li[^>]*>', '• ', text)
+    text = re.sub(r'<[^>]+>', '', text)
+    text = unescape(text)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    return text.strip()
+
+
+def make_html(size: int, fragment: str = EDITOR) -> str:
+    return (fragment * (size // len(fragment) + 1))[:size]
+
+
+def best_time(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(max_size: int = SIZES[-1], repeat: int = 3) -> list:
+    results = []
+    for profile, fragment in PROFILES.items():
+        for size in [s for s in SIZES if s <= max_size]:
+            html = make_html(size, fragment)
+            if fragment is not DENSE:
+                assert strip_html(html) == legacy_strip_html(html), f"Résultat différent ({profile}, {size})"
+            legacy = best_time(legacy_strip_html, html, repeat)
+            current = best_time(strip_html, html, repeat)
+            results.append({
+                "profile": profile,
+                "size": size,
+                "legacy_s": legacy,
+                "current_s": current,
+                "legacy_mb_s": size / legacy / 1e6,
+                "current_mb_s": size / current / 1e6,
+                "speedup": legacy / current,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-size", type=int, default=SIZES[-1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'profil':>8} | {'taille':>10} | {'ancien (Mo/s)':>14} | {'actuel (Mo/s)':>14} | {'gain':>6}")
+    for r in run(args.max_size, args.repeat):
+        print(f"{r['profile']:>8} | {r['size']:>10} | {r['legacy_mb_s']:>14.1f} | "
+              f"{r['current_mb_s']:>14.1f} | x{r['speedup']:>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
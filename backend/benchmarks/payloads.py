@@ -0,0 +1,116 @@
+"""
+Générateur de formulaires DatRequest synthétiques, reproductibles (graine fixe).
+
+Les scénarios vont du formulaire minimal à 10 000 lignes de vms / flux_reseau /
+echanges_donnees avec de grosses sections HTML, pour mesurer la chaîne de
+génération sur des volumes réalistes.
+"""
+import random
+from typing import Dict
+
+from benchmarks.bench_strip_html import EDITOR, make_html
+
+# Nombre de lignes des grands inventaires, taille de chaque champ HTML (caractères)
+SCENARIOS: Dict[str, Dict[str, int]] = {
+    "minimal": {"rows": 0, "html_size": 0},
+    "petit": {"rows": 10, "html_size": 2_000},
+    "moyen": {"rows": 1_000, "html_size": 20_000},
+    "grand": {"rows": 10_000, "html_size": 200_000},
+}
+DEFAULT_SCENARIOS = ["minimal", "petit", "moyen"]
+
+HTML_FIELDS = [
+    "objet_document", "schema_description", "description_architecture",
+    "description_authentification", "description_administrationtechnique",
+    "description_adminfonctionnelle", "description_interapplicative", "deploiement",
+    "migration_reprise", "supervision", "sauvegarde_restauration", "contraintes",
+    "niveau_services",
+]
+
+ENVIRONNEMENTS = ["Production", "Recette", "Développement", "Pré-production"]
+ROLES = ["Serveur applicatif", "Base de données", "Frontal web", "Batch", "Proxy", "Supervision"]
+OS = ["Linux", "Windows"]
+TYPES_ECHANGE = ["API REST", "Fichier", "SFTP", "MQ", "SOAP"]
+TYPES_FLUX = ["TCP", "UDP", "HTTPS"]
+FREQUENCES = ["Temps réel", "Horaire", "Quotidienne", "Hebdomadaire"]
+
+
+def _name(rng: random.Random, prefix: str, i: int) -> str:
+    return f"{prefix}-{rng.choice('ABCDEFGH')}{i:05d}"
+
+
+def make_payload(rows: int = 0, html_size: int = 0, seed: int = 0) -> dict:
+    """Formulaire au format JSON de l'API (dict), identique pour une même graine."""
+    rng = random.Random(seed)
+    payload = {
+        "titre_projet": f"Projet synthétique {seed}",
+        "chef_projet": "Jean Dupont",
+        "contact_tech": "tech@example.com",
+        "date": "2026-02-18",
+        "description_doc": "Document généré pour les benchmarks",
+    }
+    if rows == 0 and html_size == 0:
+        return payload
+
+    for field in HTML_FIELDS:
+        payload[field] = make_html(html_size, EDITOR)
+
+    small = max(1, min(rows, 20))
+    payload["acteurs"] = [
+        {"acteur": f"Équipe {i}", "role": rng.choice(ROLES), "droits": "Lecture", "commentaires": ""}
+        for i in range(small)
+    ]
+    payload["glossaire"] = [{"abreviation": f"AB{i}", "signification": f"Abréviation {i}"} for i in range(small)]
+    payload["briques_fonctionnelles"] = [
+        {"brique": f"Brique {i}", "description": "Module applicatif"} for i in range(small)
+    ]
+    payload["choix_technologiques"] = [
+        {"tiers": f"Tiers {i}", "produit": "PostgreSQL", "version": "16"} for i in range(small)
+    ]
+    payload["dns_nom"] = [
+        {"nom_dns": f"app{i}.example.com", "machine_associe": _name(rng, "SRV", i)} for i in range(small)
+    ]
+
+    payload["vms"] = [
+        {
+            "environnement": rng.choice(ENVIRONNEMENTS),
+            "nom": _name(rng, "SRV", i),
+            "role": rng.choice(ROLES),
+            "os": rng.choice(OS),
+            "cpu": rng.choice([2, 4, 8, 16]),
+            "ram": rng.choice([4, 8, 16, 32, 64]),
+            "resilience": rng.choice(["HA", "Actif/Passif", "Aucune"]),
+        }
+        for i in range(rows)
+    ]
+    payload["flux_reseau"] = [
+        {
+            "type_echange": rng.choice(TYPES_ECHANGE),
+            "brique_fonctionnelle": f"Brique {i % small}",
+            "source": _name(rng, "SRV", rng.randrange(rows)),
+            "destination": _name(rng, "SRV", rng.randrange(rows)),
+            "description": "Flux applicatif",
+            "type_flux": rng.choice(TYPES_FLUX),
+        }
+        for i in range(rows)
+    ]
+    payload["echanges_donnees"] = [
+        {
+            "type_echange": rng.choice(TYPES_ECHANGE),
+            "brique_fonctionnelle": f"Brique {i % small}",
+            "source": _name(rng, "APP", rng.randrange(rows)),
+            "destination": _name(rng, "APP", rng.randrange(rows)),
+            "type_donnees": "Référentiel client",
+            "volumetrie": f"{rng.randint(1, 900)} Mo",
+            "volumetrie_journaliere": f"{rng.randint(1, 50)} Go",
+            "nb_fichiers_jour": str(rng.randint(0, 200)),
+            "frequence": rng.choice(FREQUENCES),
+            "hno": rng.choice(["Oui", "Non"]),
+        }
+        for i in range(rows)
+    ]
+    return payload
+
+
+def make_scenario(name: str, seed: int = 0) -> dict:
+    return make_payload(seed=seed, **SCENARIOS[name])
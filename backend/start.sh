@@ -1,4 +1,11 @@
 #!/bin/bash
 cd /home/user/webapp/backend
 export PYTHONPATH=/home/user/webapp/backend
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+
+# DARWIN_ENV=development (par défaut) : un seul processus avec rechargement automatique
+if [ "${DARWIN_ENV:-development}" = "development" ]; then
+    exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+fi
+
+# DARWIN_ENV=production (ecosystem.config.cjs) : un worker par cœur (DARWIN_WORKERS), préchauffés, arrêt progressif sur SIGTERM
+exec python -m app.server
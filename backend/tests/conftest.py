@@ -0,0 +1,44 @@
+"""
+Configuration commune des tests.
+
+Les variables DARWIN_* sont lues à l'import de app.core.config : elles sont
+fixées ici, avant tout import de l'application. Pas de préchauffage, pas de
+pool LibreOffice, pas de surveillance du template, et des répertoires
+temporaires propres à la session pour le spool et le profilage.
+
+    cd backend && python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TMP = tempfile.mkdtemp(prefix="darwin_tests_")
+os.environ.setdefault("DARWIN_WARMUP", "0")
+os.environ.setdefault("DARWIN_CONVERTER_POOL_SIZE", "0")
+os.environ.setdefault("DARWIN_TEMPLATE_WATCH", "0")
+os.environ.setdefault("DARWIN_LOG_LEVEL", "WARNING")
+os.environ.setdefault("DARWIN_SPOOL_DIR", os.path.join(_TMP, "spool"))
+os.environ.setdefault("DARWIN_PROFILE_DIR", os.path.join(_TMP, "profiles"))
+
+import pytest  # noqa: E402
+
+from benchmarks.payloads import make_scenario  # noqa: E402
+
+
+@pytest.fixture
+def payload():
+    """Formulaire « petit » de benchmarks/payloads.py (quelques lignes par inventaire)."""
+    return make_scenario("petit")
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,105 @@
+"""Stockage des documents générés : opt-in, identifiants HMAC, ETag et Range."""
+import hashlib
+import os
+import stat
+import time
+import warnings
+
+import pytest
+
+from app.core import config
+from app.main import app
+from app.services.artifacts import ArtifactStore
+from app.services.doc_generator import OUTPUT_DIR
+from app.services.pipeline import document_service
+from app.services.render_cache import render_cache
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ArtifactStore(directory=str(tmp_path / "artifacts"), secret="secret")
+    monkeypatch.setattr(document_service, "artifacts", store)
+    return store
+
+
+def fetch(client, document_id: str, timeout: float = 5.0, **headers):
+    """GET du document ; l'écriture d'un document en mémoire se fait en arrière-plan."""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(f"/api/v1/documents/{document_id}", headers=headers)
+        if response.status_code != 404 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.05)
+
+
+def test_ids_are_keyed_hmacs(tmp_path):
+    key = "formulaire:docx"
+    first = ArtifactStore(directory=str(tmp_path), secret="a")
+    assert first.id_for(key) == ArtifactStore(directory=str(tmp_path), secret="a").id_for(key)
+    assert first.id_for(key) != ArtifactStore(directory=str(tmp_path), secret="b").id_for(key)
+    # Sans la clé secrète, l'identifiant ne se déduit pas du contenu
+    assert first.id_for(key) != hashlib.sha256(key.encode()).hexdigest()
+
+
+def test_store_is_disabled_by_default(client, payload):
+    assert not document_service.artifacts.enabled
+    response = client.post("/api/v1/generate", json=payload)
+    assert response.status_code == 200
+    assert "X-Document-Id" not in response.headers
+
+
+def test_generated_document_is_served_with_etag_and_range(client, payload, store):
+    response = client.post("/api/v1/generate", json=payload)
+    assert response.status_code == 200
+    document_id = response.headers["X-Document-Id"]
+    # Même formulaire, même identifiant
+    assert client.post("/api/v1/generate", json=payload).headers["X-Document-Id"] == document_id
+
+    full = fetch(client, document_id)
+    assert full.status_code == 200
+    assert full.content == response.content
+    etag = full.headers["ETag"]
+    assert stat.S_IMODE(os.stat(store.directory).st_mode) == 0o700
+
+    assert fetch(client, document_id, **{"If-None-Match": etag}).status_code == 304
+
+    partial = fetch(client, document_id, Range="bytes=0-9")
+    assert partial.status_code == 206
+    assert partial.content == response.content[:10]
+    assert partial.headers["Content-Range"] == f"bytes 0-9/{len(response.content)}"
+
+    outside = fetch(client, document_id, Range=f"bytes={len(response.content)}-")
+    assert outside.status_code == 416
+    assert outside.headers["Content-Range"] == f"bytes */{len(response.content)}"
+
+    head = client.head(f"/api/v1/documents/{document_id}")
+    assert head.status_code == 200 and not head.content
+    assert head.headers["Content-Length"] == str(len(response.content))
+
+
+def test_unknown_document_is_404(client, store):
+    assert client.get("/api/v1/documents/" + "0" * 64).status_code == 404
+    assert client.get("/api/v1/documents/not-an-id").status_code == 404
+
+
+def test_openapi_has_no_duplicate_operation_ids(client, monkeypatch):
+    monkeypatch.setattr(app, "openapi_schema", None)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        schema = client.get("/openapi.json").json()
+    assert list(schema["paths"]["/api/v1/documents/{document_id}"]) == ["get"]
+
+
+def test_disk_mode_without_store_leaves_no_file(client, payload, monkeypatch):
+    monkeypatch.setattr(config, "OUTPUT_MODE", "disk")
+    before = set(os.listdir(OUTPUT_DIR)) if OUTPUT_DIR.exists() else set()
+    spooled = set(os.listdir(config.SPOOL_DIR)) if os.path.isdir(config.SPOOL_DIR) else set()
+    body = {**payload, "description_doc": "mode disque"}
+
+    response = client.post("/api/v1/generate", json=body)
+    assert response.status_code == 200
+    assert response.content.startswith(b"PK")
+    # Rien dans generated_docs ; le fichier temporaire n'est gardé que par le cache de rendu
+    assert (set(os.listdir(OUTPUT_DIR)) if OUTPUT_DIR.exists() else set()) == before
+    render_cache.clear()
+    assert set(os.listdir(config.SPOOL_DIR)) <= spooled
@@ -0,0 +1,49 @@
+"""Génération par lot : entrées invalides rejetées une à une, fenêtre de rendus bornée."""
+import asyncio
+import io
+import json
+import zipfile
+
+from app.schemas.batch import BatchItemReport
+from app.services.batch import REPORT_NAME, BatchGenerator
+
+
+def read_zip(chunks) -> zipfile.ZipFile:
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+def test_bad_entries_are_reported_individually(client):
+    response = client.post("/api/v1/generate/batch", json={
+        "format": "docx",
+        "documents": [42, "texte", None, {"titre_projet": 1234}],
+    })
+    assert response.status_code == 200
+    summary = json.loads(read_zip([response.content]).read(REPORT_NAME))
+    assert summary["total"] == 4 and summary["errors"] == 4
+    for report in summary["documents"][:3]:
+        assert report["error"] == "Données invalides : un objet JSON est attendu."
+    assert summary["documents"][3]["error"].startswith("Données invalides")
+
+
+def test_stream_zip_bounds_running_documents(monkeypatch):
+    generator = BatchGenerator(max_workers=2)
+    running = 0
+    peak = 0
+
+    async def fake_generate(index, payload, format, slots, template=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return BatchItemReport(index=index, status="ok", filename=f"{index:03d}.docx"), b"docx"
+
+    monkeypatch.setattr(generator, "_generate_one", fake_generate)
+
+    async def scenario():
+        return [chunk async for chunk in generator.stream_zip([{}] * 20, "docx")]
+
+    archive = read_zip(asyncio.run(scenario()))
+    summary = json.loads(archive.read(REPORT_NAME))
+    assert summary["ok"] == 20
+    assert 1 < peak <= 2 * generator.max_workers
@@ -0,0 +1,30 @@
+"""Générateurs de formulaires et comparaison à la référence des benchmarks."""
+import pytest
+
+from app.schemas.dat import DatRequest
+from benchmarks.bench_pipeline import compare
+from benchmarks.payloads import SCENARIOS, make_payload, make_scenario
+
+
+@pytest.mark.parametrize("name", ["minimal", "petit"])
+def test_scenarios_are_valid_requests(name):
+    data = DatRequest.model_validate(make_scenario(name))
+    assert len(data.vms) == len(data.flux_reseau) == SCENARIOS[name]["rows"]
+
+
+def test_payloads_are_reproducible():
+    assert make_payload(rows=5, html_size=200, seed=1) == make_payload(rows=5, html_size=200, seed=1)
+    assert make_payload(rows=5, html_size=200, seed=1) != make_payload(rows=5, html_size=200, seed=2)
+
+
+def results(**stages):
+    return {"results": {"petit": {name: {"best_s": best} for name, best in stages.items()}}}
+
+
+def test_compare_reports_significant_regressions_only():
+    baseline = results(render=0.100, save=0.001, clean=0.010)
+    current = results(render=0.200, save=0.002, clean=0.011, validation=1.0)
+    # save : x2 mais sous le seuil de bruit ; clean : dans la tolérance ; validation : pas de référence
+    regressions = compare(current, baseline, tolerance=0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("petit/render")
@@ -0,0 +1,58 @@
+"""Corps DatRequest validé depuis les octets bruts : erreurs 422 au format de FastAPI."""
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.schemas.dat import DatRequest
+
+
+@pytest.fixture(scope="module")
+def reference():
+    """Route FastAPI classique (modèle en paramètre), pour comparer les erreurs."""
+    app = FastAPI()
+
+    @app.post("/generate")
+    def generate(data: DatRequest):
+        return {}
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("body", [
+    {"titre_projet": 42},
+    {"vms": [{"nom": "vm1", "cpu": "deux"}]},
+    {"vms": "pas une liste", "flux_reseau": [{"source": ["a"]}]},
+    [],
+])
+def test_validation_errors_match_fastapi(client, reference, body):
+    raw = json.dumps(body)
+    headers = {"Content-Type": "application/json"}
+    response = client.post("/api/v1/generate", content=raw, headers=headers)
+    expected = reference.post("/generate", content=raw, headers=headers)
+    assert response.status_code == expected.status_code == 422
+    # Mêmes erreurs aux mêmes emplacements ; seuls certains libellés diffèrent
+    # entre validation JSON et Python (« valid array » / « valid list »)
+    errors, expected_errors = response.json()["detail"], expected.json()["detail"]
+    assert [error["loc"] for error in errors] == [error["loc"] for error in expected_errors]
+    assert [error["input"] for error in errors] == [error["input"] for error in expected_errors]
+    for error in errors:
+        assert {"type", "loc", "msg", "input"} <= set(error)
+
+
+@pytest.mark.parametrize("raw", [b"", b"{pas du json", b'{"titre_projet": "a"'])
+def test_unreadable_bodies_are_body_errors(client, raw):
+    response = client.post("/api/v1/generate", content=raw, headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+    for error in response.json()["detail"]:
+        assert error["loc"][0] == "body"
+        # Le corps n'est pas renvoyé au client
+        assert error.get("input") is None
+
+
+def test_openapi_declares_the_body(client):
+    schema = client.get("/openapi.json").json()
+    body = schema["paths"]["/api/v1/generate"]["post"]["requestBody"]
+    assert body["content"]["application/json"]["schema"] == {"$ref": "#/components/schemas/DatRequest"}
+    assert "VM" in schema["components"]["schemas"]
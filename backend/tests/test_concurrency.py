@@ -0,0 +1,56 @@
+"""Pools bornés : la place d'un rendu n'est rendue qu'à la fin du travail."""
+import asyncio
+import threading
+
+import pytest
+
+from app.services.concurrency import BoundedExecutor, ServiceSaturated
+
+
+def test_cancelled_request_keeps_its_slot_until_work_ends():
+    executor = BoundedExecutor("test", max_workers=1, max_pending=1, queue_timeout=0.1)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "fini"
+
+    async def scenario():
+        first = asyncio.create_task(executor.run(blocking))
+        await asyncio.to_thread(started.wait, 5)
+        # Client déconnecté : la requête est annulée, le thread continue
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert executor.in_flight == 1
+        with pytest.raises(ServiceSaturated):
+            await executor.run(lambda: "trop tôt")
+
+        release.set()
+        assert await executor.run(lambda: "ok") == "ok"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert executor.in_flight == 0
+
+
+def test_errors_release_the_slot():
+    executor = BoundedExecutor("test", max_workers=1, max_pending=0, queue_timeout=0.1)
+
+    def failing():
+        raise ValueError("rendu impossible")
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await executor.run(failing)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert executor.in_flight == 0
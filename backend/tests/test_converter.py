@@ -0,0 +1,203 @@
+"""
+Pool LibreOffice (instances simulées) et regroupement des conversions à froid
+(faux binaire `libreoffice` : copie les entrées, bloque sur un fichier dont le
+chemin contient « hang »).
+"""
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+from app.core import config
+from app.services import converter as converter_module
+from app.services.converter import (
+    ConversionBatcher,
+    ConversionError,
+    ConversionTimeout,
+    InstanceFailure,
+    LibreOfficeConverter,
+    ProfilePool,
+)
+
+FAKE_LIBREOFFICE = """#!{python}
+import os, shutil, sys, time
+args = sys.argv[1:]
+fmt = args[args.index("--convert-to") + 1]
+out = args[args.index("--outdir") + 1]
+files = [a for a in args if not a.startswith("-") and a not in (fmt, out)]
+with open({calls!r}, "a") as log:
+    log.write(f"{{len(files)}}\\n")
+os.makedirs(out, exist_ok=True)
+for path in files:
+    if "hang" in os.path.realpath(path):
+        time.sleep(60)
+    name = os.path.splitext(os.path.basename(path))[0] + "." + fmt
+    shutil.copy(path, os.path.join(out, name))
+"""
+
+
+class FakeWorker:
+    """Instance du pool dont la conversion lève `failure`."""
+
+    def __init__(self, failure=None):
+        self.worker_id = 0
+        self.jobs_done = 0
+        self.failure = failure
+        self.healthy = True
+        self.killed = False
+        self.restarted = threading.Event()
+
+    def is_healthy(self):
+        return self.healthy
+
+    def convert(self, src_path, output_path, fmt, timeout):
+        self.jobs_done += 1
+        if isinstance(self.failure, InstanceFailure):
+            # Comme LibreOfficeWorker : InstanceFailure quand l'instance ne répond plus
+            self.healthy = False
+        if self.failure is not None:
+            raise self.failure
+        return output_path
+
+    def kill(self):
+        self.killed = True
+        self.healthy = False
+
+    def stop(self):
+        pass
+
+    def start(self):
+        self.healthy = True
+        self.failure = None
+        self.restarted.set()
+
+
+def pool_with(worker) -> LibreOfficeConverter:
+    converter = LibreOfficeConverter(pool_size=0)
+    converter.pool_enabled = True
+    converter._started = True
+    converter._workers = [worker]
+    converter._idle.put(worker)
+    return converter
+
+
+def test_input_error_keeps_the_instance(tmp_path):
+    worker = FakeWorker(failure=ConversionError("Document illisible"))
+    converter = pool_with(worker)
+    with pytest.raises(ConversionError, match="illisible"):
+        converter.convert(str(tmp_path / "a.docx"), "pdf", str(tmp_path))
+    assert not worker.killed
+    assert converter._idle.get_nowait() is worker
+    assert not converter._restarts
+
+
+def test_instance_failure_falls_back_and_restarts(tmp_path, monkeypatch):
+    worker = FakeWorker(failure=InstanceFailure("pont UNO perdu"))
+    converter = pool_with(worker)
+    fallback = []
+    monkeypatch.setattr(converter_module, "convert_with_subprocess",
+                        lambda src, fmt, out, timeout: fallback.append(src) or os.path.join(out, "a.pdf"))
+
+    result = converter.convert(str(tmp_path / "a.docx"), "pdf", str(tmp_path))
+
+    assert result == str(tmp_path / "a.pdf")
+    assert worker.killed and fallback
+    # Hors de _idle jusqu'à la fin du redémarrage, puis de retour dans le pool
+    assert worker.restarted.wait(5)
+    assert converter._idle.get(timeout=5) is worker
+
+
+@pytest.fixture
+def fake_libreoffice(tmp_path, monkeypatch):
+    calls = tmp_path / "calls.log"
+    binary = tmp_path / "libreoffice"
+    binary.write_text(FAKE_LIBREOFFICE.format(python=sys.executable, calls=str(calls)))
+    binary.chmod(binary.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setattr(config, "LIBREOFFICE_BIN", str(binary))
+    return calls
+
+
+def convert_all(batcher: ConversionBatcher, sources, outdir, stagger: float = 0.0):
+    """Conversions simultanées, lancées dans l'ordre ; résultat ou exception pour chaque source."""
+    results = {}
+
+    def run(src):
+        try:
+            results[src] = batcher.convert(src, "pdf", outdir)
+        except ConversionError as e:
+            results[src] = e
+
+    threads = [threading.Thread(target=run, args=(src,)) for src in sources]
+    for thread in threads:
+        thread.start()
+        time.sleep(stagger)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def make_inputs(directory, names, size=10):
+    paths = []
+    for name in names:
+        path = directory / name
+        path.write_bytes(b"x" * size)
+        paths.append(str(path))
+    return paths
+
+
+def test_batch_converts_together(tmp_path, fake_libreoffice):
+    batcher = ConversionBatcher(window=0.5, max_size=4, timeout=30)
+    sources = make_inputs(tmp_path, ["a.docx", "b.docx", "c.docx"])
+    results = convert_all(batcher, sources, str(tmp_path))
+    assert sorted(results.values()) == [str(tmp_path / f"{n}.pdf") for n in "abc"]
+    assert fake_libreoffice.read_text().split() == ["3"]
+
+
+def test_batch_byte_cap_splits_batches(tmp_path, fake_libreoffice):
+    batcher = ConversionBatcher(window=0.5, max_size=4, timeout=30, max_bytes=150)
+    sources = make_inputs(tmp_path, ["a.docx", "b.docx", "c.docx"], size=100)
+    results = convert_all(batcher, sources, str(tmp_path))
+    assert all(isinstance(result, str) for result in results.values())
+    assert sorted(fake_libreoffice.read_text().split()) == ["1", "1", "1"]
+
+
+def test_batch_timeout_is_bounded(tmp_path, fake_libreoffice):
+    batcher = ConversionBatcher(window=0.2, max_size=2, timeout=1.0, file_timeout=0.5)
+    sources = make_inputs(tmp_path, ["ok.docx", "hang.docx"])
+    start = time.monotonic()
+    results = convert_all(batcher, sources, str(tmp_path), stagger=0.05)
+    elapsed = time.monotonic() - start
+    # Le fichier converti avant le blocage est gardé ; l'autre n'a pas de reprise
+    # seule avec un nouveau délai complet : il échoue dans le délai du lot
+    ok, hang = sources
+    assert results[ok] == str(tmp_path / "ok.pdf")
+    assert isinstance(results[hang], ConversionTimeout)
+    assert elapsed < batcher.window + batcher.batch_timeout(2) + 1.0
+
+
+def test_profiles_are_private_to_each_conversion():
+    pool = ProfilePool(max_idle=1)
+    with pool.acquire() as first, pool.acquire() as second:
+        assert first != second
+        assert os.path.isdir(first) and os.path.isdir(second)
+    # Un profil libéré est gardé pour la conversion suivante, dans la limite de max_idle
+    assert os.path.isdir(first) != os.path.isdir(second)
+    kept = first if os.path.isdir(first) else second
+    with pool.acquire() as reused:
+        assert reused == kept
+    pool.clear()
+    assert not os.path.exists(kept)
+
+
+def test_failed_conversion_profile_is_not_reused():
+    pool = ProfilePool(max_idle=2)
+    with pytest.raises(RuntimeError):
+        with pool.acquire() as profile:
+            raise RuntimeError("LibreOffice tué")
+    assert not os.path.exists(profile)
+    with pool.acquire() as fresh:
+        assert fresh != profile
+    pool.clear()
@@ -0,0 +1,91 @@
+"""Images des schémas : décodage strict, préparation dédupliquée, insertion dans le DAT."""
+import base64
+import io
+import struct
+import zipfile
+import zlib
+
+import pytest
+from docx.image.image import Image as DocxImage
+
+from app.services.images import ImageCache, decode_image
+
+
+def png(width: int = 400, height: int = 100) -> bytes:
+    """PNG uni (niveaux de gris), écrit sans Pillow : Pillow est optionnel."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + b"\x80" * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows))
+            + chunk(b"IEND", b""))
+
+
+def data_url(raw: bytes, mime: str = "image/png") -> str:
+    return f"data:{mime};base64,{base64.b64encode(raw).decode()}"
+
+
+def test_data_url_and_raw_base64_are_decoded():
+    raw = png()
+    assert decode_image(data_url(raw)) == raw
+    assert decode_image(base64.b64encode(raw).decode()) == raw
+
+
+@pytest.mark.parametrize("value", [
+    "",
+    "schemas/architecture.png",                      # ancien usage : chemin
+    base64.b64encode(b"\x89PNG\r\n\x1a\n").decode(),  # base64 trop court pour une image
+    base64.b64encode(b"texte libre " * 10).decode(),  # base64 d'autre chose qu'une image
+    "Schéma à fournir par l'équipe infrastructure, version validée en comité.",
+])
+def test_values_that_are_not_images_are_ignored(value):
+    assert decode_image(value) is None
+
+
+@pytest.mark.parametrize("value, message", [
+    ("data:image/png;base64,@@pas du base64@@", "base64 invalide"),
+    (data_url(b"<svg xmlns='http://www.w3.org/2000/svg'/>", "image/svg+xml"), "non pris en charge"),
+])
+def test_unreadable_data_urls_are_rejected(value, message):
+    with pytest.raises(ValueError, match=message):
+        decode_image(value)
+
+
+def test_prepared_images_are_shared():
+    cache = ImageCache(max_bytes=1 << 20)
+    raw = png(width=4000)
+    width = 5_000_000  # EMU, environ 14 cm
+    prepared = cache.prepare(raw, width)
+    # Jamais plus large que la zone de texte, Pillow ou non
+    assert prepared.width <= width
+    assert cache.prepare(raw, width) is prepared
+    assert cache.total_bytes == len(prepared.blob)
+
+
+def test_large_images_are_resized():
+    pytest.importorskip("PIL")
+    prepared = ImageCache(max_bytes=1 << 20).prepare(png(width=4000), 5_000_000)
+    assert DocxImage.from_blob(prepared.blob).px_width < 4000
+
+
+def generated_media(client, body: dict):
+    response = client.post("/api/v1/generate", json=body)
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        media = {name: archive.read(name) for name in archive.namelist() if name.startswith("word/media/")}
+        return media, archive.read("word/document.xml").decode()
+
+
+def test_schema_images_are_embedded(client):
+    form = {"titre_projet": "Images", "has_schema": True}
+    template_media, _ = generated_media(client, {**form, "schemas": [{"titre": "Vide"}]})
+    media, document = generated_media(client, {**form, "schemas": [
+        {"titre": "Architecture", "image": data_url(png())},
+        {"titre": "Corrompu", "image": "data:image/png;base64,@@"},
+    ]})
+    assert len(media) == len(template_media) + 1
+    assert 400 in [DocxImage.from_blob(blob).px_width for blob in media.values()]
+    # Image illisible : ignorée, sans finir en texte base64 dans le document
+    assert "@@" not in document
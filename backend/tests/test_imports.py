@@ -0,0 +1,75 @@
+"""Import en masse : erreurs rapportées ligne à ligne, lignes stockées bornées."""
+import csv
+import io
+
+import pytest
+
+from app.schemas.dat import VM
+from app.services.bulk_import import ImportStore, StoredImport, parse_rows
+
+
+@pytest.fixture
+def small_field_limit():
+    previous = csv.field_size_limit(20)
+    yield
+    csv.field_size_limit(previous)
+
+
+def parse_csv(text: str) -> StoredImport:
+    return parse_rows(io.BytesIO(text.encode()), "vms", "csv")
+
+
+def test_malformed_csv_line_is_reported(small_field_limit):
+    result = parse_csv("nom;cpu\nvm1;2\n" + "x" * 50 + ";4\nvm3;8\n")
+    assert [vm.nom for vm in result.rows] == ["vm1", "vm3"]
+    assert result.error_count == 1
+    assert result.errors[0].line == 3
+    assert result.errors[0].message.startswith("CSV invalide")
+
+
+def test_invalid_rows_are_rejected_with_their_line():
+    result = parse_csv("nom;cpu;inconnue\nvm1;deux;a\nvm2;2;b;en trop\nvm3;4;c\n")
+    assert [vm.nom for vm in result.rows] == ["vm3"]
+    assert result.ignored_columns == ["inconnue"]
+    assert [(error.line, error.field) for error in result.errors] == [(2, "cpu"), (3, None)]
+
+
+def stored(rows: int) -> StoredImport:
+    return StoredImport(id=f"import-{rows}-{id(object())}", section="vms", format="csv",
+                        rows=[VM(nom=str(i)) for i in range(rows)])
+
+
+def test_store_bounds_stored_rows():
+    store = ImportStore(ttl=60, max_entries=10, max_rows=100)
+    first, second = store.save(stored(60)), store.save(stored(30))
+    assert store.get(first.id) and store.get(second.id)
+
+    # Au-delà du budget de lignes, les plus anciens imports sont oubliés
+    third = store.save(stored(20))
+    assert store.get(first.id) is None
+    assert store.get(second.id) and store.get(third.id)
+    assert store._rows == 50
+
+    # Le dernier import est gardé même s'il dépasse seul le budget
+    large = store.save(stored(500))
+    assert store.get(large.id) and len(store._imports) == 1
+    assert store._rows == 500
+
+    store.delete(large.id)
+    assert store._rows == 0
+
+
+def test_import_is_used_by_generate(client):
+    lines = b'{"nom": "vm1", "cpu": 4}\n[1, 2]\n{"nom": "vm2"}\n'
+    response = client.post("/api/v1/imports/vms", files={"file": ("vms.ndjson", lines)})
+    assert response.status_code == 201
+    report = response.json()
+    assert report["rows"] == 2 and report["error_count"] == 1
+    assert report["errors"][0]["line"] == 2
+
+    generate = client.post("/api/v1/generate", params={"imports": report["import_id"]},
+                           json={"titre_projet": "Import"})
+    assert generate.status_code == 200
+    unknown = client.post("/api/v1/generate", params={"imports": "inconnu"}, json={"titre_projet": "Import"})
+    assert unknown.status_code == 422
+    assert client.delete(f"/api/v1/imports/{report['import_id']}").status_code == 204
@@ -0,0 +1,129 @@
+"""File de jobs : tentatives bornées sur saturation, nombre de jobs borné."""
+import asyncio
+import time
+
+import pytest
+
+from app.schemas.dat import DatRequest
+from app.services import jobs as jobs_module
+from app.services.concurrency import ServiceSaturated
+from app.services.jobs import InMemoryJobBackend, Job, JobBackend, JobQueue
+from app.services.pipeline import GeneratedDocument, spool
+from app.services.render_cache import RenderCache
+
+
+@pytest.fixture
+def request_data(payload):
+    return DatRequest.model_validate(payload)
+
+
+async def wait_finished(queue: JobQueue, job_id: str, timeout: float = 5.0) -> Job:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job.is_finished:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} non terminé")
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        JobBackend()
+
+
+def test_saturation_retries_are_bounded(request_data, monkeypatch):
+    attempts = []
+
+    async def saturated(*args, **kwargs):
+        attempts.append(1)
+        raise ServiceSaturated("Pools pleins", retry_after=0)
+
+    monkeypatch.setattr(jobs_module, "generate_document", saturated)
+
+    async def scenario():
+        queue = JobQueue(workers=1, max_attempts=3)
+        job = await queue.submit(request_data, "docx")
+        try:
+            return await wait_finished(queue, job.id)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job.status == "failed"
+    assert "3 tentatives" in job.error
+    assert len(attempts) == 3
+    assert job.request is None
+
+
+def test_result_is_spooled(request_data, monkeypatch):
+    async def generated(*args, **kwargs):
+        return GeneratedDocument(filename="DAT.docx", media_type="application/octet-stream", content=b"docx")
+
+    monkeypatch.setattr(jobs_module, "generate_document", generated)
+
+    async def scenario():
+        queue = JobQueue(workers=1)
+        job = await queue.submit(request_data, "docx")
+        try:
+            return await wait_finished(queue, job.id)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job.status == "done"
+    assert job.result.content is None and job.result.path
+    assert job.result.read() == b"docx"
+    job.result.discard()
+
+
+def test_job_count_is_bounded(request_data):
+    async def scenario():
+        backend = InMemoryJobBackend()
+        # Aucun worker : les jobs restent en file
+        queue = JobQueue(backend=backend, workers=0, max_jobs=2)
+        try:
+            await queue.submit(request_data, "docx")
+            await queue.submit(request_data, "docx")
+            with pytest.raises(ServiceSaturated):
+                await queue.submit(request_data, "docx")
+
+            # Un job terminé laisse sa place au suivant
+            first = next(iter(backend._jobs.values()))
+            first.status, first.finished_at = "done", time.time()
+            backend.save(first)
+            await queue.submit(request_data, "docx")
+            assert backend.get(first.id) is None
+            assert backend.count() == 2
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_result_survives_cache_eviction(request_data, monkeypatch):
+    cache = RenderCache(max_bytes=1 << 20, ttl=60)
+    cached = spool(b"docx", "DAT.docx", "application/octet-stream", threshold=-1)
+    cache.put("cle", cached, cached.size)
+
+    async def generated(*args, **kwargs):
+        return cached
+
+    monkeypatch.setattr(jobs_module, "generate_document", generated)
+
+    async def scenario():
+        queue = JobQueue(workers=1)
+        job = await queue.submit(request_data, "docx")
+        try:
+            return await wait_finished(queue, job.id)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job.result.path != cached.path
+    # L'éviction supprime le fichier du cache, pas celui du job
+    cache.clear()
+    assert not cached.exists()
+    assert job.result.read() == b"docx"
+    job.result.discard()
+    assert not job.result.exists()
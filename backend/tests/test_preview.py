@@ -0,0 +1,39 @@
+"""Aperçu HTML : rendu direct du formulaire, 304 sans validation si l'ETag correspond."""
+import json
+
+from app.services.preview import preview_renderer
+
+
+def post_preview(client, body: bytes, **headers):
+    return client.post("/api/v1/preview", content=body,
+                       headers={"Content-Type": "application/json", **headers})
+
+
+def test_preview_renders_the_form(client, payload):
+    response = post_preview(client, json.dumps(payload).encode())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert payload["titre_projet"] in response.text
+    assert payload["vms"][0]["nom"] in response.text
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_unchanged_form_is_not_modified(client, payload):
+    body = json.dumps(payload).encode()
+    etag = post_preview(client, body).headers["ETag"]
+    assert etag == preview_renderer.etag(body)
+
+    response = post_preview(client, body, **{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag and not response.content
+
+    changed = json.dumps({**payload, "titre_projet": "Autre projet"}).encode()
+    assert post_preview(client, changed, **{"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_match_skips_validation(client):
+    # Le corps n'est ni validé ni rendu : un ETag correspondant suffit au 304
+    body = b'{"titre_projet": 42, "vms": "pas une liste"}'
+    etag = preview_renderer.etag(body)
+    assert post_preview(client, body, **{"If-None-Match": etag}).status_code == 304
+    assert post_preview(client, body).status_code == 422
@@ -0,0 +1,33 @@
+"""Profilage : enregistrement hors de la boucle, un seul cProfile à la fois (3.12+)."""
+import asyncio
+import os
+import pstats
+
+from app.services import profiling
+from app.services.profiling import ProfileSession, Profiler, profiled
+
+
+def test_profile_is_saved_after_generation(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), token="", sample_rate=0, max_files=10)
+    session = ProfileSession("cprofile", "requested")
+
+    async def scenario():
+        async with profiler.activate(session):
+            await asyncio.to_thread(profiled, sum, range(1000))
+
+    asyncio.run(scenario())
+    path = profiler.find(session.id)
+    assert path == os.path.join(str(tmp_path), session.filename)
+    assert pstats.Stats(path).total_calls > 0
+    assert session.skipped == 0
+
+
+def test_concurrent_cprofile_step_runs_unprofiled(monkeypatch):
+    monkeypatch.setattr(profiling, "SINGLE_CPROFILE", True)
+    session = ProfileSession("cprofile", "sampled")
+    # Un autre profil cProfile est en cours
+    with profiling._cprofile_lock:
+        assert session.run(sum, [1, 2, 3]) == 6
+    assert session.skipped == 1
+    assert session.run(sum, [1, 2, 3]) == 6
+    assert session.skipped == 1
@@ -0,0 +1,118 @@
+"""Cache de rendu : déduplication des rendus en vol, quota, TTL et fichiers temporaires."""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.services import pipeline
+from app.services.artifacts import ArtifactStore
+from app.services.pipeline import spool, store_document
+from app.services.render_cache import RenderCache
+
+
+def make_cache(max_bytes: int = 100, ttl: float = 60) -> RenderCache:
+    return RenderCache(max_bytes=max_bytes, ttl=ttl)
+
+
+def test_concurrent_requests_share_one_render():
+    cache = make_cache()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "docx"
+
+    async def scenario():
+        return await asyncio.gather(*[cache.get_or_create("cle", factory, len) for _ in range(5)])
+
+    assert asyncio.run(scenario()) == ["docx"] * 5
+    assert len(calls) == 1
+    assert (cache.misses, cache.hits) == (1, 4)
+    assert cache.get("cle") == "docx"
+
+
+def test_cancelled_waiter_does_not_cancel_the_render():
+    cache = make_cache()
+    release = None
+
+    async def factory():
+        await release.wait()
+        return "docx"
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        first = asyncio.create_task(cache.get_or_create("cle", factory, len))
+        second = asyncio.create_task(cache.get_or_create("cle", factory, len))
+        await asyncio.sleep(0)
+        # Premier client déconnecté : le rendu partagé continue pour le second
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "docx"
+    assert cache.get("cle") == "docx"
+
+
+def test_failed_render_is_not_cached():
+    cache = make_cache()
+
+    async def failing():
+        raise ValueError("rendu impossible")
+
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_or_create("cle", failing, len))
+    assert cache.get("cle") is None and not cache._in_flight
+
+
+def test_quota_evicts_least_recently_used():
+    cache = make_cache(max_bytes=100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    cache.get("a")
+    cache.put("c", "C", 40)
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.total_bytes == 80
+    # Trop gros pour le cache : non gardé
+    assert not cache.put("d", "D", 101)
+
+
+def test_expired_entries_are_dropped():
+    cache = make_cache(ttl=0.01)
+    cache.put("cle", "docx", 4)
+    time.sleep(0.02)
+    assert cache.get("cle") is None
+    assert cache.total_bytes == 0
+
+
+def test_evicted_temporary_file_is_deleted():
+    cache = make_cache(max_bytes=10)
+    document = spool(b"docx", "DAT.docx", "application/octet-stream", threshold=-1)
+    cache.put("a", document, document.size)
+    assert cache.holds(document)
+    cache.put("b", "B", 10)
+    assert not cache.holds(document)
+    assert not os.path.exists(document.path)
+
+
+def test_held_temporary_file_survives_storage(tmp_path, monkeypatch):
+    cache = make_cache()
+    monkeypatch.setattr(pipeline, "render_cache", cache)
+    monkeypatch.setattr(pipeline.document_service, "artifacts",
+                        ArtifactStore(directory=str(tmp_path), secret="secret"))
+    held = spool(b"docx", "DAT.docx", "application/octet-stream", threshold=-1)
+    cache.put("cle", held, held.size)
+    other = spool(b"odt", "DAT.odt", "application/octet-stream", threshold=-1)
+
+    stored = store_document(held, key="cle")
+    assert stored.id is not None and stored.path != held.path
+    # Gardé par le cache : son fichier reste lisible ; sinon il est supprimé
+    assert held.read() == b"docx"
+    store_document(other, key="autre")
+    assert not other.exists()
+    cache.clear()
@@ -0,0 +1,126 @@
+"""
+Équivalence du template compilé avec docxtpl.
+
+Le template compilé (CachedDocxTemplate), les lignes rapides (fast_tables) et
+le rendu par sections (sections) doivent produire exactement le même .docx
+qu'un DocxTemplate rendu depuis le fichier, partie par partie.
+"""
+import io
+import zipfile
+
+import pytest
+from docx.opc.part import XmlPart
+from docxtpl import DocxTemplate
+from jinja2.exceptions import TemplateSyntaxError
+
+from app.core import config
+from app.schemas.dat import DatRequest
+from app.services.compiled_template import CachedDocxTemplate, compile_template
+from app.services.doc_generator import TEMPLATE_PATH, build_render_context
+from app.services.sections import SectionCache
+from benchmarks.payloads import make_scenario
+
+RENDER_PATHS = {
+    # nom -> (FAST_TABLES, INCREMENTAL_RENDER)
+    "complet": (False, False),
+    "lignes_rapides": (True, False),
+    "sections": (True, True),
+}
+
+
+def docx_parts(doc) -> dict:
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    with zipfile.ZipFile(buffer) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def baseline(context: dict) -> dict:
+    doc = DocxTemplate(TEMPLATE_PATH)
+    doc.render(context)
+    return docx_parts(doc)
+
+
+def context_for(payload: dict) -> dict:
+    return build_render_context(DatRequest.model_validate(payload))
+
+
+@pytest.fixture(params=sorted(RENDER_PATHS))
+def compiled(request, monkeypatch):
+    fast_tables, incremental = RENDER_PATHS[request.param]
+    monkeypatch.setattr(config, "FAST_TABLES", fast_tables)
+    monkeypatch.setattr(config, "INCREMENTAL_RENDER", incremental)
+    blob = TEMPLATE_PATH.read_bytes()
+    compiled = compile_template(TEMPLATE_PATH, blob, TEMPLATE_PATH.stat().st_mtime_ns)
+    assert (compiled.fast_body is not None) == fast_tables
+    assert (compiled.sections is not None) == incremental
+    return compiled
+
+
+def render(compiled, context: dict) -> dict:
+    doc = CachedDocxTemplate(compiled)
+    doc.render(context)
+    return docx_parts(doc)
+
+
+def with_vm_value(payload: dict, value: str) -> dict:
+    vms = [dict(vm) for vm in payload["vms"]]
+    vms[0]["nom"] = value
+    return {**payload, "vms": vms}
+
+
+@pytest.mark.parametrize("scenario", ["minimal", "petit"])
+def test_render_matches_docxtpl(compiled, scenario):
+    context = context_for(make_scenario(scenario))
+    expected = baseline(context)
+    # Le second rendu réutilise les sections en cache
+    assert render(compiled, context) == expected
+    assert render(compiled, context) == expected
+
+
+def test_changed_section_is_rendered_again(compiled, payload):
+    render(compiled, context_for(payload))
+    changed = context_for({**payload, "supervision": "<p>Supervision modifiée</p>"})
+    assert render(compiled, changed) == baseline(changed)
+
+
+@pytest.mark.parametrize("value", [
+    "R&D < 5 {_{x}} %_} {{",  # zone rendue seule par Jinja2
+    "a<b>gras</b>",           # balisage : rendu complet
+])
+def test_special_characters_in_rows(compiled, payload, value):
+    context = context_for(with_vm_value(payload, value))
+    assert render(compiled, context) == baseline(context)
+
+
+def test_template_error_keeps_docx_context(compiled):
+    class Failing:
+        def render(self, context):
+            raise TemplateSyntaxError("boom", 6)
+
+    doc = CachedDocxTemplate(compiled)
+    with pytest.raises(TemplateSyntaxError) as info:
+        doc._render_compiled(Failing(), doc.docx._part, {}, compiled.source)
+    context = list(info.value.docx_context)
+    assert len(context) == 7
+    assert not any("<" in line for line in context)
+
+
+def test_static_headers_are_not_parsed(compiled):
+    doc = CachedDocxTemplate(compiled)
+    for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+        for _, part in doc.get_headers_footers(uri):
+            assert isinstance(part, XmlPart) == (str(part.partname) in compiled.parts)
+
+
+def test_section_cache_counts_bytes():
+    ascii_xml, typographic_xml = "a" * 1000, "’" * 1000
+    cache = SectionCache(max_bytes=5000)
+    cache.put("a", ascii_xml)
+    cache.put("b", typographic_xml)
+    assert cache.total_bytes > 3000
+    # Caractères sur 2 octets en mémoire : la troisième entrée dépasse le budget
+    cache.put("c", typographic_xml)
+    assert cache.get("a") is None
+    assert cache.get("b") == cache.get("c") == typographic_xml
+    assert cache.total_bytes <= cache.max_bytes
@@ -0,0 +1,72 @@
+"""Cache disque partagé : verrou par clé, verrous abandonnés supprimés, nettoyage espacé."""
+import asyncio
+import os
+import time
+
+from filelock import FileLock
+
+from app.services.shared_cache import SharedDiskCache
+
+
+def make_cache(tmp_path, lock_timeout: float = 2.0, max_bytes: int = 1 << 20) -> SharedDiskCache:
+    return SharedDiskCache(directory=str(tmp_path), max_bytes=max_bytes, ttl=60, lock_timeout=lock_timeout,
+                           prune_interval=3600)
+
+
+def test_keys_with_same_prefix_do_not_share_a_lock(tmp_path):
+    cache = make_cache(tmp_path)
+    outer, inner = "ab" + "1" * 62, "ab" + "2" * 62
+
+    async def produce_inner():
+        return b"inner"
+
+    async def produce_outer():
+        # Produit une autre clé de même préfixe pendant que le verrou de `outer` est tenu
+        return b"outer:" + await cache.get_or_create(inner, produce_inner)
+
+    start = time.monotonic()
+    assert asyncio.run(cache.get_or_create(outer, produce_outer)) == b"outer:inner"
+    assert time.monotonic() - start < cache.lock_timeout
+    # Les deux documents ont été produits sous leur verrou, donc enregistrés
+    assert cache.read(outer) == b"outer:inner"
+    assert cache.read(inner) == b"inner"
+
+
+def test_prune_removes_stale_free_locks(tmp_path):
+    cache = make_cache(tmp_path, lock_timeout=0.1)
+    stale, held = "cd" + "1" * 62, "cd" + "2" * 62
+    old = time.time() - 2 * cache.ttl
+    for key in (stale, held):
+        path = cache._lock_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "w").close()
+        os.utime(path, (old, old))
+
+    lock = FileLock(cache._lock_path(held), thread_local=False)
+    lock.acquire()
+    try:
+        cache.prune()
+        assert not os.path.exists(cache._lock_path(stale))
+        assert os.path.exists(cache._lock_path(held))
+    finally:
+        lock.release()
+
+
+def test_writes_walk_the_directory_only_when_due(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, max_bytes=100)
+    walks = []
+    prune = cache._prune
+    monkeypatch.setattr(cache, "_prune", lambda now: walks.append(now) or prune(now))
+
+    for i in range(5):
+        cache.write(f"{i:064d}", b"x" * 10)
+    # Premier nettoyage à la première écriture, puis plus avant l'intervalle
+    assert len(walks) == 1
+    assert cache.total_bytes == 50
+
+    # Quota dépassé : nettoyage immédiat, les entrées les moins récemment lues partent
+    cache.write("f" * 64, b"y" * 60)
+    assert len(walks) == 2
+    assert cache.total_bytes <= cache.max_bytes
+    assert cache.read("f" * 64) == b"y" * 60
+    assert cache.read(f"{0:064d}") is None
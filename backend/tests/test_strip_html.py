@@ -0,0 +1,29 @@
+"""Conversion du HTML de l'éditeur en texte pour Word."""
+import pytest
+
+from app.services.doc_generator import strip_html
+
+NESTED = "<ul><li>a<ul><li>b</li></ul></li></ul>"
+
+
+@pytest.mark.parametrize("html, expected", [
+    (NESTED, "• a\n  • b"),
+    ("<ul><li><p>a</p><ul><li>b</li></ul></li></ul>", "• a\n  • b"),
+    ("<ol><li>a<ul><li>b<ul><li>c</li></ul></li></ul></li></ol>", "• a\n  • b\n    • c"),
+    ("<ul><li>a</li><li>b</li></ul>", "• a\n• b"),
+])
+def test_nested_lists_start_on_new_line(html, expected):
+    assert strip_html(html) == expected
+
+
+@pytest.mark.parametrize("tag", ["link", "list", "lix"])
+def test_only_li_tags_become_bullets(tag):
+    html = f"<p><{tag} class='x'>texte</{tag}></p>"
+    # Même rendu avec ou sans liste imbriquée ailleurs dans le champ
+    assert strip_html(html) == "texte"
+    assert strip_html(NESTED + html).splitlines()[-1] == "texte"
+
+
+def test_entities_and_blank_lines():
+    assert strip_html("<p>R&amp;D</p><p></p><p></p><p>fin</p>") == "R&D\n\nfin"
+    assert strip_html("texte brut") == "texte brut"
@@ -0,0 +1,43 @@
+"""Cache et registre des templates."""
+import hashlib
+import shutil
+
+import pytest
+
+from app.services.doc_generator import TEMPLATE_PATH
+from app.services.template_cache import TemplateCache, TemplateRegistry, UnknownTemplate
+
+
+def test_version_does_not_compile():
+    cache = TemplateCache(TEMPLATE_PATH)
+    assert cache.version() == hashlib.sha256(TEMPLATE_PATH.read_bytes()).hexdigest()
+    assert not cache.is_compiled
+
+
+@pytest.fixture
+def registry(tmp_path):
+    for name in ("dat", "synthese"):
+        shutil.copy(TEMPLATE_PATH, tmp_path / f"{name}.docx")
+    return TemplateRegistry(tmp_path, default="dat", max_compiled=1)
+
+
+def test_registry_compiles_the_most_recent_templates(registry):
+    assert registry.names() == ["dat", "synthese"]
+    assert not any(entry["compiled"] for entry in registry.describe())
+    registry.get_compiled("dat")
+    registry.get_compiled("synthese")
+    # Un seul template compilé gardé : le moins récemment utilisé est libéré
+    assert {entry["name"]: entry["compiled"] for entry in registry.describe()} == {"dat": False, "synthese": True}
+
+
+def test_unknown_template_is_rejected(registry, client):
+    with pytest.raises(UnknownTemplate):
+        registry.resolve("absent")
+    response = client.post("/api/v1/generate", params={"template": "absent"}, json={"titre_projet": "x"})
+    assert response.status_code == 422
+
+
+def test_list_templates(client):
+    entries = client.get("/api/v1/templates").json()
+    default = next(entry for entry in entries if entry["default"])
+    assert default["sha256"] == hashlib.sha256(TEMPLATE_PATH.read_bytes()).hexdigest()
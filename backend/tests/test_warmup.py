@@ -0,0 +1,36 @@
+"""Préchauffage : un échec laisse le worker démarré, /readyz en 503."""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import config
+from app.main import app
+from app.services import warmup as warmup_module
+from app.services.warmup import WarmupError, readiness
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_failed_warmup_keeps_worker_up(monkeypatch, background):
+    def failing():
+        raise WarmupError("Template introuvable")
+
+    monkeypatch.setattr(config, "WARMUP", True)
+    monkeypatch.setattr(config, "WARMUP_BACKGROUND", background)
+    monkeypatch.setattr(warmup_module, "_load_template", failing)
+    monkeypatch.setattr(readiness, "state", "starting")
+    monkeypatch.setattr(readiness, "checks", {})
+
+    with TestClient(app) as client:
+        # En arrière-plan, les requêtes sont acceptées pendant le préchauffage
+        deadline = time.monotonic() + 5
+        response = client.get("/readyz")
+        while response.json()["status"] in ("starting", "warming") and time.monotonic() < deadline:
+            time.sleep(0.01)
+            response = client.get("/readyz")
+        assert response.status_code == 503
+        body = response.json()
+        assert body["status"] == "failed"
+        assert body["error"] == "Template introuvable"
+        assert body["checks"]["template"]["ok"] is False
+        assert client.get("/").status_code == 200
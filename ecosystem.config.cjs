@@ -3,9 +3,15 @@ module.exports = {
     {
       name: 'darwin-backend',
       script: '/home/user/webapp/backend/start.sh',
+      env: {
+        DARWIN_ENV: 'production'
+      },
       watch: false,
+      // Un seul superviseur : les workers sont lancés par app.server (DARWIN_WORKERS)
       instances: 1,
-      exec_mode: 'fork'
+      exec_mode: 'fork',
+      // Laisse aux workers le temps de terminer les requêtes en cours (DARWIN_GRACEFUL_TIMEOUT + 10 s)
+      kill_timeout: 100000
     },
     {
       name: 'darwin-frontend',